@@ -0,0 +1,219 @@
+"""
+Response compression negotiated through ``Accept-Encoding``.
+
+gzip is always available; brotli (``br``) and zstd are used when the
+optional ``brotli`` / ``zstandard`` packages are installed. The server's
+preference order is ``COMPRESSION_ENCODINGS``; a client's q=0 excludes an
+encoding.
+
+Complete bodies smaller than ``COMPRESSION_MIN_SIZE`` are sent as is.
+Streaming responses are compressed chunk by chunk and flushed after every
+chunk, so clients receive data as soon as it is produced. Server-sent event
+streams and already encoded responses are never touched.
+"""
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+DEFAULT_EXCLUDED_TYPES = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/gzip")
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encoders(levels: Dict[str, int]) -> Dict[str, Callable[[], object]]:
+    """Encoder factories for the installed codecs, keyed by content-coding."""
+    encoders = {"gzip": lambda: GzipEncoder(levels["gzip"])}
+    if brotli is not None:
+        encoders["br"] = lambda: BrotliEncoder(levels["br"])
+    if zstandard is not None:
+        encoders["zstd"] = lambda: ZstdEncoder(levels["zstd"])
+    return encoders
+
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    """``"gzip, br;q=0.8"`` -> {"gzip": 1.0, "br": 0.8}."""
+    accepted = {}
+    for item in value.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate(accept_encoding: str, preference: Iterable[str]) -> Optional[str]:
+    """The first encoding in server ``preference`` order the client accepts."""
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    for coding in preference:
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+class CompressionMiddleware:
+    """Pure ASGI response compression (gzip, br, zstd)."""
+
+    def __init__(
+        self,
+        app,
+        encodings: List[str] = ("br", "zstd", "gzip"),
+        levels: Dict[str, int] = None,
+        minimum_size: int = 1024,
+        excluded_types: Iterable[str] = DEFAULT_EXCLUDED_TYPES
+    ):
+        self.app = app
+        self.encoders = available_encoders({"gzip": 6, "br": 4, "zstd": 3, **(levels or {})})
+        self.preference = [coding for coding in encodings if coding in self.encoders]
+        self.minimum_size = minimum_size
+        self.excluded_types = tuple(excluded_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        coding = negotiate(accept_encoding, self.preference) if accept_encoding else None
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressedResponder(self, coding)(scope, receive, send)
+
+
+class _CompressedResponder:
+    """Per-response state: decides on the first body chunk whether to compress."""
+
+    def __init__(self, middleware: CompressionMiddleware, coding: str):
+        self.middleware = middleware
+        self.coding = coding
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.middleware.app(scope, receive, self.send_wrapper)
+
+    def _compressible(self, headers) -> bool:
+        content_type = ""
+        for name, value in headers:
+            lowered = name.lower()
+            if lowered == b"content-encoding":
+                return False
+            if lowered == b"content-type":
+                content_type = value.decode("latin-1").lower()
+        return not content_type.startswith(self.middleware.excluded_types)
+
+    def _headers(self, length: Optional[int]) -> list:
+        headers = [
+            (name, value) for name, value in self.start_message.get("headers", [])
+            if name.lower() not in (b"content-length", b"vary")
+        ]
+        vary = [value for name, value in self.start_message.get("headers", []) if name.lower() == b"vary"]
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"]) if vary else b"Accept-Encoding"))
+        headers.append((b"content-encoding", self.coding.encode()))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
+
+    async def send_wrapper(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            # Nothing to compress for bodiless responses (304, 204)
+            self.passthrough = (
+                message["status"] in (204, 304)
+                or not self._compressible(message.get("headers", []))
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            if not more_body:
+                # Complete body: compress only if it is worth it
+                if len(body) < self.middleware.minimum_size:
+                    await self.send(self.start_message)
+                    await self.send(message)
+                    return
+                encoder = self.middleware.encoders[self.coding]()
+                compressed = encoder.compress(body) + encoder.finish()
+                await self.send({**self.start_message, "headers": self._headers(len(compressed))})
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming: length unknown up front, compress and flush per chunk
+            self.encoder = self.middleware.encoders[self.coding]()
+            await self.send({**self.start_message, "headers": self._headers(None)})
+
+        chunk = self.encoder.compress(body)
+        chunk += self.encoder.flush() if more_body else self.encoder.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,253 @@
+"""
+On-demand CPU profiling.
+
+``RequestProfilerMiddleware`` profiles a single request with cProfile when it
+carries ``X-Profile: 1`` (or ``?__profile=1``) and an admin token, either in
+``X-Profile-Token`` or as the request's own bearer token. The token is checked
+with ``get_current_admin``. The pstats file is stored under ``PROFILE_DIR`` and
+its id returned in the ``X-Profile-Id`` response header.
+
+cProfile follows the event-loop thread, so coroutines of concurrent requests
+that run in between show up as well; work pushed to the threadpool does not.
+
+``sampler`` is a low-overhead rolling profiler: a background thread samples
+the stacks of every thread in this worker and aggregates them in folded
+format (flamegraph.pl / speedscope). It is started and stopped per worker at
+runtime through the diagnostics endpoints.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional
+from urllib.parse import parse_qs
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from app.core.config import settings
+from app.core.memory import register_cache
+from app.database import SessionLocal
+from app.dependencies import get_current_admin
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ProfileStore:
+    """pstats files on disk, keeping only the most recent ``keep``."""
+
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+
+    def path(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.pstats")
+        return path if os.path.exists(path) else None
+
+    def save(self, profile_id: str, profiler: cProfile.Profile, endpoint: str, duration_ms: float):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, f"{profile_id}.pstats"))
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w", encoding="utf-8") as fh:
+            json.dump({"id": profile_id, "endpoint": endpoint, "duration_ms": round(duration_ms, 2),
+                       "created_at": time.time()}, fh)
+        self._prune()
+
+    def list(self) -> List[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name), encoding="utf-8") as fh:
+                    profiles.append(json.load(fh))
+        return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+    def _prune(self):
+        for profile in self.list()[self.keep:]:
+            for extension in (".pstats", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, profile["id"] + extension))
+                except FileNotFoundError:
+                    pass
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+        """Human-readable pstats listing."""
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class RequestProfilerMiddleware:
+    """Profile single requests flagged by an admin (pure ASGI)."""
+
+    def __init__(self, app, store: ProfileStore):
+        self.app = app
+        self.store = store
+        # cProfile hooks the whole event-loop thread: one profile at a time
+        self._active = False
+
+    @staticmethod
+    async def _reject(send, status_code: int, detail: str):
+        body = json.dumps({"detail": detail}).encode()
+        await send({"type": "http.response.start", "status": status_code,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    def _requested(scope, headers: dict) -> bool:
+        if headers.get(b"x-profile") in (b"1", b"true"):
+            return True
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("__profile", [""])[0] in ("1", "true")
+
+    @staticmethod
+    async def _authorize(headers: dict):
+        token = headers.get(b"x-profile-token", b"").decode("latin-1")
+        if not token:
+            _, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if not token:
+            raise HTTPException(status_code=401, detail="Admin token required for profiling")
+
+        db = SessionLocal()
+        try:
+            await get_current_admin(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token), db)
+        finally:
+            db.close()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if not self._requested(scope, headers):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self._authorize(headers)
+        except HTTPException as exc:
+            await self._reject(send, exc.status_code, exc.detail)
+            return
+
+        # Checked and set with no await in between, so no other request can interleave
+        if self._active:
+            await self._reject(send, 409, "Another request is being profiled, retry shortly")
+            return
+        self._active = True
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: another tool (debugger, coverage) holds the profiling hook
+            self._active = False
+            await self._reject(send, 409, "Another profiler is active in this worker")
+            return
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            self._active = False
+            endpoint = f"{scope['method']} {scope['path']}"
+            self.store.save(profile_id, profiler, endpoint, (time.perf_counter() - started) * 1000)
+            logger.info("Profiled %s", endpoint, extra={"profile_id": profile_id})
+
+
+class SamplingProfiler:
+    """Aggregates periodic stack samples of all threads in folded format."""
+
+    def __init__(self, max_stacks: int = 10000):
+        self.max_stacks = max_stacks
+        self.interval = 0.01
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = 10):
+        if self.running:
+            return
+        self.interval = interval_ms / 1000
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = [self._fold(frame) for ident, frame in sys._current_frames().items() if ident != own]
+            with self._lock:
+                self.samples += 1
+                for stack in stacks:
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                    else:
+                        self._stacks["[truncated]"] += 1
+
+    def folded(self) -> str:
+        """``frame;frame;frame count`` lines, most frequent first."""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+            "started_at": self.started_at,
+        }
+
+
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_KEEP)
+sampler = SamplingProfiler(max_stacks=settings.SAMPLER_MAX_STACKS)
+register_cache("sampler_stacks", lambda: sampler.status()["stacks"])
@@ -0,0 +1,365 @@
+"""
+Request deadlines and statement cancellation.
+
+``DeadlineMiddleware`` gives every request a deadline: ``REQUEST_TIMEOUT_MS``,
+or the ``REQUEST_TIMEOUT_ROUTES`` entry of the longest matching path prefix
+(``0`` means none). A caller can shorten it (never extend it) with an
+``X-Request-Timeout-Ms`` header carrying its own remaining budget. The
+deadline ends when the response is complete, so background tasks run
+without one. A client disconnect before that cancels it.
+
+The deadline reaches the database through engine events (``install``):
+
+* a statement started after the deadline passed is not sent at all;
+* on MySQL, SELECTs carry a ``MAX_EXECUTION_TIME`` hint of the remaining
+  time, so the server stops them on its own;
+* a watchdog thread polls the running statements every
+  ``REQUEST_DEADLINE_WATCHDOG_MS`` and stops those whose request expired or
+  disconnected: ``KILL QUERY`` over a dedicated connection on MySQL,
+  ``interrupt()`` on SQLite. This also covers writes, which the hint does
+  not, and statements that block the event loop.
+
+The resulting database error surfaces as ``DeadlineExceeded`` (504, or 499
+after a disconnect) instead of an outage, and is counted per route in
+``stats``. Connections are not dropped, only the statement is stopped.
+Disconnects are noticed while the event loop is free, so a statement that
+already blocks the loop is bounded by the deadline, not by the disconnect.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HEADER = b"x-request-timeout-ms"
+
+
+class Deadline:
+    """Time budget of one request; ``reason`` is set once it is over."""
+
+    def __init__(self, route: str, timeout_ms: Optional[float]):
+        self.route = route
+        self.timeout_ms = timeout_ms
+        self.expires_at = None if timeout_ms is None else time.monotonic() + timeout_ms / 1000
+        self.cancelled: Optional[str] = None
+        self.finished = False
+
+    def remaining_ms(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return (self.expires_at - time.monotonic()) * 1000
+
+    @property
+    def reason(self) -> Optional[str]:
+        """``"deadline"`` or ``"disconnect"`` once statements must stop, else None."""
+        if self.finished:
+            return None
+        if self.cancelled:
+            return self.cancelled
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            return "deadline"
+        return None
+
+    def cancel(self, reason: str):
+        if not self.finished and self.cancelled is None:
+            self.cancelled = reason
+
+
+deadline_var: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """A statement was refused or stopped because its request ran out of time."""
+
+    def __init__(self, reason: str, route: str):
+        super().__init__(f"request {reason} ({route})")
+        self.reason = reason
+        self.route = route
+
+
+class DeadlineStats:
+    """Per-worker timeout counters for the diagnostics endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.statements_killed: Counter = Counter()
+
+    def request_timed_out(self, route: str, reason: str):
+        with self._lock:
+            self.requests[(route, reason)] += 1
+
+    def statement_killed(self, reason: str):
+        with self._lock:
+            self.statements_killed[reason] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes: Dict[str, Dict[str, int]] = {}
+            for (route, reason), count in self.requests.items():
+                routes.setdefault(route, {})[reason] = count
+            return {
+                "requests": dict(sorted(routes.items())),
+                "statements_killed": dict(self.statements_killed),
+                "running_statements": len(watchdog),
+            }
+
+
+stats = DeadlineStats()
+
+
+# ==================== Watchdog ====================
+
+class _Running:
+    """A statement in flight; the lock keeps a kill from outliving it."""
+
+    __slots__ = ("deadline", "dbapi_connection", "connection_id", "lock", "done")
+
+    def __init__(self, deadline: Deadline, dbapi_connection, connection_id):
+        self.deadline = deadline
+        self.dbapi_connection = dbapi_connection
+        self.connection_id = connection_id
+        self.lock = threading.Lock()
+        self.done = False
+
+
+class Watchdog:
+    """Stops running statements of expired or disconnected requests."""
+
+    def __init__(self):
+        self.engine: Optional[Engine] = None
+        self.interval_seconds = 0.1
+        self._running: Dict[int, _Running] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._killer = None
+
+    def __len__(self):
+        return len(self._running)
+
+    def add(self, running: _Running) -> int:
+        key = id(running)
+        with self._lock:
+            self._running[key] = running
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="deadline-watchdog", daemon=True)
+                self._thread.start()
+        return key
+
+    def remove(self, key: int):
+        with self._lock:
+            running = self._running.pop(key, None)
+        if running is not None:
+            # Waits for a kill in progress, so it cannot hit the connection's next statement
+            with running.lock:
+                running.done = True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            with self._lock:
+                due: List[Tuple[_Running, str]] = [
+                    (running, running.deadline.reason) for running in self._running.values()
+                    if running.deadline.reason
+                ]
+            for running, reason in due:
+                with running.lock:
+                    if running.done:
+                        continue
+                    # One attempt per statement
+                    running.done = True
+                    try:
+                        stopped = self._stop(running)
+                    except Exception:
+                        logger.exception("Could not stop statement of %s", running.deadline.route)
+                        continue
+                if not stopped:
+                    continue
+                stats.statement_killed(reason)
+                logger.warning(
+                    "Stopped statement of %s: %s", running.deadline.route, reason,
+                    extra={"route": running.deadline.route, "reason": reason}
+                )
+
+    def _stop(self, running: _Running) -> bool:
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            running.dbapi_connection.interrupt()
+            return True
+        if dialect == "mysql" and running.connection_id is not None:
+            self._kill_query(running.connection_id)
+            return True
+        # No cancellation here; the next statement of the request is refused
+        return False
+
+    def _kill_query(self, connection_id: int):
+        # Outside the pool: an exhausted pool is exactly when this is needed
+        for attempt in range(2):
+            if self._killer is None:
+                cargs, cparams = self.engine.dialect.create_connect_args(self.engine.url)
+                self._killer = self.engine.dialect.connect(*cargs, **cparams)
+            try:
+                cursor = self._killer.cursor()
+                try:
+                    cursor.execute(f"KILL QUERY {int(connection_id)}")
+                finally:
+                    cursor.close()
+                return
+            except Exception:
+                try:
+                    self._killer.close()
+                except Exception:
+                    pass
+                self._killer = None
+                if attempt:
+                    raise
+
+
+watchdog = Watchdog()
+
+
+def install(engine: Engine, watchdog_interval_ms: float = 100):
+    """Propagate request deadlines into statements executed on ``engine``."""
+    watchdog.engine = engine
+    watchdog.interval_seconds = watchdog_interval_ms / 1000
+    mysql = engine.dialect.name == "mysql"
+
+    if mysql:
+        @event.listens_for(engine, "connect")
+        def _connection_id(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT CONNECTION_ID()")
+                connection_record.info["connection_id"] = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+
+    # Refused here, before any cursor is used: the slow-query log and the
+    # profiler push a timing in before_cursor_execute that is only popped
+    # once the statement has run or failed
+    @event.listens_for(engine, "before_execute")
+    def _refuse(conn, clauseelement, multiparams, params, execution_options):
+        deadline = deadline_var.get()
+        reason = deadline and deadline.reason
+        if reason:
+            raise DeadlineExceeded(reason, deadline.route)
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        deadline = deadline_var.get()
+        if deadline is None or deadline.finished:
+            return statement, parameters
+
+        remaining_ms = deadline.remaining_ms()
+        if mysql and remaining_ms is not None and not executemany and statement.lstrip()[:6].upper() == "SELECT":
+            statement = statement.lstrip()
+            statement = f"SELECT /*+ MAX_EXECUTION_TIME({max(int(remaining_ms), 1)}) */{statement[6:]}"
+        running = _Running(deadline, conn.connection.dbapi_connection, conn.info.get("connection_id"))
+        conn.info.setdefault("deadline_statements", []).append(watchdog.add(running))
+        return statement, parameters
+
+    def _finish(conn):
+        statements = conn.info.get("deadline_statements")
+        if statements:
+            watchdog.remove(statements.pop())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        if context.connection is not None:
+            _finish(context.connection)
+        deadline = deadline_var.get()
+        reason = deadline and deadline.reason
+        if reason and isinstance(context.sqlalchemy_exception, OperationalError):
+            # Stopped by the hint or the watchdog, not a database failure
+            return DeadlineExceeded(reason, deadline.route)
+        return None
+
+
+def parse_route_timeouts(value: str) -> Dict[str, float]:
+    """``"/api/user/events=0,/api/admin/users=10000"`` -> {path prefix: milliseconds}."""
+    timeouts = {}
+    for item in value.split(","):
+        if "=" in item:
+            prefix, timeout_ms = item.split("=", 1)
+            timeouts[prefix.strip()] = float(timeout_ms)
+    return timeouts
+
+
+class DeadlineMiddleware:
+    """Sets the request deadline and cancels it on disconnect (pure ASGI)."""
+
+    def __init__(self, app, timeout_ms: float = 30000, route_timeouts: Dict[str, float] = None):
+        self.app = app
+        self.timeout_ms = timeout_ms
+        # Longest prefix wins
+        self.route_timeouts = sorted((route_timeouts or {}).items(), key=lambda item: -len(item[0]))
+
+    def _timeout(self, scope) -> Optional[float]:
+        path = scope["path"]
+        timeout_ms = self.timeout_ms
+        for prefix, route_timeout_ms in self.route_timeouts:
+            if path.startswith(prefix):
+                timeout_ms = route_timeout_ms
+                break
+        limit = timeout_ms if timeout_ms > 0 else None
+
+        for name, value in scope["headers"]:
+            if name == TIMEOUT_HEADER:
+                try:
+                    requested = float(value.decode("latin-1"))
+                except ValueError:
+                    break
+                if requested > 0:
+                    limit = requested if limit is None else min(limit, requested)
+                break
+        return limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = Deadline(f"{scope['method']} {scope['path']}", self._timeout(scope))
+        token = deadline_var.set(deadline)
+
+        # Read the request ahead so a disconnect is seen even if the app never asks
+        messages: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    deadline.cancel("disconnect")
+                    return
+
+        async def receive_wrapper():
+            message = await messages.get()
+            if message["type"] == "http.disconnect":
+                # Every later receive sees the disconnect too
+                messages.put_nowait(message)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                deadline.finished = True
+            await send(message)
+
+        reader = asyncio.create_task(pump())
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            deadline.finished = True
+            reader.cancel()
+            deadline_var.reset(token)
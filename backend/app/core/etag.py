@@ -0,0 +1,37 @@
+"""
+Conditional GET helpers.
+
+Endpoints derive a weak ETag from cheap version markers (a loaded row's
+``updated_at``, or count/max id/max updated_at over an index) instead of
+hashing the serialized body, so an ``If-None-Match`` hit is answered with
+304 before the full result is queried or serialized.
+"""
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers ``etag`` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def conditional(request: Request, response: Response, *parts) -> Optional[Response]:
+    """Set the ETag on ``response``; return a 304 response if the client has it."""
+    etag = make_etag(request.url.path, request.url.query, *parts)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,226 @@
+"""
+Structured, non-blocking logging.
+
+``setup_logging`` routes every log record through a bounded in-memory queue:
+the request path only formats the record and enqueues it, while a listener
+thread does the actual writing. When the queue is full, records are dropped
+and counted instead of blocking the request.
+
+``AccessLogMiddleware`` assigns each request a correlation id (taken from the
+``X-Request-ID`` header or generated), attaches it to every record logged
+while the request is handled and writes one sampled access-log line per
+request. Errors and slow requests are always logged.
+
+``log_slow_queries`` logs SQL statements slower than ``SQL_SLOW_QUERY_MS``.
+"""
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+access_logger = logging.getLogger("app.access")
+sql_logger = logging.getLogger("app.sql")
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request's correlation id to the record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra`` fields are included as keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep extra fields for the JSON formatter, only resolve the message
+        # and traceback text here (args and exc_info may not outlive the call)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", queue_size: int = 10000) -> DroppingQueueHandler:
+    """Install the queue handler on the root logger and start the writer thread."""
+    global _listener
+    stop_logging()
+
+    stream = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s"))
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [h for h in root.handlers if not isinstance(h, DroppingQueueHandler)]
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    return handler
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """``"/api/health=0,/api/user/use-service=0.01"`` -> {path prefix: rate}."""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            prefix, rate = item.split("=", 1)
+            rates[prefix.strip()] = float(rate)
+    return rates
+
+
+class AccessLogMiddleware:
+    """Correlation ids and sampled access logging (pure ASGI, streaming-safe)."""
+
+    def __init__(self, app, sample_rate: float = 1.0, route_sample_rates: Dict[str, float] = None,
+                 slow_request_ms: float = 1000):
+        self.app = app
+        self.sample_rate = sample_rate
+        # Longest prefix wins
+        self.route_sample_rates = sorted((route_sample_rates or {}).items(), key=lambda item: -len(item[0]))
+        self.slow_request_ms = slow_request_ms
+
+    def _rate(self, path: str) -> float:
+        for prefix, rate in self.route_sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            path = scope["path"]
+            if (
+                status_code >= 400
+                or duration_ms >= self.slow_request_ms
+                or random.random() < self._rate(path)
+            ):
+                access_logger.info(
+                    "%s %s %s", scope["method"], path, status_code,
+                    extra={
+                        "method": scope["method"],
+                        "path": path,
+                        "status": status_code,
+                        "duration_ms": round(duration_ms, 2),
+                        "client": scope["client"][0] if scope.get("client") else None,
+                    }
+                )
+            request_id_var.reset(token)
+
+
+def log_slow_queries(engine: Engine, threshold_ms: float, max_statement_length: int = 2000):
+    """Log statements on ``engine`` taking at least ``threshold_ms`` (parameters are not logged)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        if duration_ms >= threshold_ms:
+            sql_logger.warning(
+                "slow query (%.1f ms)", duration_ms,
+                extra={
+                    "duration_ms": round(duration_ms, 2),
+                    "statement": statement[:max_statement_length],
+                    "executemany": executemany,
+                    "rowcount": cursor.rowcount,
+                }
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
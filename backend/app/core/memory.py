@@ -0,0 +1,142 @@
+"""
+Memory footprint diagnostics for the admin diagnostics endpoints.
+
+- tracemalloc can be started per worker at runtime; each ``snapshot`` call
+  returns the top allocation sites and the growth since the previous call.
+- Sessions of ``SessionLocal`` are tracked weakly so their identity-map
+  sizes can be listed while requests are in flight.
+- In-process caches register themselves with ``register_cache`` so their
+  sizes show up in one place.
+"""
+import ctypes
+import ctypes.util
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+import weakref
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+_caches: Dict[str, Callable[[], int]] = {}
+_sessions: "weakref.WeakSet[Session]" = weakref.WeakSet()
+_snapshot_lock = threading.Lock()
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+# Allocations made by tracemalloc itself and by the import machinery are noise
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def register_cache(name: str, cache) -> None:
+    """Report ``len(cache)`` (or ``cache()`` if callable) under ``name``."""
+    _caches[name] = cache if callable(cache) and not hasattr(cache, "__len__") else (lambda: len(cache))
+
+
+def cache_sizes() -> Dict[str, int]:
+    return {name: size() for name, size in sorted(_caches.items())}
+
+
+def track_sessions(factory: sessionmaker) -> None:
+    """Keep a weak reference to every session of ``factory`` that starts a transaction."""
+
+    @event.listens_for(factory, "after_begin")
+    def _track(session, transaction, connection):
+        _sessions.add(session)
+
+
+def session_sizes() -> List[int]:
+    """Identity-map sizes of live sessions, largest first."""
+    return sorted((len(session.identity_map) for session in list(_sessions)), reverse=True)
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux), else None."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def overview() -> dict:
+    traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+    sessions = session_sizes()
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "gc_counts": gc.get_count(),
+        "gc_objects": len(gc.get_objects()),
+        "tracemalloc": {
+            "tracing": tracemalloc.is_tracing(),
+            "traced_bytes": traced[0] if traced else None,
+            "peak_bytes": traced[1] if traced else None,
+        },
+        "sessions": {
+            "live": len(sessions),
+            "identity_map_sizes": sessions[:20],
+        },
+        "caches": cache_sizes(),
+    }
+
+
+def start_tracing(frames: int = 10):
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        _last_snapshot = None
+        tracemalloc.start(frames)
+
+
+def stop_tracing():
+    global _last_snapshot
+    tracemalloc.stop()
+    _last_snapshot = None
+
+
+def _stat(stat) -> dict:
+    entry = {
+        "site": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_bytes"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+
+def snapshot(limit: int = 25, group_by: str = "lineno") -> dict:
+    """Top allocation sites now and their growth since the previous snapshot."""
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+
+    with _snapshot_lock:
+        current = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        previous, _last_snapshot = _last_snapshot, current
+
+    result = {"top": [_stat(stat) for stat in current.statistics(group_by)[:limit]]}
+    if previous is not None:
+        result["diff"] = [_stat(stat) for stat in current.compare_to(previous, group_by)[:limit]]
+    return result
+
+
+def trim() -> dict:
+    """Run a full GC and hand freed heap pages back to the OS (glibc)."""
+    before = rss_bytes()
+    collected = gc.collect()
+    trimmed = False
+    if sys.platform.startswith("linux"):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name:
+            try:
+                trimmed = bool(ctypes.CDLL(libc_name).malloc_trim(0))
+            except (OSError, AttributeError):
+                pass
+    return {"collected": collected, "malloc_trim": trimmed, "rss_before": before, "rss_after": rss_bytes()}
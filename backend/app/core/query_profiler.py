@@ -0,0 +1,192 @@
+"""
+Per-request SQL profiler.
+
+With ``QUERY_PROFILER`` on, ``QueryProfilerMiddleware`` collects every
+statement executed on the engine while a request is handled and adds a
+``Server-Timing`` header with the time spent in the database, in
+authentication and in response serialization. Statements of the same shape
+repeated ``QUERY_N_PLUS_ONE_THRESHOLD`` times in one request are logged as a
+likely N+1 pattern. With ``QUERY_EXPLAIN_MS`` set, SELECTs slower than that
+are EXPLAINed on the spot and appended to ``QUERY_SLOW_REPORT_PATH``.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import fastapi.routing
+from app.core.logging import request_id_var
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s)\s*,)+\s*(?:\?|%s|%\(\w+\)s)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+# Optimizer hints, e.g. the per-request MAX_EXECUTION_TIME added by app.core.deadlines
+_OPTIMIZER_HINT = re.compile(r"/\*\+.*?\*/\s*", re.DOTALL)
+
+
+@dataclass
+class RequestProfile:
+    method: str
+    path: str
+    statements: List[Tuple[str, float]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def db_ms(self) -> float:
+        return sum(duration for _, duration in self.statements)
+
+    def add_timing(self, name: str, duration_ms: float):
+        self.timings[name] = self.timings.get(name, 0.0) + duration_ms
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least ``threshold`` times."""
+        counts = Counter(shape for shape, _ in self.statements)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = [f'db;dur={self.db_ms:.1f};desc="{len(self.statements)} queries"']
+        parts += [f"{name};dur={duration:.1f}" for name, duration in self.timings.items()]
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+profile_var: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so repeats differing only in IN-list length or hints match."""
+    statement = _OPTIMIZER_HINT.sub("", statement)
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@contextmanager
+def timed(name: str):
+    """Add the duration of the block to the current request's ``name`` timing."""
+    profile = profile_var.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_timing(name, (time.perf_counter() - started) * 1000)
+
+
+class SlowQueryReport:
+    """Appends EXPLAIN output of slow SELECTs to a JSON-lines file."""
+
+    def __init__(self, path: str, threshold_ms: float):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+
+    def capture(self, conn, statement: str, parameters, duration_ms: float):
+        explain = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        try:
+            # A separate DBAPI cursor: the original one may still hold results
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(explain + statement, parameters)
+                columns = [column[0] for column in cursor.description]
+                plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        except Exception as exc:
+            plan = [{"error": str(exc)}]
+
+        profile = profile_var.get()
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "request_id": request_id_var.get(),
+            "endpoint": f"{profile.method} {profile.path}" if profile else None,
+            "duration_ms": round(duration_ms, 2),
+            "statement": statement,
+            # Groups repeats of a statement (IN-list lengths and hints vary)
+            "shape": statement_shape(statement),
+            "plan": plan,
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry, default=str) + "\n")
+
+
+def install(engine: Engine, explain_ms: float = 0, report_path: str = "slow_queries.jsonl"):
+    """Hook statement timing into ``engine`` and serialization timing into FastAPI."""
+    report = SlowQueryReport(report_path, explain_ms) if explain_ms > 0 else None
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if profile_var.get() is not None:
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        profile = profile_var.get()
+        if profile is None or not conn.info.get("profile_started"):
+            return
+        duration_ms = (time.perf_counter() - conn.info["profile_started"].pop()) * 1000
+        profile.statements.append((statement_shape(statement), duration_ms))
+        if (
+            report is not None
+            and duration_ms >= report.threshold_ms
+            and statement.lstrip()[:6].upper() == "SELECT"
+        ):
+            report.capture(conn, statement, parameters, duration_ms)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        if context.connection is not None and context.connection.info.get("profile_started"):
+            context.connection.info["profile_started"].pop()
+
+    # FastAPI looks serialize_response up in its module on every request
+    serialize_response = fastapi.routing.serialize_response
+
+    async def timed_serialize_response(*args, **kwargs):
+        with timed("serialize"):
+            return await serialize_response(*args, **kwargs)
+
+    fastapi.routing.serialize_response = timed_serialize_response
+
+
+class QueryProfilerMiddleware:
+    """Collects a RequestProfile per request and reports it (pure ASGI)."""
+
+    def __init__(self, app, n_plus_one_threshold: int = 5):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = profile_var.set(profile)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", profile.server_timing(total_ms).encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile_var.reset(token)
+            for shape, count in profile.repeated(self.n_plus_one_threshold):
+                logger.warning(
+                    "possible N+1: statement repeated %s times in %s %s", count, profile.method, profile.path,
+                    extra={"count": count, "statement": shape[:500], "endpoint": f"{profile.method} {profile.path}"}
+                )
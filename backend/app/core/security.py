@@ -1,25 +1,61 @@
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import List, Optional, Tuple, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from .config import settings
+import hashlib
 import secrets
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def build_password_context(
+    schemes: List[str],
+    bcrypt_rounds: int = 12,
+    argon2_time_cost: int = 3,
+    argon2_memory_cost: int = 65536,
+    argon2_parallelism: int = 2
+) -> CryptContext:
+    """Hash with ``schemes[0]``; hashes of other schemes or below these costs need an update."""
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        argon2__default_rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
+
+pwd_context = build_password_context(
+    [scheme.strip() for scheme in settings.PASSWORD_SCHEMES.split(",") if scheme.strip()],
+    bcrypt_rounds=settings.BCRYPT_ROUNDS,
+    argon2_time_cost=settings.ARGON2_TIME_COST,
+    argon2_memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2_parallelism=settings.ARGON2_PARALLELISM,
+)
+
+
+def _truncate(password: str) -> str:
+    # Truncate to 72 bytes for bcrypt compatibility (kept for every scheme so
+    # existing bcrypt hashes of long passwords still verify after a rehash)
+    return password.encode("utf-8")[:72].decode("utf-8", "ignore")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash."""
-    # Truncate to 72 bytes for bcrypt compatibility
-    plain_password = plain_password.encode("utf-8")[:72].decode("utf-8", "ignore")
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context.verify(_truncate(plain_password), hashed_password)
+
+
+def verify_and_rehash(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; on success also return a new hash if the stored one is outdated."""
+    return pwd_context.verify_and_update(_truncate(plain_password), hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password."""
-    # Truncate to 72 bytes for bcrypt compatibility
-    password = password.encode("utf-8")[:72].decode("utf-8", "ignore")
-    return pwd_context.hash(password)
+    return pwd_context.hash(_truncate(password))
 
 
 def create_access_token(
@@ -32,7 +68,8 @@ def create_access_token(
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # iat with sub-second precision: revocation cutoffs compare against it
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -51,6 +88,11 @@ def generate_verification_token() -> str:
     return secrets.token_urlsafe(32)
 
 
+def hash_token(token: str) -> str:
+    """SHA-256 of an opaque token; only this is stored, so a leaked table holds no usable tokens."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 def generate_otp() -> str:
     """Generate a 6-digit OTP."""
     return ''.join([str(secrets.randbelow(10)) for _ in range(6)])
@@ -2,17 +2,26 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.logging import log_slow_queries
+from app.core.memory import track_sessions
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Create database engine
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
     pool_recycle=300,
-    echo=settings.DEBUG
+    echo=settings.SQL_ECHO
 )
 
+if settings.SQL_SLOW_QUERY_MS > 0:
+    log_slow_queries(engine, settings.SQL_SLOW_QUERY_MS)
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+track_sessions(SessionLocal)
 
 # Create base class for models
 Base = declarative_base()
@@ -24,10 +33,14 @@ def get_db():
     try:
         yield db
     finally:
+        loaded = len(db.identity_map)
+        if loaded >= settings.SESSION_IDENTITY_MAP_WARN:
+            # Unpaginated queries: every loaded row stays in memory until here
+            logger.warning("Request session held %s objects", loaded, extra={"identity_map_size": loaded})
         db.close()
 
 
 def init_db():
-    """Initialize database tables."""
-    from app.models import admin, user, service, subscription, payment
-    Base.metadata.create_all(bind=engine)
+    """Bring the database schema up to date (see app.migrations)."""
+    from app.migrations import upgrade
+    upgrade(engine)
@@ -1,20 +1,21 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Optional, Union
+from app.core.config import settings
 from app.database import get_db
 from app.core.security import decode_token
+from app.core.query_profiler import timed
 from app.models import User, Admin
+from app.schemas import UserResponse
+from app.services.health import health, profiles
+from app.services.tokens import revocations
 
 security = HTTPBearer()
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user."""
-    token = credentials.credentials
+def _user_id_from_token(token: str) -> int:
+    """Id of the user a valid, unrevoked user access token belongs to."""
     payload = decode_token(token)
     
     if payload is None:
@@ -32,15 +33,65 @@ async def get_current_user(
         )
     
     user_id = payload.get("id")
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if user is None:
+    if revocations.is_revoked("user", user_id, payload.get("iat", 0)):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
         )
+    return user_id
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user."""
+    with timed("auth"):
+        user_id = _user_id_from_token(credentials.credentials)
+        user = db.query(User).filter(User.id == user_id).first()
+    
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
+    
+        return user
+
+
+async def get_current_user_id(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> int:
+    """Id of the authenticated user from the token alone, without loading the row.
+
+    Deactivation revokes outstanding tokens, so the revocation list replaces
+    re-reading the user; routes that need the row use ``get_current_user``.
+    """
+    with timed("auth"):
+        return _user_id_from_token(credentials.credentials)
+
+
+async def get_current_user_or_cached(
+    response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> Union[User, UserResponse]:
+    """Current user; while the worker is degraded, their last cached profile instead."""
+    if not health.degraded:
+        user = await get_current_user(credentials, db)
+        profiles.put(user)
+        return user
     
-    return user
+    profile = profiles.get(_user_id_from_token(credentials.credentials))
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service temporarily unavailable",
+            headers={"Retry-After": str(int(settings.HEALTH_CHECK_INTERVAL_SECONDS))},
+        )
+    response.headers["Warning"] = '110 - "Response is Stale"'
+    return profile
 
 
 async def get_current_active_user(
@@ -72,36 +123,44 @@ async def get_current_admin(
     db: Session = Depends(get_db)
 ) -> Admin:
     """Get current authenticated admin."""
-    token = credentials.credentials
-    payload = decode_token(token)
+    with timed("auth"):
+        token = credentials.credentials
+        payload = decode_token(token)
     
-    if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        if payload is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
     
-    user_type = payload.get("user_type")
-    if user_type != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied. Admin authentication required.",
-        )
+        user_type = payload.get("user_type")
+        if user_type != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied. Admin authentication required.",
+            )
     
-    admin_id = payload.get("id")
-    admin = db.query(Admin).filter(Admin.id == admin_id).first()
+        admin_id = payload.get("id")
+        if revocations.is_revoked("admin", admin_id, payload.get("iat", 0)):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        # Still read per request: disabling an admin (is_active) records no revocation
+        admin = db.query(Admin).filter(Admin.id == admin_id).first()
     
-    if admin is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Admin not found",
-        )
+        if admin is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Admin not found",
+            )
     
-    if not admin.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin account is disabled.",
-        )
+        if not admin.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin account is disabled.",
+            )
     
-    return admin
+        return admin
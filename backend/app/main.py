@@ -2,21 +2,70 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+import logging
 from app.core.config import settings
-from app.database import init_db
-from app.routers import auth_router, user_router, admin_router
+from app.core.logging import setup_logging, stop_logging, AccessLogMiddleware, parse_sample_rates
+from app.core import query_profiler, deadlines
+from app.core.compression import CompressionMiddleware
+from app.core.cpu_profiler import RequestProfilerMiddleware, profile_store, sampler
+from app.database import engine
+from app.migrations import check_schema
+from app.routers import auth_router, user_router, admin_router, diagnostics_router
+from app.services import scheduler, ledger, counters, tokens, verification, billing
+from app.services.health import health, is_connection_failure
+from app.services.quota import quota_reservations
+from app.services.usage_buffer import usage_buffer
+from app.services.events import broker, create_backend
 
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
     # Startup
-    print("🚀 Starting up...")
-    init_db()
-    print("✓ Database initialized")
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_QUEUE_SIZE)
+    if settings.ACCESS_LOG:
+        # Replaced by AccessLogMiddleware
+        logging.getLogger("uvicorn.access").disabled = True
+    logger.info("Starting up")
+    version = check_schema(engine, auto_migrate=settings.AUTO_MIGRATE)
+    logger.info("Database schema at version %s", version)
+    scheduler.run_job("health_check", health.check)
+    scheduler.every(settings.HEALTH_CHECK_INTERVAL_SECONDS, health.check, name="health_check")
+    scheduler.every(settings.LEDGER_SNAPSHOT_INTERVAL_SECONDS, ledger.refresh_snapshots)
+    scheduler.every(settings.SUBSCRIPTION_EXPIRY_INTERVAL_SECONDS, counters.expire_subscriptions)
+    scheduler.run_job("token_revocations_sync", tokens.revocations.sync)
+    scheduler.every(settings.TOKEN_REVOCATION_SYNC_SECONDS, tokens.revocations.sync, name="token_revocations_sync")
+    scheduler.every(settings.TOKEN_CLEANUP_INTERVAL_SECONDS, tokens.purge_expired, name="token_purge_expired")
+    scheduler.every(settings.TOKEN_CLEANUP_INTERVAL_SECONDS, verification.purge_expired, name="verification_purge_expired")
+    if settings.BILLING_MODE == "postpaid":
+        scheduler.every(settings.BILLING_INTERVAL_SECONDS, billing.run_due, name="billing_run_due")
+    if settings.USAGE_WRITE_BEHIND:
+        try:
+            recovered = usage_buffer.recover()
+            if recovered:
+                logger.info("Recovered %s spilled usage records", recovered)
+        except Exception:
+            logger.exception("Could not recover spilled usage records")
+        scheduler.every(settings.USAGE_FLUSH_INTERVAL_MS / 1000, usage_buffer.flush, name="usage_buffer_flush")
+    if settings.QUOTA_RESERVATIONS:
+        scheduler.every(
+            max(settings.QUOTA_RESERVATION_TTL_SECONDS / 4, 1),
+            quota_reservations.release_expired,
+            name="quota_release_expired"
+        )
+    scheduler.start()
+    broker.start(create_backend())
     yield
     # Shutdown
-    print("👋 Shutting down...")
+    logger.info("Shutting down")
+    broker.stop()
+    await scheduler.stop()
+    scheduler.run_job("quota_release_all", quota_reservations.release_all)
+    usage_buffer.close()
+    sampler.stop()
+    stop_logging()
 
 
 # Create FastAPI app
@@ -46,10 +95,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.COMPRESSION:
+    app.add_middleware(
+        CompressionMiddleware,
+        encodings=[coding.strip() for coding in settings.COMPRESSION_ENCODINGS.split(",")],
+        levels={
+            "gzip": settings.COMPRESSION_GZIP_LEVEL,
+            "br": settings.COMPRESSION_BROTLI_QUALITY,
+            "zstd": settings.COMPRESSION_ZSTD_LEVEL,
+        },
+        minimum_size=settings.COMPRESSION_MIN_SIZE
+    )
+
+if settings.REQUEST_PROFILING:
+    app.add_middleware(RequestProfilerMiddleware, store=profile_store)
+
+if settings.QUERY_PROFILER:
+    query_profiler.install(engine, settings.QUERY_EXPLAIN_MS, settings.QUERY_SLOW_REPORT_PATH)
+    app.add_middleware(
+        query_profiler.QueryProfilerMiddleware,
+        n_plus_one_threshold=settings.QUERY_N_PLUS_ONE_THRESHOLD
+    )
+
+if settings.REQUEST_DEADLINES:
+    deadlines.install(engine, settings.REQUEST_DEADLINE_WATCHDOG_MS)
+    app.add_middleware(
+        deadlines.DeadlineMiddleware,
+        timeout_ms=settings.REQUEST_TIMEOUT_MS,
+        route_timeouts=deadlines.parse_route_timeouts(settings.REQUEST_TIMEOUT_ROUTES)
+    )
+
+# Added last so it wraps everything else and the correlation id is set first
+if settings.ACCESS_LOG:
+    app.add_middleware(
+        AccessLogMiddleware,
+        sample_rate=settings.ACCESS_LOG_SAMPLE_RATE,
+        route_sample_rates=parse_sample_rates(settings.ACCESS_LOG_SAMPLE_ROUTES),
+        slow_request_ms=settings.SLOW_REQUEST_MS
+    )
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(admin_router)
+app.include_router(diagnostics_router)
 
 
 @app.get("/")
@@ -63,14 +152,50 @@ async def root():
 
 
 @app.get("/api/health")
-async def health_check():
-    """API health check."""
+@app.get("/api/health/live")
+async def liveness():
+    """Liveness probe: the process serves requests (no I/O)."""
     return {"status": "ok"}
 
 
+@app.get("/api/health/ready")
+async def readiness():
+    """Readiness probe: result of the last background database check."""
+    return JSONResponse(status_code=200 if health.ready else 503, content=health.status())
+
+
+@app.exception_handler(OperationalError)
+@app.exception_handler(PoolTimeoutError)
+async def database_unavailable_handler(request: Request, exc: Exception):
+    if not is_connection_failure(exc):
+        # Deadlocks, lock wait timeouts, ...: the database is up
+        return await global_exception_handler(request, exc)
+    # Counts toward readiness; cached reads take over once the worker is degraded
+    logger.warning("Database unavailable on %s %s: %s", request.method, request.url.path, exc)
+    health.report_failure(exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable"},
+        headers={"Retry-After": str(int(settings.HEALTH_CHECK_INTERVAL_SECONDS))},
+    )
+
+
+@app.exception_handler(deadlines.DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: deadlines.DeadlineExceeded):
+    # Route template, so per-route counts do not split by path parameters
+    route = request.scope.get("route")
+    deadlines.stats.request_timed_out(f"{request.method} {getattr(route, 'path', request.url.path)}", exc.reason)
+    logger.warning("Request %s on %s %s", exc.reason, request.method, request.url.path)
+    if exc.reason == "disconnect":
+        # Nobody is listening; nginx's "client closed request"
+        return JSONResponse(status_code=499, content={"detail": "Client closed request"})
+    return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+
+
 # Optional: Add a global exception handler for debugging
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
+    logger.exception("Unhandled error on %s %s", request.method, request.url.path)
     return JSONResponse(
         status_code=500,
         content={"detail": str(exc)},
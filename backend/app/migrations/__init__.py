@@ -0,0 +1,181 @@
+"""
+Versioned schema migrations.
+
+Each module in ``app.migrations.versions`` defines ``VERSION`` (int),
+``DESCRIPTION`` and ``upgrade(conn)``. The database records the version it is
+at in the single-row ``schema_version`` table, so a worker only has to read
+that one row at startup (``check_schema``) instead of reflecting every table.
+
+Run pending migrations before rolling out new code:
+    python -m app.migrations upgrade
+"""
+import importlib
+import logging
+import pkgutil
+from types import ModuleType
+from typing import List, Optional
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.sql import func
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "service_platform_migrations"
+LOCK_TIMEOUT_SECONDS = 300
+
+metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("version", Integer, nullable=False),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now(), onupdate=func.now()),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def load_migrations() -> List[ModuleType]:
+    """All migration modules, ordered by version."""
+    from app.migrations import versions
+
+    modules = [
+        importlib.import_module(f"{versions.__name__}.{info.name}")
+        for info in pkgutil.iter_modules(versions.__path__)
+    ]
+    return sorted(modules, key=lambda module: module.VERSION)
+
+
+def head() -> int:
+    """Version the code expects."""
+    return load_migrations()[-1].VERSION
+
+
+def current_version(conn: Connection) -> Optional[int]:
+    """Version recorded in the database, or None if never migrated."""
+    try:
+        return conn.execute(select(schema_version.c.version).where(schema_version.c.id == 1)).scalar()
+    except (OperationalError, ProgrammingError):
+        conn.rollback()
+        return None
+
+
+def _set_version(conn: Connection, version: int):
+    updated = conn.execute(
+        schema_version.update().where(schema_version.c.id == 1).values(version=version)
+    )
+    if not updated.rowcount:
+        conn.execute(schema_version.insert().values(id=1, version=version))
+
+
+def _lock(conn: Connection):
+    # Only one host migrates at a time
+    if conn.dialect.name == "mysql":
+        acquired = conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT_SECONDS}
+        ).scalar()
+        if not acquired:
+            raise SchemaVersionError("Timed out waiting for another migration run")
+
+
+def _unlock(conn: Connection):
+    if conn.dialect.name == "mysql":
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+
+def upgrade(engine: Engine, target: int = None) -> int:
+    """Apply pending migrations up to ``target`` (head by default); returns the new version."""
+    from app.database import Base
+    import app.models  # noqa: F401  (registers every table on Base.metadata)
+
+    migrations = load_migrations()
+    target = target or migrations[-1].VERSION
+
+    with engine.connect() as conn:
+        _lock(conn)
+        try:
+            metadata.create_all(conn)
+            version = current_version(conn)
+
+            if version is None and not inspect(conn).has_table("users"):
+                # Fresh database: create the current schema directly
+                Base.metadata.create_all(conn)
+                _set_version(conn, target)
+                conn.commit()
+                logger.info("Created schema at version %s", target)
+                return target
+
+            # Databases created by create_all before migrations existed start at 0;
+            # every migration is written to be idempotent for them
+            version = version or 0
+            for migration in migrations:
+                if version < migration.VERSION <= target:
+                    migration.upgrade(conn)
+                    _set_version(conn, migration.VERSION)
+                    conn.commit()
+                    version = migration.VERSION
+                    logger.info("Migrated to %s: %s", migration.VERSION, migration.DESCRIPTION)
+            return version
+        finally:
+            _unlock(conn)
+
+
+def check_schema(engine: Engine, auto_migrate: bool = False) -> int:
+    """Startup check: compare the one-row schema version with the code's head.
+
+    A database ahead of the code is accepted (migrations are additive, so old
+    workers keep running during a rollout); one behind is migrated when
+    ``auto_migrate`` is set and refused otherwise.
+    """
+    expected = head()
+    with engine.connect() as conn:
+        version = current_version(conn)
+
+    if version is not None and version >= expected:
+        return version
+    if auto_migrate:
+        return upgrade(engine)
+    raise SchemaVersionError(
+        f"Database schema is at version {version}, code expects {expected}. "
+        f"Run: python -m app.migrations upgrade"
+    )
+
+
+def create_index_online(conn: Connection, table: str, name: str, columns: List[str]):
+    """Create an index without blocking writes (MySQL online DDL); skips existing ones."""
+    if any(index["name"] == name for index in inspect(conn).get_indexes(table)):
+        return
+
+    column_list = ", ".join(columns)
+    if conn.dialect.name == "mysql":
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD INDEX {name} ({column_list}), ALGORITHM=INPLACE, LOCK=NONE"
+        ))
+    else:
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({column_list})"))
+
+
+def add_column_online(conn: Connection, table: str, name: str, ddl_type: str):
+    """Add a nullable column without blocking writes (MySQL online DDL); skips existing ones."""
+    if any(column["name"] == name for column in inspect(conn).get_columns(table)):
+        return
+
+    if conn.dialect.name == "mysql":
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type} NULL, ALGORITHM=INPLACE, LOCK=NONE"
+        ))
+    else:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type} NULL"))
+
+
+def create_tables(conn: Connection, *names: str):
+    """Create tables from the current models if they do not exist yet."""
+    from app.database import Base
+    import app.models  # noqa: F401
+
+    Base.metadata.create_all(conn, tables=[Base.metadata.tables[name] for name in names])
@@ -0,0 +1,27 @@
+"""
+Run: python -m app.migrations [upgrade|current] [--to VERSION]
+"""
+import argparse
+import logging
+from app.database import engine
+from app.migrations import upgrade, head, current_version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage database schema migrations.")
+    parser.add_argument("command", choices=["upgrade", "current"])
+    parser.add_argument("--to", type=int, default=None, help="target version (default: latest)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "current":
+        with engine.connect() as conn:
+            print(f"Database: {current_version(conn)}  Code: {head()}")
+        return
+
+    version = upgrade(engine, target=args.to)
+    print(f"✅ Schema at version {version}")
+
+
+if __name__ == "__main__":
+    main()
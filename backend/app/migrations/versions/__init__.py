@@ -0,0 +1 @@
+# Migration scripts, one module per version
@@ -0,0 +1,14 @@
+"""Tables created by init_db before migrations existed."""
+from sqlalchemy.engine import Connection
+from app.migrations import create_tables
+
+VERSION = 1
+DESCRIPTION = "baseline schema"
+
+
+def upgrade(conn: Connection):
+    create_tables(
+        conn,
+        "admins", "users", "services", "service_usages", "subscriptions",
+        "user_subscriptions", "payment_channels", "payments"
+    )
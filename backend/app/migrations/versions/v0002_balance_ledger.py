@@ -0,0 +1,17 @@
+"""Balance ledger tables, opened from the legacy users.balance column."""
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.migrations import create_tables
+
+VERSION = 2
+DESCRIPTION = "balance ledger and snapshots"
+
+
+def upgrade(conn: Connection):
+    from app.services.ledger import import_legacy_balances
+
+    create_tables(conn, "balance_entries", "balance_snapshots")
+    conn.commit()
+
+    with Session(bind=conn) as db:
+        import_legacy_balances(db)
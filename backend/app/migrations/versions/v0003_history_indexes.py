@@ -0,0 +1,11 @@
+"""Per-user time indexes for history queries on the hot tables."""
+from sqlalchemy.engine import Connection
+from app.migrations import create_index_online
+
+VERSION = 3
+DESCRIPTION = "history indexes on service_usages and payments"
+
+
+def upgrade(conn: Connection):
+    create_index_online(conn, "service_usages", "ix_service_usages_user_id_used_at", ["user_id", "used_at"])
+    create_index_online(conn, "payments", "ix_payments_user_id_created_at", ["user_id", "created_at"])
@@ -0,0 +1,10 @@
+"""Cold archive tables for the hot/cold split."""
+from sqlalchemy.engine import Connection
+from app.migrations import create_tables
+
+VERSION = 4
+DESCRIPTION = "archive tables and watermarks"
+
+
+def upgrade(conn: Connection):
+    create_tables(conn, "service_usages_archive", "payments_archive", "archive_watermarks")
@@ -0,0 +1,13 @@
+"""Change marker for conditional GETs on payment history."""
+from sqlalchemy.engine import Connection
+from app.migrations import add_column_online, create_index_online
+
+VERSION = 5
+DESCRIPTION = "payments.updated_at with (user_id, updated_at) index"
+
+
+def upgrade(conn: Connection):
+    # Existing rows stay NULL: count and max(id) already tell them apart
+    ddl_type = "DATETIME(6)" if conn.dialect.name == "mysql" else "DATETIME"
+    add_column_online(conn, "payments", "updated_at", ddl_type)
+    create_index_online(conn, "payments", "ix_payments_user_id_updated_at", ["user_id", "updated_at"])
@@ -0,0 +1,21 @@
+"""Pending-payments queue index and incrementally maintained dashboard counters."""
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.migrations import create_index_online, create_tables
+
+VERSION = 6
+DESCRIPTION = "pending queue index, subscription expiry index and dashboard counters"
+
+
+def upgrade(conn: Connection):
+    from app.services import counters
+
+    create_index_online(conn, "payments", "ix_payments_status_created_at", ["status", "created_at"])
+    create_index_online(
+        conn, "user_subscriptions", "ix_user_subscriptions_is_active_end_date", ["is_active", "end_date"]
+    )
+    create_tables(conn, "dashboard_counters")
+    conn.commit()
+
+    with Session(bind=conn) as db:
+        counters.rebuild(db)
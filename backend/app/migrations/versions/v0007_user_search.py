@@ -0,0 +1,54 @@
+"""Normalized phone numbers and indexes for admin user search."""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from app.migrations import add_column_online, create_index_online
+
+VERSION = 7
+DESCRIPTION = "normalized phones, phone_reversed and user search indexes"
+
+BATCH_SIZE = 10000
+
+
+def _backfill(conn: Connection):
+    """Strip spaces/dashes from phone_number and fill phone_reversed, in primary-key batches."""
+    from app.models.user import reverse_phone
+
+    max_id = conn.execute(text("SELECT MAX(id) FROM users")).scalar() or 0
+    for start in range(0, max_id + 1, BATCH_SIZE):
+        bounds = {"start": start, "end": start + BATCH_SIZE}
+        if conn.dialect.name == "mysql":
+            conn.execute(text(
+                "UPDATE users SET "
+                "phone_number = REPLACE(REPLACE(phone_number, ' ', ''), '-', ''), "
+                "phone_reversed = REVERSE(REPLACE(REPLACE(REPLACE(phone_number, ' ', ''), '-', ''), '+', '')) "
+                "WHERE id >= :start AND id < :end"
+            ), bounds)
+        else:
+            rows = conn.execute(
+                text("SELECT id, phone_number FROM users WHERE id >= :start AND id < :end"), bounds
+            ).all()
+            updates = []
+            for user_id, phone in rows:
+                phone = phone.replace(" ", "").replace("-", "")
+                updates.append({"id": user_id, "phone": phone, "reversed": reverse_phone(phone)})
+            if updates:
+                conn.execute(
+                    text("UPDATE users SET phone_number = :phone, phone_reversed = :reversed WHERE id = :id"),
+                    updates
+                )
+        conn.commit()
+
+
+def upgrade(conn: Connection):
+    add_column_online(conn, "users", "phone_reversed", "VARCHAR(20)")
+    _backfill(conn)
+    create_index_online(conn, "users", "ix_users_name", ["name"])
+    create_index_online(conn, "users", "ix_users_phone_reversed", ["phone_reversed"])
+
+    if conn.dialect.name == "mysql" and not any(
+        index["name"] == "ft_users_name" for index in inspect(conn).get_indexes("users")
+    ):
+        # The first FULLTEXT index rebuilds the table; InnoDB allows reads but not writes meanwhile
+        conn.execute(text(
+            "ALTER TABLE users ADD FULLTEXT INDEX ft_users_name (name), ALGORITHM=INPLACE, LOCK=SHARED"
+        ))
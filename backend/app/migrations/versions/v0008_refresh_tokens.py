@@ -0,0 +1,10 @@
+"""Rotating refresh tokens and the access-token revocation list."""
+from sqlalchemy.engine import Connection
+from app.migrations import create_tables
+
+VERSION = 8
+DESCRIPTION = "refresh_tokens and token_revocations"
+
+
+def upgrade(conn: Connection):
+    create_tables(conn, "refresh_tokens", "token_revocations")
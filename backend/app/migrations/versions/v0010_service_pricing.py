@@ -0,0 +1,12 @@
+"""Per-service prices, volume tiers and time-limited discounts."""
+from sqlalchemy.engine import Connection
+from app.migrations import add_column_online, create_tables
+
+VERSION = 10
+DESCRIPTION = "services.price, service_price_tiers and service_discounts"
+
+
+def upgrade(conn: Connection):
+    # Existing services stay NULL and keep costing settings.SERVICE_COST
+    add_column_online(conn, "services", "price", "FLOAT")
+    create_tables(conn, "service_price_tiers", "service_discounts")
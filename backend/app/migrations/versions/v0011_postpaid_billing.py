@@ -0,0 +1,12 @@
+"""Postpaid usage marker, billing runs and invoices."""
+from sqlalchemy.engine import Connection
+from app.migrations import add_column_online, create_tables
+
+VERSION = 11
+DESCRIPTION = "service_usages.postpaid, billing_runs and invoices"
+
+
+def upgrade(conn: Connection):
+    # Existing usage was charged when recorded: it stays NULL and is never invoiced
+    add_column_online(conn, "service_usages", "postpaid", "BOOLEAN")
+    create_tables(conn, "billing_runs", "invoices")
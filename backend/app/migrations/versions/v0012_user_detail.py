@@ -0,0 +1,11 @@
+"""Admin user detail: current-subscription index and heavy-user usage snapshots."""
+from sqlalchemy.engine import Connection
+from app.migrations import create_index_online, create_tables
+
+VERSION = 12
+DESCRIPTION = "user_subscriptions (user_id, end_date) index, user_usage_snapshots"
+
+
+def upgrade(conn: Connection):
+    create_index_online(conn, "user_subscriptions", "ix_user_subscriptions_user_id_end_date", ["user_id", "end_date"])
+    create_tables(conn, "user_usage_snapshots")
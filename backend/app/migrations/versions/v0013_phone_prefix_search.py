@@ -0,0 +1,10 @@
+"""Index on phone_number for leading-digit phone search."""
+from sqlalchemy.engine import Connection
+from app.migrations import create_index_online
+
+VERSION = 13
+DESCRIPTION = "users.phone_number index for phone prefix search"
+
+
+def upgrade(conn: Connection):
+    create_index_online(conn, "users", "ix_users_phone_number", ["phone_number"])
@@ -0,0 +1,10 @@
+"""Carry the postpaid marker into the usage archive."""
+from sqlalchemy.engine import Connection
+from app.migrations import add_column_online
+
+VERSION = 14
+DESCRIPTION = "service_usages_archive.postpaid"
+
+
+def upgrade(conn: Connection):
+    add_column_online(conn, "service_usages_archive", "postpaid", "BOOLEAN")
@@ -1,16 +1,35 @@
 from .admin import Admin
 from .user import User
-from .service import Service, ServiceUsage
+from .service import Service, ServiceUsage, ServicePriceTier, ServiceDiscount, UserUsageSnapshot
 from .subscription import Subscription, UserSubscription
 from .payment import PaymentChannel, Payment
+from .ledger import BalanceEntry, BalanceSnapshot
+from .archive import ServiceUsageArchive, PaymentArchive, ArchiveWatermark
+from .dashboard import DashboardCounter
+from .token import RefreshToken, TokenRevocation, EmailVerificationToken
+from .billing import BillingRun, Invoice
 
 __all__ = [
     "Admin",
     "User", 
     "Service",
     "ServiceUsage",
+    "ServicePriceTier",
+    "ServiceDiscount",
+    "UserUsageSnapshot",
     "Subscription",
     "UserSubscription",
     "PaymentChannel",
-    "Payment"
+    "Payment",
+    "BalanceEntry",
+    "BalanceSnapshot",
+    "ServiceUsageArchive",
+    "PaymentArchive",
+    "ArchiveWatermark",
+    "DashboardCounter",
+    "RefreshToken",
+    "TokenRevocation",
+    "EmailVerificationToken",
+    "BillingRun",
+    "Invoice"
 ]
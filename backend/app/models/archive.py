@@ -0,0 +1,54 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Index
+from app.database import Base
+
+
+class ServiceUsageArchive(Base):
+    """Cold copy of ``service_usages`` rows older than the retention window."""
+    __tablename__ = "service_usages_archive"
+    __table_args__ = (
+        Index("ix_service_usages_archive_user_id_used_at", "user_id", "used_at"),
+        {"mysql_row_format": "COMPRESSED"},
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    service_id = Column(Integer, nullable=False)
+    cost = Column(Float)
+    used_at = Column(DateTime(timezone=True))
+    # Only archived once its billing period has been invoiced
+    postpaid = Column(Boolean, nullable=True)
+    
+    def __repr__(self):
+        return f"<ServiceUsageArchive(id={self.id}, user_id={self.user_id})>"
+
+
+class PaymentArchive(Base):
+    """Cold copy of settled ``payments`` rows older than the retention window."""
+    __tablename__ = "payments_archive"
+    __table_args__ = (
+        Index("ix_payments_archive_user_id_created_at", "user_id", "created_at"),
+        {"mysql_row_format": "COMPRESSED"},
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    channel_id = Column(Integer, nullable=False)
+    transaction_id = Column(String(255), unique=True, nullable=False)
+    amount = Column(Float, nullable=False)
+    status = Column(String(20))
+    reject_reason = Column(String(500), nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    
+    def __repr__(self):
+        return f"<PaymentArchive(id={self.id}, transaction_id={self.transaction_id})>"
+
+
+class ArchiveWatermark(Base):
+    """Everything in ``table_name`` older than ``archived_before`` may be archived."""
+    __tablename__ = "archive_watermarks"
+    
+    table_name = Column(String(64), primary_key=True)
+    archived_before = Column(DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f"<ArchiveWatermark(table_name={self.table_name}, archived_before={self.archived_before})>"
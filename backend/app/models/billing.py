@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class BillingRun(Base):
+    """One postpaid billing run per period; ``last_user_id`` is its checkpoint."""
+    __tablename__ = "billing_runs"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    period_start = Column(DateTime, nullable=False, unique=True)
+    period_end = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False, default="running")
+    # Users up to and including this id are invoiced
+    last_user_id = Column(Integer, nullable=False, default=0)
+    invoices = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0.0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<BillingRun(period_start={self.period_start}, status={self.status})>"
+
+
+class Invoice(Base):
+    """A user's postpaid usage for one billing period, debited as one ledger entry."""
+    __tablename__ = "invoices"
+    __table_args__ = (
+        UniqueConstraint("user_id", "period_start", name="uq_invoices_user_id_period_start"),
+        Index("ix_invoices_billing_run_id_user_id", "billing_run_id", "user_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    billing_run_id = Column(Integer, ForeignKey("billing_runs.id"), nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    period_end = Column(DateTime, nullable=False)
+    usage_count = Column(Integer, nullable=False)
+    amount = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<Invoice(id={self.id}, user_id={self.user_id}, amount={self.amount})>"
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, Float
+from app.database import Base
+
+
+class DashboardCounter(Base):
+    """One shard of an admin dashboard counter; a counter's value is the sum of its shards."""
+    __tablename__ = "dashboard_counters"
+    
+    name = Column(String(50), primary_key=True)
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    value = Column(Float, nullable=False, default=0.0)
+    
+    def __repr__(self):
+        return f"<DashboardCounter(name={self.name}, shard={self.shard}, value={self.value})>"
@@ -0,0 +1,78 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, select
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship, column_property
+from app.database import Base
+from .user import User
+import enum
+
+
+class EntryKind(str, enum.Enum):
+    OPENING_BALANCE = "opening_balance"
+    DEPOSIT = "deposit"
+    SERVICE_USAGE = "service_usage"
+    SUBSCRIPTION = "subscription"
+    RESERVATION = "reservation"
+    RESERVATION_RELEASE = "reservation_release"
+    INVOICE = "invoice"
+
+
+class BalanceEntry(Base):
+    """Append-only credit (positive) or debit (negative) on a user's balance."""
+    __tablename__ = "balance_entries"
+    __table_args__ = (
+        Index("ix_balance_entries_user_id_id", "user_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    amount = Column(Float, nullable=False)
+    kind = Column(String(30), nullable=False)
+    reference_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    user = relationship("User", back_populates="balance_entries")
+
+    def __repr__(self):
+        return f"<BalanceEntry(id={self.id}, user_id={self.user_id}, amount={self.amount})>"
+
+
+class BalanceSnapshot(Base):
+    """Balance of a user folded up to and including ``last_entry_id``."""
+    __tablename__ = "balance_snapshots"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    balance = Column(Float, nullable=False, default=0.0)
+    last_entry_id = Column(Integer, nullable=False, default=0)
+    taken_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<BalanceSnapshot(user_id={self.user_id}, balance={self.balance})>"
+
+
+# Current balance = snapshot + entries after the snapshot. Loaded with the
+# user row itself; the delta is a short range on (user_id, id).
+_snapshot_balance = (
+    select(BalanceSnapshot.balance)
+    .where(BalanceSnapshot.user_id == User.id)
+    .correlate_except(BalanceSnapshot)
+    .scalar_subquery()
+)
+_snapshot_entry_id = (
+    select(BalanceSnapshot.last_entry_id)
+    .where(BalanceSnapshot.user_id == User.id)
+    .correlate_except(BalanceSnapshot)
+    .scalar_subquery()
+)
+_balance_delta = (
+    select(func.coalesce(func.sum(BalanceEntry.amount), 0.0))
+    .where(
+        BalanceEntry.user_id == User.id,
+        BalanceEntry.id > func.coalesce(_snapshot_entry_id, 0)
+    )
+    .correlate_except(BalanceEntry)
+    .scalar_subquery()
+)
+
+User.balance = column_property(func.coalesce(_snapshot_balance, 0.0) + _balance_delta)
+User.balance_entries = relationship("BalanceEntry", back_populates="user")
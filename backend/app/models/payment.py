@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
+from sqlalchemy.dialects import mysql
+from datetime import datetime
 from sqlalchemy.orm import relationship
 from app.database import Base
 import enum
@@ -27,6 +29,12 @@ class PaymentChannel(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_user_id_created_at", "user_id", "created_at"),
+        Index("ix_payments_user_id_updated_at", "user_id", "updated_at"),
+        # Admin pending queue, oldest first
+        Index("ix_payments_status_created_at", "status", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -36,6 +44,12 @@ class Payment(Base):
     status = Column(String(20), default=PaymentStatus.PENDING.value)
     reject_reason = Column(String(500), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set on every write with microseconds so ETags change on each status update
+    updated_at = Column(
+        DateTime(timezone=True).with_variant(mysql.DATETIME(fsp=6), "mysql"),
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow
+    )
     
     # Relationships
     user = relationship("User", back_populates="payments")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -10,9 +10,13 @@ class Service(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(255), nullable=False, unique=True)
     is_active = Column(Boolean, default=True)
+    # BDT per use; NULL charges settings.SERVICE_COST
+    price = Column(Float, nullable=True)
     
     # Relationships
     usages = relationship("ServiceUsage", back_populates="service")
+    price_tiers = relationship("ServicePriceTier", cascade="all, delete-orphan", order_by="ServicePriceTier.min_quantity")
+    discounts = relationship("ServiceDiscount", cascade="all, delete-orphan", order_by="ServiceDiscount.starts_at")
     
     def __repr__(self):
         return f"<Service(id={self.id}, name={self.name})>"
@@ -20,11 +24,16 @@ class Service(Base):
 
 class ServiceUsage(Base):
     __tablename__ = "service_usages"
+    __table_args__ = (
+        Index("ix_service_usages_user_id_used_at", "user_id", "used_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
-    cost = Column(Float, default=5.0)
+    cost = Column(Float, nullable=False)
+    # Recorded in postpaid mode: not yet debited, charged by the billing run
+    postpaid = Column(Boolean, nullable=True)
     used_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -33,3 +42,50 @@ class ServiceUsage(Base):
     
     def __repr__(self):
         return f"<ServiceUsage(id={self.id}, user_id={self.user_id}, service_id={self.service_id})>"
+
+
+class ServicePriceTier(Base):
+    """Volume price: ``unit_price`` per use once a call uses the service ``min_quantity`` times."""
+    __tablename__ = "service_price_tiers"
+    __table_args__ = (
+        UniqueConstraint("service_id", "min_quantity", name="uq_service_price_tiers_service_quantity"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
+    min_quantity = Column(Integer, nullable=False)
+    unit_price = Column(Float, nullable=False)
+    
+    def __repr__(self):
+        return f"<ServicePriceTier(service_id={self.service_id}, min_quantity={self.min_quantity})>"
+
+
+class ServiceDiscount(Base):
+    """Percentage off a service's price between ``starts_at`` and ``ends_at``."""
+    __tablename__ = "service_discounts"
+    __table_args__ = (
+        Index("ix_service_discounts_service_id", "service_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
+    percent_off = Column(Float, nullable=False)
+    starts_at = Column(DateTime, nullable=False)
+    ends_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<ServiceDiscount(service_id={self.service_id}, percent_off={self.percent_off})>"
+
+
+class UserUsageSnapshot(Base):
+    """Usage count and spend of a heavy user over usage ids up to ``last_usage_id`` (hot and archived)."""
+    __tablename__ = "user_usage_snapshots"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    usage_count = Column(Integer, nullable=False, default=0)
+    usage_spend = Column(Float, nullable=False, default=0.0)
+    last_usage_id = Column(Integer, nullable=False, default=0)
+    taken_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<UserUsageSnapshot(user_id={self.user_id}, usage_count={self.usage_count})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -22,6 +22,12 @@ class Subscription(Base):
 
 class UserSubscription(Base):
     __tablename__ = "user_subscriptions"
+    __table_args__ = (
+        # Expiry job: active subscriptions past their end date
+        Index("ix_user_subscriptions_is_active_end_date", "is_active", "end_date"),
+        # A user's current subscription (use-service, admin user detail)
+        Index("ix_user_subscriptions_user_id_end_date", "user_id", "end_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -0,0 +1,56 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
+from app.database import Base
+
+
+class RefreshToken(Base):
+    """A refresh token, stored as its SHA-256; each use replaces it with a new one in the same family."""
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("ix_refresh_tokens_subject", "user_type", "subject_id"),
+        Index("ix_refresh_tokens_family_id", "family_id"),
+        Index("ix_refresh_tokens_expires_at", "expires_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_type = Column(String(10), nullable=False)  # "user" or "admin"
+    subject_id = Column(Integer, nullable=False)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    family_id = Column(String(32), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<RefreshToken(id={self.id}, user_type={self.user_type}, subject_id={self.subject_id})>"
+
+
+class TokenRevocation(Base):
+    """Access tokens of a subject issued before ``revoked_before`` (epoch seconds) are invalid."""
+    __tablename__ = "token_revocations"
+    __table_args__ = (
+        Index("ix_token_revocations_revoked_before", "revoked_before"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_type = Column(String(10), nullable=False)
+    subject_id = Column(Integer, nullable=False)
+    revoked_before = Column(Float, nullable=False)
+    
+    def __repr__(self):
+        return f"<TokenRevocation(user_type={self.user_type}, subject_id={self.subject_id})>"
+
+
+class EmailVerificationToken(Base):
+    """An email verification link, stored as the SHA-256 of its token."""
+    __tablename__ = "email_verification_tokens"
+    __table_args__ = (
+        Index("ix_email_verification_tokens_user_id", "user_id"),
+        Index("ix_email_verification_tokens_expires_at", "expires_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<EmailVerificationToken(id={self.id}, user_id={self.user_id})>"
@@ -1,21 +1,33 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from app.database import Base
 
 
+def reverse_phone(phone: str) -> str:
+    """``+8801712345678`` -> ``8765432171088``."""
+    return "".join(ch for ch in phone if ch.isdigit())[::-1]
+
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_name", "name"),
+        Index("ix_users_phone_number", "phone_number"),
+        Index("ix_users_phone_reversed", "phone_reversed"),
+        # Word search in names; MySQL only (other databases fall back to LIKE)
+        Index("ft_users_name", "name", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(255), nullable=False)
     email = Column(String(255), unique=True, index=True, nullable=False)
     phone_number = Column(String(20), nullable=False)
+    # Digits of phone_number reversed, so "ends with" searches can use an index
+    phone_reversed = Column(String(20), nullable=True)
     password = Column(String(255), nullable=False)
     current_address = Column(Text, nullable=True)
     profile_image_url = Column(String(500), nullable=True)
-    balance = Column(Float, default=0.0)
-    last_generated_token = Column(String(255), nullable=True)
     otp = Column(String(6), nullable=True)
     is_user_verified = Column(Boolean, default=False)
     is_user_active = Column(Boolean, default=False)
@@ -28,6 +40,12 @@ class User(Base):
     subscriptions = relationship("UserSubscription", back_populates="user")
     payments = relationship("Payment", back_populates="user")
     service_usages = relationship("ServiceUsage", back_populates="user")
+    # balance and balance_entries are attached in app.models.ledger
+    
+    @validates("phone_number")
+    def _set_phone_reversed(self, key, value):
+        self.phone_reversed = reverse_phone(value)
+        return value
     
     def __repr__(self):
         return f"<User(id={self.id}, email={self.email})>"
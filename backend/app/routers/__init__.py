@@ -1,5 +1,6 @@
 from .auth import router as auth_router
 from .user import router as user_router
 from .admin import router as admin_router
+from .diagnostics import router as diagnostics_router
 
-__all__ = ["auth_router", "user_router", "admin_router"]
+__all__ = ["auth_router", "user_router", "admin_router", "diagnostics_router"]
@@ -1,25 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import desc, or_, and_
+from functools import partial
+from typing import List, Optional
+from datetime import datetime
 from app.database import get_db
 from app.dependencies import get_current_admin
-from app.models import Admin, User, Service, Subscription, Payment, PaymentChannel
+from app.models import (
+    Admin, User, Service, ServicePriceTier, ServiceDiscount, Subscription, Payment, PaymentChannel, PaymentArchive,
+    BillingRun
+)
 from app.schemas import (
     AdminLogin,
     AdminResponse,
     UserResponse,
     ServiceCreate,
     ServiceResponse,
+    ServicePricingUpdate,
+    ServicePricingResponse,
     SubscriptionCreate,
     SubscriptionResponse,
     PaymentResponse,
     PaymentChannelCreate,
     PaymentChannelUpdate,
     PaymentChannelResponse,
-    PaymentReject
+    PaymentReject,
+    DashboardResponse,
+    AdminUserDetailResponse,
+    BillingRunResponse
 )
-from app.core.security import verify_password, create_access_token
+from app.core.config import settings
+from app.core.security import verify_and_rehash
+from app.models.ledger import EntryKind
+from app.models.payment import PaymentStatus
+from app.services import ledger, archive, counters, tokens, user_search, user_detail, scheduler
+from app.services.catalog import catalog
+from app.services.pricing import price_table
+from app.services.events import publish_after_commit
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
@@ -29,7 +47,11 @@ async def admin_login(credentials: AdminLogin, db: Session = Depends(get_db)):
     """Admin login."""
     admin = db.query(Admin).filter(Admin.email == credentials.email.lower()).first()
     
-    if not admin or not verify_password(credentials.password, admin.password):
+    valid, new_hash = (
+        await run_in_threadpool(verify_and_rehash, credentials.password, admin.password)
+        if admin else (False, None)
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -41,20 +63,41 @@ async def admin_login(credentials: AdminLogin, db: Session = Depends(get_db)):
             detail="Admin account is disabled"
         )
     
-    access_token = create_access_token(
-        data={"id": admin.id, "email": admin.email, "user_type": "admin"}
-    )
+    if new_hash:
+        admin.password = new_hash
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "admin": {
-            "id": admin.id,
-            "email": admin.email,
-            "is_active": admin.is_active,
-            "created_at": admin.created_at.isoformat()
-        }
+    admin_data = {
+        "id": admin.id,
+        "email": admin.email,
+        "is_active": admin.is_active,
+        "created_at": admin.created_at.isoformat()
     }
+    
+    # Renewed through POST /api/auth/refresh
+    issued = tokens.issue_tokens(db, "admin", admin.id, {"email": admin.email})
+    db.commit()
+    
+    return {**issued, "admin": admin_data}
+
+
+# ==================== Dashboard ====================
+
+@router.get("/dashboard", response_model=DashboardResponse)
+async def get_dashboard(
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Dashboard counters (revenue is approved deposits of the current UTC day)."""
+    return counters.read(db)
+
+
+@router.post("/dashboard/recount", response_model=DashboardResponse)
+async def recount_dashboard(
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Recount dashboard counters from the source tables (after bulk data loads)."""
+    return counters.rebuild(db)
 
 
 # ==================== User Management ====================
@@ -69,6 +112,39 @@ async def get_users(
     return users
 
 
+@router.get("/users/search", response_model=List[UserResponse])
+async def search_users(
+    q: str = Query(..., min_length=2, max_length=100, description="name, email or phone number (prefixes allowed)"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Search users by name, email or phone, best matches first."""
+    return user_search.search_users(db, q, limit)
+
+
+@router.get("/user/{user_id}", response_model=AdminUserDetailResponse)
+async def get_user_detail(
+    user_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Get one user with balance, deposits, usage totals, current subscription and last payment."""
+    detail = user_detail.user_detail(db, user_id)
+    
+    if not detail:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    
+    if detail.pop("unsnapshotted_usages") >= settings.USER_USAGE_SNAPSHOT_MIN_ROWS:
+        # Heavy user: fold their usage totals so later reads stay short
+        background_tasks.add_task(
+            scheduler.run_job, "user_usage_snapshot", partial(user_detail.refresh_usage_snapshot, user_id=user_id)
+        )
+    
+    return detail
+
+
 @router.patch("/user/{user_id}/activate")
 async def toggle_user_activation(
     user_id: int,
@@ -82,6 +158,10 @@ async def toggle_user_activation(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     user.is_user_active = not user.is_user_active
+    counters.bump(db, counters.ACTIVE_USERS, 1 if user.is_user_active else -1)
+    if not user.is_user_active:
+        # Outstanding tokens stop working on every worker within TOKEN_REVOCATION_SYNC_SECONDS
+        tokens.revoke_subject(db, "user", user.id)
     db.commit()
     
     return {"message": f"User {'activated' if user.is_user_active else 'deactivated'} successfully"}
@@ -133,6 +213,7 @@ async def create_service(
     db.add(service)
     db.commit()
     db.refresh(service)
+    price_table.invalidate()
     return service
 
 
@@ -150,10 +231,58 @@ async def toggle_service(
     
     service.is_active = not service.is_active
     db.commit()
+    price_table.invalidate()
     
     return {"message": f"Service {'activated' if service.is_active else 'deactivated'} successfully"}
 
 
+def _pricing_response(db: Session, service: Service) -> dict:
+    return {
+        "service_id": service.id,
+        "price": service.price,
+        "current_unit_price": price_table.service(db, service.id).unit_price(),
+        "tiers": service.price_tiers,
+        "discounts": service.discounts,
+    }
+
+
+@router.get("/service/{service_id}/pricing", response_model=ServicePricingResponse)
+async def get_service_pricing(
+    service_id: int,
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Get a service's price, volume tiers and discounts."""
+    service = db.query(Service).filter(Service.id == service_id).first()
+    
+    if not service:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+    
+    return _pricing_response(db, service)
+
+
+@router.put("/service/{service_id}/pricing", response_model=ServicePricingResponse)
+async def update_service_pricing(
+    service_id: int,
+    pricing: ServicePricingUpdate,
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Replace a service's price, volume tiers and discounts."""
+    service = db.query(Service).filter(Service.id == service_id).first()
+    
+    if not service:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+    
+    service.price = pricing.price
+    service.price_tiers = [ServicePriceTier(**tier.model_dump()) for tier in pricing.tiers]
+    service.discounts = [ServiceDiscount(**discount.model_dump()) for discount in pricing.discounts]
+    db.commit()
+    price_table.invalidate()
+    
+    return _pricing_response(db, service)
+
+
 # ==================== Subscriptions Management ====================
 
 @router.get("/subscriptions", response_model=List[SubscriptionResponse])
@@ -206,14 +335,39 @@ async def toggle_subscription(
 
 @router.get("/payments", response_model=List[PaymentResponse])
 async def get_payments(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
-    """Get all payments."""
-    payments = db.query(Payment).order_by(desc(Payment.created_at)).all()
+    """Get all payments (archived payments unless start_date is past the archive watermark)."""
+    payments = archive.history(db, Payment, PaymentArchive, "created_at", start_date, end_date)
     return payments
 
 
+@router.get("/payments/pending", response_model=List[PaymentResponse])
+async def get_pending_payments(
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = Query(None, description="id of the last payment of the previous page"),
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Pending payments, oldest first (keyset pagination on ix_payments_status_created_at)."""
+    query = db.query(Payment).options(joinedload(Payment.channel)).filter(
+        Payment.status == PaymentStatus.PENDING.value
+    )
+    
+    if after_id is not None:
+        last = db.query(Payment.created_at).filter(Payment.id == after_id).scalar()
+        if last is not None:
+            query = query.filter(or_(
+                Payment.created_at > last,
+                and_(Payment.created_at == last, Payment.id > after_id)
+            ))
+    
+    return query.order_by(Payment.created_at, Payment.id).limit(limit).all()
+
+
 @router.post("/payment/{payment_id}/approve")
 async def approve_payment(
     payment_id: int,
@@ -232,10 +386,14 @@ async def approve_payment(
     # Update payment status
     payment.status = "approved"
     
-    # Add balance to user
-    user = db.query(User).filter(User.id == payment.user_id).first()
-    if user:
-        user.balance += payment.amount
+    # Credit the user's balance
+    ledger.post_entry(db, payment.user_id, payment.amount, EntryKind.DEPOSIT, payment.id)
+    counters.bump_many(db, {
+        counters.PENDING_COUNT: -1,
+        counters.PENDING_AMOUNT: -payment.amount,
+        counters.revenue_counter(): payment.amount,
+    })
+    publish_after_commit(db, payment.user_id, "payment", {"id": payment.id, "status": payment.status})
     
     db.commit()
     
@@ -260,11 +418,30 @@ async def reject_payment(
     
     payment.status = "rejected"
     payment.reject_reason = reject_data.reject_reason
+    counters.bump_many(db, {counters.PENDING_COUNT: -1, counters.PENDING_AMOUNT: -payment.amount})
+    publish_after_commit(db, payment.user_id, "payment", {
+        "id": payment.id,
+        "status": payment.status,
+        "reject_reason": payment.reject_reason
+    })
     db.commit()
     
     return {"message": "Payment rejected successfully"}
 
 
+# ==================== Billing ====================
+
+@router.get("/billing/runs", response_model=List[BillingRunResponse])
+async def get_billing_runs(
+    limit: int = Query(24, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Get recent postpaid billing runs with their progress."""
+    runs = db.query(BillingRun).order_by(desc(BillingRun.period_start)).limit(limit).all()
+    return runs
+
+
 # ==================== Payment Channels Management ====================
 
 @router.get("/payment-channels", response_model=List[PaymentChannelResponse])
@@ -292,6 +469,7 @@ async def create_payment_channel(
     db.add(channel)
     db.commit()
     db.refresh(channel)
+    catalog.invalidate()
     return channel
 
 
@@ -315,6 +493,7 @@ async def update_payment_channel(
     
     db.commit()
     db.refresh(channel)
+    catalog.invalidate()
     
     return {"message": "Payment channel updated successfully"}
 
@@ -341,5 +520,6 @@ async def delete_payment_channel(
     
     db.delete(channel)
     db.commit()
+    catalog.invalidate()
     
     return {"message": "Payment channel deleted successfully"}
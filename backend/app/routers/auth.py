@@ -1,16 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User
-from app.schemas import UserCreate, UserLogin, UserResponse, Token
+from app.models import User, Admin
+from app.schemas import UserCreate, UserLogin, UserResponse, Token, RefreshRequest, VerificationResend
 from app.core.security import (
     get_password_hash, 
-    verify_password, 
-    create_access_token,
-    generate_verification_token
+    verify_and_rehash
 )
 from datetime import timedelta
 from app.core.config import settings
+from app.services import tokens, verification
 from app.utils.email import send_verification_email  # Correct import
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
@@ -27,27 +27,23 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             detail="Email already registered"
         )
     
-    # Generate verification token
-    verification_token = generate_verification_token()
-    
     # Create new user
     new_user = User(
         name=user_data.name,
         email=user_data.email.lower(),
         phone_number=user_data.phone_number,
-        password=get_password_hash(user_data.password),
+        password=await run_in_threadpool(get_password_hash, user_data.password),
         current_address=user_data.current_address,
-        last_generated_token=verification_token,
         is_user_verified=False,
         is_user_active=False,
         is_email_verified=False,
-        is_phone_verified=False,
-        balance=0.0
+        is_phone_verified=False
     )
     
     db.add(new_user)
+    db.flush()
+    verification_token = verification.create_token(db, new_user.id)
     db.commit()
-    db.refresh(new_user)
     
     # Send verification email
     send_verification_email(user_data.email, verification_token)
@@ -63,51 +59,108 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
     """Login user and return access token."""
     user = db.query(User).filter(User.email == credentials.email.lower()).first()
     
-    if not user or not verify_password(credentials.password, user.password):
+    # Hashing is deliberately slow: keep it off the event loop
+    valid, new_hash = (
+        await run_in_threadpool(verify_and_rehash, credentials.password, user.password)
+        if user else (False, None)
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
-    # Create access token
-    access_token = create_access_token(
-        data={"id": user.id, "email": user.email, "user_type": "user"}
-    )
+    if new_hash:
+        # Stored hash uses an old scheme or cost
+        user.password = new_hash
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": {
-            "id": user.id,
-            "name": user.name,
-            "email": user.email,
-            "phone_number": user.phone_number,
-            "current_address": user.current_address,
-            "profile_image_url": user.profile_image_url,
-            "balance": user.balance,
-            "is_user_verified": user.is_user_verified,
-            "is_user_active": user.is_user_active,
-            "is_email_verified": user.is_email_verified,
-            "is_phone_verified": user.is_phone_verified,
-            "created_at": user.created_at.isoformat(),
-            "updated_at": user.updated_at.isoformat()
-        }
+    user_data = {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "phone_number": user.phone_number,
+        "current_address": user.current_address,
+        "profile_image_url": user.profile_image_url,
+        "balance": user.balance,
+        "is_user_verified": user.is_user_verified,
+        "is_user_active": user.is_user_active,
+        "is_email_verified": user.is_email_verified,
+        "is_phone_verified": user.is_phone_verified,
+        "created_at": user.created_at.isoformat(),
+        "updated_at": user.updated_at.isoformat()
     }
+    
+    # Short-lived access token plus a refresh token to renew it
+    issued = tokens.issue_tokens(db, "user", user.id, {"email": user.email})
+    db.commit()
+    
+    return {**issued, "user": user_data}
+
+
+@router.post("/refresh", response_model=dict)
+async def refresh(body: RefreshRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token (user or admin) for a new access and refresh token."""
+    token = tokens.use_refresh_token(db, body.refresh_token)
+    
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token"
+        )
+    
+    if token.user_type == "admin":
+        subject = db.query(Admin).filter(Admin.id == token.subject_id, Admin.is_active == True).first()
+    else:
+        subject = db.query(User).filter(User.id == token.subject_id).first()
+    
+    if subject is None:
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token"
+        )
+    
+    issued = tokens.issue_tokens(db, token.user_type, subject.id, {"email": subject.email}, token.family_id)
+    db.commit()
+    
+    return issued
+
+
+@router.post("/logout")
+async def logout(body: RefreshRequest, db: Session = Depends(get_db)):
+    """Revoke the refresh token and every token rotated from it."""
+    tokens.revoke_login(db, body.refresh_token)
+    db.commit()
+    
+    return {"message": "Logged out successfully"}
 
 
 @router.get("/verify-email/{token}")
 async def verify_email(token: str, db: Session = Depends(get_db)):
     """Verify user email with token."""
-    user = db.query(User).filter(User.last_generated_token == token).first()
+    user_id = verification.consume_token(db, token)
     
-    if not user:
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired verification token"
         )
     
-    user.is_email_verified = True
-    user.last_generated_token = None
+    db.query(User).filter(User.id == user_id).update({"is_email_verified": True}, synchronize_session=False)
     db.commit()
     
     return {"message": "Email verified successfully. Please wait for admin to activate your account."}
+
+
+@router.post("/resend-verification")
+async def resend_verification(body: VerificationResend, db: Session = Depends(get_db)):
+    """Send a new verification link (earlier links stop working)."""
+    user = db.query(User).filter(User.email == body.email.lower()).first()
+    
+    # Same answer whether or not the address is registered
+    if user is not None and not user.is_email_verified:
+        verification_token = verification.create_token(db, user.id)
+        db.commit()
+        send_verification_email(user.email, verification_token)
+    
+    return {"message": "If the address is registered and unverified, a new verification email has been sent."}
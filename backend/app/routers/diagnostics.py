@@ -0,0 +1,131 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from typing import List
+from app.dependencies import get_current_admin
+from app.models import Admin
+from app.core.cpu_profiler import profile_store, sampler
+from app.core import memory, deadlines
+
+# Diagnostics act on the worker process that handles the request
+router = APIRouter(prefix="/api/admin/diagnostics", tags=["Diagnostics"])
+
+
+# ==================== CPU Profiles ====================
+
+@router.get("/profiles", response_model=List[dict])
+async def list_profiles(current_admin: Admin = Depends(get_current_admin)):
+    """List stored request profiles, newest first."""
+    return profile_store.list()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(
+    profile_id: str,
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|ncalls)$"),
+    limit: int = Query(50, ge=1, le=1000),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Human-readable pstats report of a profiled request."""
+    report = profile_store.report(profile_id, sort, limit)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return report
+
+
+@router.get("/profiles/{profile_id}/download")
+async def download_profile(profile_id: str, current_admin: Admin = Depends(get_current_admin)):
+    """Raw pstats file (snakeviz, flameprof, ...)."""
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
+
+
+# ==================== Sampling Profiler ====================
+
+@router.get("/sampler", response_model=dict)
+async def sampler_status(current_admin: Admin = Depends(get_current_admin)):
+    """Sampling profiler status of this worker."""
+    return sampler.status()
+
+
+@router.post("/sampler/start", response_model=dict)
+async def start_sampler(
+    interval_ms: float = Query(10, ge=1, le=1000),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Start sampling all threads of this worker."""
+    sampler.start(interval_ms)
+    return sampler.status()
+
+
+@router.post("/sampler/stop", response_model=dict)
+async def stop_sampler(current_admin: Admin = Depends(get_current_admin)):
+    """Stop sampling; collected stacks are kept."""
+    sampler.stop()
+    return sampler.status()
+
+
+@router.get("/sampler/folded", response_class=PlainTextResponse)
+async def sampler_folded(current_admin: Admin = Depends(get_current_admin)):
+    """Collected stacks in folded format for flamegraph.pl or speedscope."""
+    return sampler.folded()
+
+
+@router.delete("/sampler", response_model=dict)
+async def reset_sampler(current_admin: Admin = Depends(get_current_admin)):
+    """Discard collected stacks."""
+    sampler.reset()
+    return sampler.status()
+
+
+# ==================== Memory ====================
+
+@router.get("/memory", response_model=dict)
+async def memory_overview(current_admin: Admin = Depends(get_current_admin)):
+    """RSS, GC, tracemalloc status, session identity maps and cache sizes."""
+    return memory.overview()
+
+
+@router.post("/memory/tracemalloc/start", response_model=dict)
+async def start_tracemalloc(
+    frames: int = Query(10, ge=1, le=50),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Start tracing allocations (slows the worker down noticeably)."""
+    memory.start_tracing(frames)
+    return memory.overview()["tracemalloc"]
+
+
+@router.post("/memory/tracemalloc/stop", response_model=dict)
+async def stop_tracemalloc(current_admin: Admin = Depends(get_current_admin)):
+    """Stop tracing allocations and drop the stored snapshot."""
+    memory.stop_tracing()
+    return memory.overview()["tracemalloc"]
+
+
+@router.post("/memory/snapshot", response_model=dict)
+async def memory_snapshot(
+    limit: int = Query(25, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Top allocation sites, and growth since the previous snapshot."""
+    try:
+        return memory.snapshot(limit, group_by)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+
+
+@router.post("/memory/trim", response_model=dict)
+async def trim_memory(current_admin: Admin = Depends(get_current_admin)):
+    """Full GC, then return freed heap pages to the OS."""
+    return memory.trim()
+
+
+# ==================== Request Deadlines ====================
+
+@router.get("/timeouts", response_model=dict)
+async def timeouts(current_admin: Admin = Depends(get_current_admin)):
+    """Requests that ran out of time per route and reason, and statements stopped."""
+    return deadlines.stats.snapshot()
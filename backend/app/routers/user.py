@@ -1,63 +1,95 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import case, desc, func, insert
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
-from typing import List
-from app.database import get_db
-from app.dependencies import get_current_user, get_current_active_user, get_current_verified_user
-from app.models import User, Service, ServiceUsage, Subscription, UserSubscription, Payment, PaymentChannel
+from typing import List, Optional
+from app.database import get_db, SessionLocal
+from app.dependencies import (
+    get_current_user, get_current_user_id, get_current_user_or_cached, get_current_active_user,
+    get_current_verified_user
+)
+from app.models import (
+    User, ServiceUsage, Subscription, UserSubscription, Payment, BalanceEntry,
+    ServiceUsageArchive, PaymentArchive, Invoice
+)
 from app.schemas import (
     UserResponse,
     ServiceResponse,
     ServiceUsageResponse,
     ServiceUsageCreate,
+    ServiceUsageBatchCreate,
+    ServiceUsageBatchResponse,
     PaymentCreate,
     PaymentResponse,
+    PaymentChannelResponse,
     UserSubscriptionResponse,
     UserSubscriptionCreate,
-    SubscriptionResponse
+    SubscriptionResponse,
+    BalanceEntryResponse,
+    InvoiceResponse
 )
 from app.core.config import settings
+from app.core.etag import conditional
+from app.models.ledger import EntryKind
+from app.models.payment import PaymentStatus
+from app.services import ledger, archive, counters
+from app.services.catalog import catalog
+from app.services.pricing import price_table
+from app.services.events import broker, publish_after_commit, CLOSED
+from app.services.quota import quota_reservations
+from app.services.usage_buffer import usage_buffer
 
 router = APIRouter(prefix="/api/user", tags=["User"])
 
 
 @router.get("/profile", response_model=UserResponse)
-async def get_profile(current_user: User = Depends(get_current_user)):
-    """Get current user profile."""
+async def get_profile(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user_or_cached)
+):
+    """Get current user profile (supports If-None-Match; last known while degraded)."""
+    # The user row, balance included, is already loaded by authentication
+    not_modified = conditional(request, response, current_user.id, current_user.updated_at, current_user.balance)
+    if not_modified:
+        return not_modified
+    
     return current_user
 
 
 @router.get("/services", response_model=List[ServiceResponse])
 async def get_services(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
-    """Get all active services."""
-    services = db.query(Service).filter(Service.is_active == True).all()
-    return services
+    """Get all active services with their current price."""
+    return sorted(price_table.active_services(db), key=lambda service: service.id)
 
 
 @router.post("/use-service", response_model=ServiceUsageResponse)
 async def use_service(
     usage_data: ServiceUsageCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_verified_user)
 ):
-    """Use a service (costs 5 BDT or requires active subscription)."""
-    # Check if service exists and is active
-    service = db.query(Service).filter(
-        Service.id == usage_data.service_id,
-        Service.is_active == True
-    ).first()
+    """Use a service (charged at its current price unless a subscription covers it)."""
+    # Validated and priced from the in-memory price table, no query
+    service = price_table.service(db, usage_data.service_id)
     
-    if not service:
+    if not service or not service.is_active:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Service not found or not active"
         )
     
-    service_cost = settings.SERVICE_COST
+    service_cost = service.unit_price()
     
     # Check if user has active subscription
     has_subscription = db.query(UserSubscription).filter(
@@ -66,67 +98,192 @@ async def use_service(
         UserSubscription.end_date >= datetime.utcnow()
     ).first()
     
-    if not has_subscription:
+    # Amount to debit from the balance by this call
+    debit = 0.0
+    # Recorded now, invoiced by the billing run
+    postpaid = None
+    
+    if has_subscription:
+        # Free service with subscription
+        service_cost = 0
+    elif not service_cost:
+        # Priced at zero (tier or 100% discount): nothing to charge
+        pass
+    elif settings.BILLING_MODE == "postpaid":
+        postpaid = True
+    elif settings.QUOTA_RESERVATIONS:
+        # Charged against this worker's reserved block
+        if not quota_reservations.charge(db, current_user.id, service_cost):
+            raise HTTPException(
+                status_code=status.HTTP_402_PAYMENT_REQUIRED,
+                detail=f"Insufficient balance. Required: ৳{service_cost}, Available: ৳{current_user.balance}"
+            )
+    else:
         # Check balance
         if current_user.balance < service_cost:
             raise HTTPException(
                 status_code=status.HTTP_402_PAYMENT_REQUIRED,
                 detail=f"Insufficient balance. Required: ৳{service_cost}, Available: ৳{current_user.balance}"
             )
+        debit = service_cost
+    
+    if settings.USAGE_WRITE_BEHIND:
+        # Only the debit is written now; the usage record is batched
+        if debit:
+            ledger.post_entry(db, current_user.id, -debit, EntryKind.SERVICE_USAGE)
+            db.commit()
         
-        # Deduct balance
-        current_user.balance -= service_cost
-    else:
-        # Free service with subscription
-        service_cost = 0
+        usage = usage_buffer.add(current_user.id, service.id, service_cost, postpaid)
+        if usage_buffer.should_flush():
+            background_tasks.add_task(usage_buffer.flush)
+        
+        return {**usage, "service": service}
     
     # Create usage record
     usage = ServiceUsage(
         user_id=current_user.id,
         service_id=service.id,
-        cost=service_cost
+        cost=service_cost,
+        postpaid=postpaid,
+        used_at=datetime.utcnow()
     )
     
     db.add(usage)
+    
+    if debit:
+        # Deduct balance
+        db.flush()
+        ledger.post_entry(db, current_user.id, -debit, EntryKind.SERVICE_USAGE, usage.id)
+    
     db.commit()
-    db.refresh(usage)
     
-    # Load service relationship
-    usage.service = service
+    # Built from the written values: no refresh, no service load
+    return {
+        "id": usage.id,
+        "user_id": usage.user_id,
+        "service_id": usage.service_id,
+        "service": service,
+        "cost": usage.cost,
+        "used_at": usage.used_at
+    }
+
+
+@router.post("/use-service/batch", response_model=ServiceUsageBatchResponse)
+async def use_service_batch(
+    batch: ServiceUsageBatchCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_verified_user)
+):
+    """Use several services at once: one debit for the whole batch, per-item results."""
+    units = sum(item.quantity for item in batch.items)
+    if units > settings.USAGE_BATCH_MAX_UNITS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.USAGE_BATCH_MAX_UNITS} uses per batch"
+        )
     
-    return usage
+    # Validated and priced from the in-memory price table, no query
+    quantities = {}
+    for item in batch.items:
+        quantities[item.service_id] = quantities.get(item.service_id, 0) + item.quantity
+    services = {service_id: price_table.service(db, service_id) for service_id in quantities}
+    active_ids = {service_id for service_id, service in services.items() if service and service.is_active}
+    
+    has_subscription = db.query(UserSubscription.id).filter(
+        UserSubscription.user_id == current_user.id,
+        UserSubscription.is_active == True,
+        UserSubscription.end_date >= datetime.utcnow()
+    ).first() is not None
+    
+    # Volume tiers count every use of a service in the batch
+    used_at = datetime.utcnow()
+    unit_costs = {
+        service_id: 0 if has_subscription else services[service_id].unit_price(quantities[service_id], used_at)
+        for service_id in active_ids
+    }
+    accepted = [item for item in batch.items if item.service_id in active_ids]
+    total_cost = round(sum(unit_costs[item.service_id] * item.quantity for item in accepted), 2)
+    
+    postpaid = True if total_cost and settings.BILLING_MODE == "postpaid" else None
+    
+    # All or nothing: a balance short of the whole batch charges none of it
+    if total_cost and not postpaid:
+        if settings.QUOTA_RESERVATIONS:
+            affordable = quota_reservations.charge(db, current_user.id, total_cost)
+        else:
+            affordable = current_user.balance >= total_cost
+        if not affordable:
+            raise HTTPException(
+                status_code=status.HTTP_402_PAYMENT_REQUIRED,
+                detail=f"Insufficient balance. Required: ৳{total_cost}, Available: ৳{current_user.balance}"
+            )
+    
+    rows = [
+        {
+            "user_id": current_user.id,
+            "service_id": item.service_id,
+            "cost": unit_costs[item.service_id],
+            "postpaid": postpaid if unit_costs[item.service_id] else None,
+            "used_at": used_at
+        }
+        for item in accepted
+        for _ in range(item.quantity)
+    ]
+    
+    if total_cost and not postpaid and not settings.QUOTA_RESERVATIONS:
+        ledger.post_entry(db, current_user.id, -total_cost, EntryKind.SERVICE_USAGE)
+    
+    if rows:
+        if settings.USAGE_WRITE_BEHIND:
+            db.commit()
+            for row in rows:
+                usage_buffer.add(row["user_id"], row["service_id"], row["cost"], row["postpaid"])
+            if usage_buffer.should_flush():
+                background_tasks.add_task(usage_buffer.flush)
+        else:
+            # Usage rows and the debit commit together
+            db.execute(insert(ServiceUsage), rows)
+            db.commit()
+    
+    results = []
+    for item in batch.items:
+        if item.service_id not in active_ids:
+            results.append({
+                "service_id": item.service_id,
+                "quantity": item.quantity,
+                "cost": 0,
+                "status": "rejected",
+                "detail": "Service not found or not active"
+            })
+        else:
+            unit_cost = unit_costs[item.service_id]
+            results.append({
+                "service_id": item.service_id,
+                "quantity": item.quantity,
+                "cost": round(unit_cost * item.quantity, 2),
+                "status": "charged" if unit_cost else "free"
+            })
+    
+    return {"items": results, "total_cost": total_cost, "used_at": used_at}
 
 
 @router.post("/add-payment", response_model=PaymentResponse)
 async def add_payment(
     payment_data: PaymentCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
     """Submit a payment for approval."""
-    # Check if channel exists and is active
-    channel = db.query(PaymentChannel).filter(
-        PaymentChannel.id == payment_data.channel_id,
-        PaymentChannel.is_active == True
-    ).first()
+    # Channels come from the per-worker catalog, not a query
+    channel = catalog.channel(db, payment_data.channel_id)
     
-    if not channel:
+    if channel is None or not channel.is_active:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Payment channel not found or not active"
         )
     
-    # Check for duplicate transaction ID
-    existing_payment = db.query(Payment).filter(
-        Payment.transaction_id == payment_data.transaction_id
-    ).first()
-    
-    if existing_payment:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Transaction ID already exists"
-        )
-    
     # Validate amount
     if payment_data.amount <= 0:
         raise HTTPException(
@@ -134,54 +291,144 @@ async def add_payment(
             detail="Amount must be greater than 0"
         )
     
-    # Create payment
-    payment = Payment(
-        user_id=current_user.id,
-        channel_id=payment_data.channel_id,
-        transaction_id=payment_data.transaction_id,
-        amount=payment_data.amount,
-        status="pending"
-    )
+    now = datetime.utcnow()
+    values = {
+        "user_id": user_id,
+        "channel_id": channel.id,
+        "transaction_id": payment_data.transaction_id,
+        "amount": payment_data.amount,
+        "status": PaymentStatus.PENDING.value,
+        "created_at": now,
+        "updated_at": now,
+    }
     
-    db.add(payment)
-    db.commit()
-    db.refresh(payment)
+    # Duplicate transaction IDs are rejected by the unique indexes, not a prior SELECT
+    try:
+        payment_id = archive.insert_payment(db, values)
+    except IntegrityError as error:
+        db.rollback()
+        if not archive.is_duplicate_key(error):
+            raise
+        payment_id = None
     
-    payment.channel = channel
+    if payment_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Transaction ID already exists"
+        )
+    
+    counters.bump_many(db, {counters.PENDING_COUNT: 1, counters.PENDING_AMOUNT: payment_data.amount})
+    publish_after_commit(db, user_id, "payment", {"id": payment_id, "status": values["status"]})
+    db.commit()
     
-    return payment
+    # Built from what was written: no read-back
+    return PaymentResponse(id=payment_id, channel=PaymentChannelResponse.model_validate(channel), **values)
 
 
 @router.get("/payments", response_model=List[PaymentResponse])
 async def get_payments(
+    request: Request,
+    response: Response,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
-    """Get user's payment history."""
-    payments = db.query(Payment).filter(
-        Payment.user_id == current_user.id
-    ).order_by(desc(Payment.created_at)).all()
+    """Get user's payment history (archived payments unless start_date is past the archive watermark; supports If-None-Match)."""
+    # Covered by ix_payments_user_id_updated_at; archival changes the count
+    marker = db.query(func.count(Payment.id), func.max(Payment.id), func.max(Payment.updated_at)).filter(
+        Payment.user_id == user_id
+    ).one()
+    not_modified = conditional(request, response, user_id, *marker)
+    if not_modified:
+        return not_modified
+    
+    payments = archive.history(
+        db, Payment, PaymentArchive, "created_at",
+        start_date, end_date,
+        user_id=user_id
+    )
     
     return payments
 
 
+@router.get("/service-usages", response_model=List[ServiceUsageResponse])
+async def get_service_usages(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Get user's service usage history (archived usages unless start_date is past the archive watermark)."""
+    usages = archive.history(
+        db, ServiceUsage, ServiceUsageArchive, "used_at",
+        start_date, end_date,
+        user_id=user_id
+    )
+    
+    return usages
+
+
 @router.get("/subscriptions", response_model=List[UserSubscriptionResponse])
 async def get_subscriptions(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
-    """Get user's subscription history."""
+    """Get user's subscription history (supports If-None-Match)."""
+    # A purchase adds a row; expiry (job or newer purchase) only turns is_active
+    # off, which lowers the active count
+    marker = db.query(
+        func.count(UserSubscription.id),
+        func.max(UserSubscription.id),
+        func.sum(case((UserSubscription.is_active == True, 1), else_=0))
+    ).filter(
+        UserSubscription.user_id == user_id
+    ).one()
+    not_modified = conditional(request, response, user_id, *marker)
+    if not_modified:
+        return not_modified
+    
     subscriptions = db.query(UserSubscription).filter(
-        UserSubscription.user_id == current_user.id
+        UserSubscription.user_id == user_id
     ).order_by(desc(UserSubscription.start_date)).all()
     
     return subscriptions
 
 
+@router.get("/balance-history", response_model=List[BalanceEntryResponse])
+async def get_balance_history(
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Get user's most recent balance credits and debits."""
+    entries = db.query(BalanceEntry).filter(
+        BalanceEntry.user_id == user_id
+    ).order_by(desc(BalanceEntry.id)).limit(limit).all()
+    
+    return entries
+
+
+@router.get("/invoices", response_model=List[InvoiceResponse])
+async def get_invoices(
+    limit: int = Query(12, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Get user's most recent postpaid invoices."""
+    invoices = db.query(Invoice).filter(
+        Invoice.user_id == user_id
+    ).order_by(desc(Invoice.period_start)).limit(limit).all()
+    
+    return invoices
+
+
 @router.get("/available-subscriptions", response_model=List[SubscriptionResponse])
 async def get_available_subscriptions(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
     """Get all available subscription plans."""
     subscriptions = db.query(Subscription).filter(Subscription.is_active == True).all()
@@ -215,13 +462,11 @@ async def buy_subscription(
         )
     
     # Deactivate existing subscriptions
-    db.query(UserSubscription).filter(
+    replaced = db.query(UserSubscription).filter(
         UserSubscription.user_id == current_user.id,
         UserSubscription.is_active == True
     ).update({"is_active": False})
-    
-    # Deduct balance
-    current_user.balance -= subscription.price
+    counters.bump(db, counters.ACTIVE_SUBSCRIPTIONS, 1 - replaced)
     
     # Create user subscription
     start_date = datetime.utcnow()
@@ -236,6 +481,16 @@ async def buy_subscription(
     )
     
     db.add(user_subscription)
+    db.flush()
+    
+    # Deduct balance
+    ledger.post_entry(db, current_user.id, -subscription.price, EntryKind.SUBSCRIPTION, user_subscription.id)
+    publish_after_commit(db, current_user.id, "subscription", {
+        "id": user_subscription.id,
+        "subscription_id": subscription.id,
+        "end_date": end_date.isoformat()
+    })
+    
     db.commit()
     db.refresh(user_subscription)
     
@@ -247,8 +502,95 @@ async def buy_subscription(
 @router.get("/payment-channels", response_model=List[dict])
 async def get_payment_channels(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
     """Get active payment channels."""
-    channels = db.query(PaymentChannel).filter(PaymentChannel.is_active == True).all()
-    return [{"id": c.id, "name": c.name, "is_active": c.is_active} for c in channels]
+    return [{"id": c.id, "name": c.name, "is_active": c.is_active} for c in catalog.active_channels(db)]
+
+
+# ==================== Events ====================
+
+def _current_balance(user_id: int) -> float:
+    db = SessionLocal()
+    try:
+        return db.query(User.balance).filter(User.id == user_id).scalar()
+    finally:
+        db.close()
+
+
+def _sse(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    token: Optional[str] = Query(None, description="Access token, for clients that cannot set headers (EventSource)"),
+    db: Session = Depends(get_db)
+):
+    """Server-sent events: payment, balance and subscription changes of the current user."""
+    authorization = request.headers.get("authorization", "")
+    credentials = HTTPAuthorizationCredentials(
+        scheme="Bearer",
+        credentials=authorization.partition(" ")[2] or token or ""
+    )
+    current_user = await get_current_user(credentials, db)
+    user_id, balance = current_user.id, current_user.balance
+    # Do not hold a pooled connection for the lifetime of the stream
+    db.close()
+    
+    events = broker.subscribe(user_id)
+    if events is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many open event streams"
+        )
+    
+    async def stream():
+        # Streams end after EVENTS_MAX_STREAM_SECONDS so shutdowns and
+        # rebalancing are not held up; EventSource reconnects on its own
+        deadline = asyncio.get_running_loop().time() + settings.EVENTS_MAX_STREAM_SECONDS
+        try:
+            yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+            yield _sse("balance", {"balance": balance})
+            while True:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(
+                        events.get(),
+                        timeout=min(settings.EVENTS_KEEPALIVE_SECONDS, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if message is CLOSED:
+                    break
+                
+                # Coalesce bursts: one balance lookup for any number of balance events
+                batch = [message]
+                while not events.empty():
+                    batch.append(events.get_nowait())
+                if CLOSED in batch:
+                    break
+                
+                balance_changed = False
+                for item in batch:
+                    if item["type"] == "balance":
+                        balance_changed = True
+                    else:
+                        yield _sse(item["type"], item["data"])
+                if balance_changed:
+                    yield _sse("balance", {"balance": await run_in_threadpool(_current_balance, user_id)})
+        finally:
+            broker.unsubscribe(user_id, events)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,6 +1,12 @@
-from .admin import AdminCreate, AdminLogin, AdminResponse
+from .admin import (
+    AdminCreate, AdminLogin, AdminResponse, DashboardResponse, CurrentSubscription, AdminUserDetailResponse
+)
 from .user import UserCreate, UserLogin, UserResponse, UserUpdate
-from .service import ServiceCreate, ServiceResponse, ServiceUsageCreate, ServiceUsageResponse
+from .service import (
+    ServiceCreate, ServiceResponse, ServiceUsageCreate, ServiceUsageResponse,
+    ServiceUsageBatchItem, ServiceUsageBatchCreate, ServiceUsageBatchResult, ServiceUsageBatchResponse,
+    PriceTier, Discount, ServicePricingUpdate, ServicePricingResponse
+)
 from .subscription import (
     SubscriptionCreate, 
     SubscriptionResponse, 
@@ -16,14 +22,20 @@ from .payment import (
     PaymentApprove,
     PaymentReject
 )
-from .auth import Token, TokenData
+from .auth import Token, TokenData, RefreshRequest, VerificationResend
+from .ledger import BalanceEntryResponse
+from .billing import InvoiceResponse, BillingRunResponse
 
 __all__ = [
-    "AdminCreate", "AdminLogin", "AdminResponse",
+    "AdminCreate", "AdminLogin", "AdminResponse", "DashboardResponse", "CurrentSubscription", "AdminUserDetailResponse",
     "UserCreate", "UserLogin", "UserResponse", "UserUpdate",
     "ServiceCreate", "ServiceResponse", "ServiceUsageCreate", "ServiceUsageResponse",
+    "ServiceUsageBatchItem", "ServiceUsageBatchCreate", "ServiceUsageBatchResult", "ServiceUsageBatchResponse",
+    "PriceTier", "Discount", "ServicePricingUpdate", "ServicePricingResponse",
     "SubscriptionCreate", "SubscriptionResponse", "UserSubscriptionCreate", "UserSubscriptionResponse",
     "PaymentChannelCreate", "PaymentChannelUpdate", "PaymentChannelResponse",
     "PaymentCreate", "PaymentResponse", "PaymentApprove", "PaymentReject",
-    "Token", "TokenData"
+    "Token", "TokenData", "RefreshRequest", "VerificationResend",
+    "BalanceEntryResponse",
+    "InvoiceResponse", "BillingRunResponse"
 ]
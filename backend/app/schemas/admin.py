@@ -1,6 +1,8 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import datetime
+from .user import UserResponse
+from .payment import PaymentResponse
 
 
 class AdminBase(BaseModel):
@@ -23,3 +25,28 @@ class AdminResponse(AdminBase):
     
     class Config:
         from_attributes = True
+
+
+class DashboardResponse(BaseModel):
+    pending_count: int
+    pending_amount: float
+    active_users: int
+    active_subscriptions: int
+    revenue_today: float
+
+
+class CurrentSubscription(BaseModel):
+    id: int
+    subscription_id: int
+    name: str
+    start_date: datetime
+    end_date: datetime
+
+
+class AdminUserDetailResponse(BaseModel):
+    user: UserResponse
+    lifetime_deposits: float
+    usage_count: int
+    usage_spend: float
+    current_subscription: Optional[CurrentSubscription] = None
+    last_payment: Optional[PaymentResponse] = None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, EmailStr
 from typing import Optional
 
 
@@ -7,6 +7,14 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class VerificationResend(BaseModel):
+    email: EmailStr
+
+
 class TokenData(BaseModel):
     id: Optional[int] = None
     email: Optional[str] = None
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class InvoiceResponse(BaseModel):
+    id: int
+    period_start: datetime
+    period_end: datetime
+    usage_count: int
+    amount: float
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class BillingRunResponse(BaseModel):
+    id: int
+    period_start: datetime
+    period_end: datetime
+    status: str
+    last_user_id: int
+    invoices: int
+    amount: float
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class BalanceEntryResponse(BaseModel):
+    id: int
+    amount: float
+    kind: str
+    reference_id: Optional[int] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
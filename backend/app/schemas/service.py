@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -9,22 +9,69 @@ class ServiceBase(BaseModel):
 
 class ServiceCreate(ServiceBase):
     is_active: bool = True
+    price: Optional[float] = Field(None, ge=0)  # None: the default SERVICE_COST
 
 
 class ServiceResponse(ServiceBase):
     id: int
     is_active: bool
+    price: Optional[float] = None
     
     class Config:
         from_attributes = True
 
 
+class PriceTier(BaseModel):
+    min_quantity: int = Field(..., ge=2)
+    unit_price: float = Field(..., ge=0)
+    
+    class Config:
+        from_attributes = True
+
+
+class Discount(BaseModel):
+    percent_off: float = Field(..., gt=0, le=100)
+    starts_at: datetime
+    ends_at: datetime
+    
+    class Config:
+        from_attributes = True
+    
+    @model_validator(mode="after")
+    def check_window(self):
+        if self.ends_at <= self.starts_at:
+            raise ValueError("ends_at must be after starts_at")
+        return self
+
+
+class ServicePricingUpdate(BaseModel):
+    """Replaces the service's price, tiers and discounts."""
+    price: Optional[float] = Field(None, ge=0)
+    tiers: List[PriceTier] = []
+    discounts: List[Discount] = []
+    
+    @model_validator(mode="after")
+    def check_tiers(self):
+        quantities = [tier.min_quantity for tier in self.tiers]
+        if len(quantities) != len(set(quantities)):
+            raise ValueError("tiers must have distinct min_quantity")
+        return self
+
+
+class ServicePricingResponse(BaseModel):
+    service_id: int
+    price: Optional[float] = None
+    current_unit_price: float  # one use, now, with any running discount
+    tiers: List[PriceTier]
+    discounts: List[Discount]
+
+
 class ServiceUsageCreate(BaseModel):
     service_id: int
 
 
 class ServiceUsageResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # None while the record is still in the write-behind buffer
     user_id: int
     service_id: int
     service: Optional[ServiceResponse] = None
@@ -33,3 +80,26 @@ class ServiceUsageResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class ServiceUsageBatchItem(BaseModel):
+    service_id: int
+    quantity: int = Field(1, ge=1)
+
+
+class ServiceUsageBatchCreate(BaseModel):
+    items: List[ServiceUsageBatchItem] = Field(..., min_length=1)
+
+
+class ServiceUsageBatchResult(BaseModel):
+    service_id: int
+    quantity: int
+    cost: float  # total for this item, 0 when free or rejected
+    status: str  # "charged", "free" or "rejected"
+    detail: Optional[str] = None
+
+
+class ServiceUsageBatchResponse(BaseModel):
+    items: List[ServiceUsageBatchResult]
+    total_cost: float
+    used_at: datetime
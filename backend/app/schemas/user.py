@@ -4,6 +4,14 @@ from datetime import datetime
 import re
 
 
+def normalize_phone(v: str) -> str:
+    """Phone numbers are stored without spaces or dashes: ``+8801712-345 678`` -> ``+8801712345678``."""
+    cleaned = re.sub(r'[\s\-]', '', v)
+    if not re.match(r'^\+?\d{10,15}$', cleaned):
+        raise ValueError('Invalid phone number format')
+    return cleaned
+
+
 class UserBase(BaseModel):
     name: str
     email: EmailStr
@@ -24,11 +32,7 @@ class UserCreate(UserBase):
     @field_validator('phone_number')
     @classmethod
     def validate_phone(cls, v: str) -> str:
-        # Remove spaces and dashes
-        cleaned = re.sub(r'[\s\-]', '', v)
-        if not re.match(r'^\+?\d{10,15}$', cleaned):
-            raise ValueError('Invalid phone number format')
-        return cleaned
+        return normalize_phone(v)
 
 
 class UserLogin(BaseModel):
@@ -41,6 +45,11 @@ class UserUpdate(BaseModel):
     phone_number: Optional[str] = None
     current_address: Optional[str] = None
     profile_image_url: Optional[str] = None
+    
+    @field_validator('phone_number')
+    @classmethod
+    def validate_phone(cls, v: Optional[str]) -> Optional[str]:
+        return normalize_phone(v) if v is not None else v
 
 
 class UserResponse(UserBase):
@@ -0,0 +1,166 @@
+"""
+Hot/cold split for ``service_usages`` and ``payments``.
+
+The hot tables keep the retention window (``ARCHIVE_AFTER_DAYS``); older rows
+are moved in primary-key batches into compressed ``*_archive`` tables by
+``run_archival`` (``python -m app.utils.archive``). Pending payments, and
+postpaid usage whose period has no finished billing run, are never archived
+(billing reads only the hot table). History queries read the hot table and
+touch the archive only when the requested range is open-ended or starts
+before the archive watermark.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert, select, delete, exists, literal, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.memory import register_cache
+from app.models import ServiceUsage, Payment, ServiceUsageArchive, PaymentArchive, ArchiveWatermark, BillingRun
+
+WATERMARK_TTL_SECONDS = 300
+
+# Watermarks change once per archival run; cache them per worker
+_watermarks: Dict[str, Tuple[Optional[datetime], float]] = {}
+register_cache("archive_watermarks", _watermarks)
+
+
+def _move_batch(db: Session, hot_model, archive_model, ids: List[int]):
+    columns = [column.name for column in archive_model.__table__.columns]
+    hot = hot_model.__table__
+    db.execute(
+        insert(archive_model.__table__).from_select(
+            columns,
+            select(*[hot.c[name] for name in columns]).where(hot.c.id.in_(ids))
+        )
+    )
+    db.execute(delete(hot).where(hot.c.id.in_(ids)))
+
+
+def archive_table(
+    db: Session,
+    hot_model,
+    archive_model,
+    time_column: str,
+    cutoff: datetime,
+    batch_size: int,
+    *conditions
+) -> int:
+    """Move rows older than ``cutoff`` in batches of ``batch_size``; returns rows moved."""
+    hot = hot_model.__table__
+    moved = 0
+    while True:
+        # Oldest rows sit at the start of the primary key, so this stops early
+        ids = db.execute(
+            select(hot.c.id)
+            .where(hot.c[time_column] < cutoff, *conditions)
+            .order_by(hot.c.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        _move_batch(db, hot_model, archive_model, ids)
+        db.commit()
+        moved += len(ids)
+
+        if len(ids) < batch_size:
+            break
+
+    db.merge(ArchiveWatermark(table_name=hot.name, archived_before=cutoff))
+    db.commit()
+    _watermarks.pop(hot.name, None)
+    return moved
+
+
+# Postpaid usage inside a period whose billing run has finished
+_invoiced = exists().where(
+    BillingRun.status == "done",
+    BillingRun.period_start <= ServiceUsage.used_at,
+    BillingRun.period_end > ServiceUsage.used_at,
+)
+
+
+def run_archival(db: Session, days: int = None, batch_size: int = None) -> Dict[str, int]:
+    """Archive both tables; returns rows moved per table."""
+    days = days or settings.ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    return {
+        "service_usages": archive_table(
+            db, ServiceUsage, ServiceUsageArchive, "used_at", cutoff, batch_size,
+            or_(ServiceUsage.postpaid.is_(None), ServiceUsage.postpaid == False, _invoiced)
+        ),
+        "payments": archive_table(
+            db, Payment, PaymentArchive, "created_at", cutoff, batch_size,
+            Payment.__table__.c.status != "pending"
+        ),
+    }
+
+
+def archived_before(db: Session, table_name: str) -> Optional[datetime]:
+    """Archive watermark for a hot table, or None if nothing was archived."""
+    cached = _watermarks.get(table_name)
+    if cached and time.monotonic() - cached[1] < WATERMARK_TTL_SECONDS:
+        return cached[0]
+
+    watermark = db.query(ArchiveWatermark.archived_before).filter(
+        ArchiveWatermark.table_name == table_name
+    ).scalar()
+    _watermarks[table_name] = (watermark, time.monotonic())
+    return watermark
+
+
+def history(
+    db: Session,
+    hot_model,
+    archive_model,
+    time_column: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    **filters
+) -> list:
+    """Rows matching ``filters`` in [start_date, end_date], newest first.
+
+    The archive is queried unless ``start_date`` is at or after its
+    watermark, so a query without a start date returns the full history.
+    """
+    def query(model):
+        column = getattr(model, time_column)
+        q = db.query(model).filter_by(**filters)
+        if start_date is not None:
+            q = q.filter(column >= start_date)
+        if end_date is not None:
+            q = q.filter(column <= end_date)
+        return q.order_by(column.desc()).all()
+
+    rows = query(hot_model)
+
+    watermark = archived_before(db, hot_model.__tablename__)
+    if watermark is not None and (start_date is None or start_date < watermark):
+        rows += query(archive_model)
+        rows.sort(key=lambda row: getattr(row, time_column), reverse=True)
+
+    return rows
+
+
+def is_duplicate_key(error: IntegrityError) -> bool:
+    """Unique-index violation (MySQL ER_DUP_ENTRY, SQLite UNIQUE) rather than e.g. a foreign key."""
+    args = getattr(error.orig, "args", ())
+    return bool(args) and args[0] == 1062 or "UNIQUE constraint failed" in str(error.orig)
+
+
+def insert_payment(db: Session, values: dict) -> Optional[int]:
+    """Insert a payment unless its transaction id is archived; returns the new id or None.
+
+    One statement: ``INSERT ... SELECT ... WHERE NOT EXISTS`` against the
+    archive's unique index. Duplicates still in the hot table raise
+    ``IntegrityError`` from the hot table's unique index.
+    """
+    table = Payment.__table__
+    archived = select(PaymentArchive.id).where(PaymentArchive.transaction_id == values["transaction_id"])
+    row = select(*[literal(value, table.c[name].type) for name, value in values.items()]).where(~exists(archived))
+    result = db.execute(insert(table).from_select(list(values), row))
+    return result.lastrowid if result.rowcount else None
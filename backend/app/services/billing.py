@@ -0,0 +1,180 @@
+"""
+Postpaid billing.
+
+With ``BILLING_MODE=postpaid`` use-service only records usage (``postpaid``
+set, cost at the price of the moment) and never touches the balance. A
+billing run then invoices one closed period (``BILLING_PERIOD``, UTC):
+
+* users are taken in primary-key chunks of ``BILLING_CHUNK_USERS``;
+* each chunk's usage is summed with one grouped ``INSERT ... SELECT`` into
+  ``invoices`` and debited with one ``INSERT ... SELECT`` into the ledger;
+* the run's checkpoint (``billing_runs.last_user_id``) advances in the same
+  transaction, so an interrupted run resumes at the first chunk it did not
+  commit and never invoices a user twice (``invoices`` is also unique per
+  user and period).
+
+Nothing reads usage rows into Python, so a run over millions of rows costs
+one pass over ``ix_service_usages_user_id_used_at``.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+from sqlalchemy import func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import User, ServiceUsage, BalanceEntry, BillingRun, Invoice
+from app.models.ledger import EntryKind
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("day", "month")
+
+
+def period_bounds(at: datetime, period: str = None) -> Tuple[datetime, datetime]:
+    """Start and end of the billing period containing ``at``."""
+    period = period or settings.BILLING_PERIOD
+    if period == "day":
+        start = at.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(days=1)
+    if period == "month":
+        start = at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = (start + timedelta(days=32)).replace(day=1)
+        return start, end
+    raise ValueError(f"Unknown billing period {period!r}, expected one of {PERIODS}")
+
+
+def last_closed_period(now: datetime = None) -> Tuple[datetime, datetime]:
+    """The latest period that ended at least ``BILLING_GRACE_SECONDS`` ago."""
+    now = now or datetime.utcnow()
+    current_start, _ = period_bounds(now - timedelta(seconds=settings.BILLING_GRACE_SECONDS))
+    return period_bounds(current_start - timedelta(microseconds=1))
+
+
+def get_or_start_run(db: Session, period_start: datetime, period_end: datetime) -> BillingRun:
+    """The run for a period, created if there is none yet. Commits."""
+    run = db.query(BillingRun).filter(BillingRun.period_start == period_start).first()
+    if run is not None:
+        return run
+
+    db.add(BillingRun(period_start=period_start, period_end=period_end))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Started concurrently by another process
+        db.rollback()
+    return db.query(BillingRun).filter(BillingRun.period_start == period_start).one()
+
+
+def bill_chunk(db: Session, run: BillingRun, chunk_users: int) -> bool:
+    """Invoice and debit the next chunk of users and advance the checkpoint.
+
+    Returns False once the run is done. Commits.
+    """
+    after = run.last_user_id
+    # Last user id of this chunk; None when fewer than chunk_users remain
+    upto = db.execute(
+        select(User.id).where(User.id > after).order_by(User.id).offset(chunk_users - 1).limit(1)
+    ).scalar()
+
+    in_chunk = [ServiceUsage.user_id > after]
+    invoices_in_chunk = [Invoice.billing_run_id == run.id, Invoice.user_id > after]
+    if upto is not None:
+        in_chunk.append(ServiceUsage.user_id <= upto)
+        invoices_in_chunk.append(Invoice.user_id <= upto)
+
+    db.execute(insert(Invoice).from_select(
+        ["user_id", "billing_run_id", "period_start", "period_end", "usage_count", "amount"],
+        select(
+            ServiceUsage.user_id,
+            literal(run.id),
+            literal(run.period_start),
+            literal(run.period_end),
+            func.count(),
+            func.sum(ServiceUsage.cost),
+        )
+        .where(
+            *in_chunk,
+            ServiceUsage.used_at >= run.period_start,
+            ServiceUsage.used_at < run.period_end,
+            ServiceUsage.postpaid == True,
+        )
+        .group_by(ServiceUsage.user_id)
+    ))
+    db.execute(insert(BalanceEntry).from_select(
+        ["user_id", "amount", "kind", "reference_id"],
+        select(Invoice.user_id, -Invoice.amount, literal(EntryKind.INVOICE.value), Invoice.id)
+        .where(*invoices_in_chunk, Invoice.amount > 0)
+    ))
+    invoiced, amount = db.execute(
+        select(func.count(), func.coalesce(func.sum(Invoice.amount), 0.0)).where(*invoices_in_chunk)
+    ).one()
+
+    done = upto is None
+    values = {
+        "last_user_id": after if done else upto,
+        "invoices": BillingRun.invoices + invoiced,
+        "amount": BillingRun.amount + amount,
+    }
+    if done:
+        values.update(status="done", finished_at=datetime.utcnow())
+    # Guarded by the old checkpoint: a concurrent run of the same chunk commits nothing
+    advanced = db.execute(
+        update(BillingRun)
+        .where(BillingRun.id == run.id, BillingRun.last_user_id == after, BillingRun.status == "running")
+        .values(**values)
+    ).rowcount
+    if not advanced:
+        db.rollback()
+    else:
+        db.commit()
+    db.refresh(run)
+    return run.status == "running"
+
+
+def run_billing(
+    db: Session,
+    period_start: datetime = None,
+    chunk_users: int = None,
+    progress: Optional[Callable[[BillingRun], None]] = None
+) -> BillingRun:
+    """Bill one period (default: the last closed one), resuming from its checkpoint."""
+    chunk_users = chunk_users or settings.BILLING_CHUNK_USERS
+    if period_start is None:
+        start, end = last_closed_period()
+    else:
+        start, end = period_bounds(period_start)
+        if end > datetime.utcnow() - timedelta(seconds=settings.BILLING_GRACE_SECONDS):
+            raise ValueError(f"Period starting {start:%Y-%m-%d} has not closed yet")
+
+    run = get_or_start_run(db, start, end)
+    while run.status == "running":
+        try:
+            bill_chunk(db, run, chunk_users)
+        except IntegrityError:
+            # Another process invoiced this chunk first; continue from its checkpoint
+            db.rollback()
+            db.refresh(run)
+        if progress:
+            progress(run)
+    return run
+
+
+def run_due(db: Session) -> int:
+    """Bill every closed period since the latest run (scheduler job); returns runs finished."""
+    last_start, _ = last_closed_period()
+    latest = db.query(func.max(BillingRun.period_start)).scalar()
+    unfinished = [row.period_start for row in db.query(BillingRun.period_start).filter(BillingRun.status == "running")]
+
+    periods = set(unfinished)
+    start = last_start if latest is None else period_bounds(latest)[1]
+    while start <= last_start:
+        periods.add(start)
+        start = period_bounds(start)[1]
+
+    for period_start in sorted(periods):
+        run = run_billing(db, period_start)
+        logger.info(
+            "Billed %s: %d invoices, %.2f", f"{run.period_start:%Y-%m-%d}", run.invoices, run.amount
+        )
+    return len(periods)
@@ -0,0 +1,74 @@
+"""
+Per-worker in-memory catalog of payment channels.
+
+Channels are read on every payment submission but change only when an admin
+edits them. Each worker keeps the whole (small) table in memory and reloads
+it at most every ``CATALOG_TTL_SECONDS``, right after an admin write on the
+same worker, or when asked for an id it does not know (rate limited, so
+bogus ids cannot turn every request into a reload).
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.memory import register_cache
+from app.services.health import health
+from app.models import PaymentChannel
+
+MISS_RELOAD_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class ChannelInfo:
+    id: int
+    name: str
+    is_active: bool
+
+
+class Catalog:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._channels: Dict[int, ChannelInfo] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._channels)
+
+    def _load(self, db: Session):
+        rows = db.query(PaymentChannel.id, PaymentChannel.name, PaymentChannel.is_active).all()
+        self._channels = {row.id: ChannelInfo(row.id, row.name, bool(row.is_active)) for row in rows}
+        self._loaded_at = time.monotonic()
+
+    def _refresh(self, db: Session, max_age: float):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and (time.monotonic() - loaded_at < max_age or health.degraded):
+            # Stale beats unavailable while the database is down
+            return
+        with self._lock:
+            if self._loaded_at is loaded_at:
+                self._load(db)
+
+    def channel(self, db: Session, channel_id: int) -> Optional[ChannelInfo]:
+        """The channel with ``channel_id``, active or not, or None."""
+        self._refresh(db, self.ttl_seconds)
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            # Possibly created on another worker since the last load
+            self._refresh(db, MISS_RELOAD_SECONDS)
+            channel = self._channels.get(channel_id)
+        return channel
+
+    def active_channels(self, db: Session) -> List[ChannelInfo]:
+        self._refresh(db, self.ttl_seconds)
+        return [channel for channel in self._channels.values() if channel.is_active]
+
+    def invalidate(self):
+        """Reload on next use (call after committing a channel change)."""
+        self._loaded_at = None
+
+
+catalog = Catalog(settings.CATALOG_TTL_SECONDS)
+register_cache("catalog", catalog)
@@ -0,0 +1,122 @@
+"""
+Incrementally maintained admin dashboard counters.
+
+Write paths call ``bump`` inside their own transaction, so a counter moves
+exactly when the change it counts commits. Each counter is split over
+``DASHBOARD_COUNTER_SHARDS`` rows and a bump updates a random shard, so
+concurrent payment submissions do not queue up on one row lock. Reading the
+dashboard is a single grouped query over this small table.
+
+``rebuild`` recounts everything from the source tables; run it after
+loading data outside the application (seed, datagen, manual SQL).
+"""
+import random
+from datetime import date, datetime
+from typing import Dict
+from sqlalchemy import delete, func, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import DashboardCounter, Payment, User, UserSubscription
+from app.models.payment import PaymentStatus
+
+PENDING_COUNT = "pending_count"
+PENDING_AMOUNT = "pending_amount"
+ACTIVE_USERS = "active_users"
+ACTIVE_SUBSCRIPTIONS = "active_subscriptions"
+REVENUE_PREFIX = "revenue:"
+
+
+def revenue_counter(day: date = None) -> str:
+    """Approved deposits per UTC day."""
+    return REVENUE_PREFIX + (day or datetime.utcnow().date()).isoformat()
+
+
+def bump(db: Session, name: str, delta: float):
+    """Add ``delta`` to a counter as part of the caller's transaction."""
+    bump_many(db, {name: delta})
+
+
+def bump_many(db: Session, deltas: Dict[str, float]):
+    """Apply several counter deltas in one statement."""
+    values = [
+        {"name": name, "shard": random.randrange(settings.DASHBOARD_COUNTER_SHARDS), "value": delta}
+        for name, delta in deltas.items() if delta
+    ]
+    if not values:
+        return
+    if db.get_bind().dialect.name == "mysql":
+        stmt = mysql_insert(DashboardCounter).values(values)
+        stmt = stmt.on_duplicate_key_update(value=DashboardCounter.value + stmt.inserted.value)
+    else:
+        stmt = sqlite_insert(DashboardCounter).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name", "shard"],
+            set_={"value": DashboardCounter.value + stmt.excluded.value}
+        )
+    db.execute(stmt)
+
+
+def read(db: Session) -> Dict[str, float]:
+    """Current value of the dashboard counters."""
+    today = revenue_counter()
+    names = [PENDING_COUNT, PENDING_AMOUNT, ACTIVE_USERS, ACTIVE_SUBSCRIPTIONS, today]
+    values = dict(
+        db.query(DashboardCounter.name, func.sum(DashboardCounter.value))
+        .filter(DashboardCounter.name.in_(names))
+        .group_by(DashboardCounter.name)
+        .all()
+    )
+    return {
+        "pending_count": int(values.get(PENDING_COUNT) or 0),
+        "pending_amount": values.get(PENDING_AMOUNT) or 0.0,
+        "active_users": int(values.get(ACTIVE_USERS) or 0),
+        "active_subscriptions": int(values.get(ACTIVE_SUBSCRIPTIONS) or 0),
+        "revenue_today": values.get(today) or 0.0,
+    }
+
+
+def expire_subscriptions(db: Session) -> int:
+    """Deactivate subscriptions past their end date (scheduler job); returns rows expired."""
+    expired = db.query(UserSubscription).filter(
+        UserSubscription.is_active == True,
+        UserSubscription.end_date < datetime.utcnow()
+    ).update({"is_active": False}, synchronize_session=False)
+    bump(db, ACTIVE_SUBSCRIPTIONS, -expired)
+    db.commit()
+    return expired
+
+
+def rebuild(db: Session) -> Dict[str, float]:
+    """Recount every counter from the source tables."""
+    pending_count, pending_amount = db.query(
+        func.count(Payment.id), func.coalesce(func.sum(Payment.amount), 0.0)
+    ).filter(Payment.status == PaymentStatus.PENDING.value).one()
+    active_users = db.query(func.count(User.id)).filter(User.is_user_active == True).scalar()
+    # Same definition as the incremental counter: flagged active until the
+    # expiry job (or a newer purchase) turns the flag off
+    active_subscriptions = db.query(func.count(UserSubscription.id)).filter(
+        UserSubscription.is_active == True
+    ).scalar()
+    revenue = db.query(
+        func.date(Payment.updated_at), func.sum(Payment.amount)
+    ).filter(
+        Payment.status == PaymentStatus.APPROVED.value,
+        Payment.updated_at.isnot(None)
+    ).group_by(func.date(Payment.updated_at)).all()
+
+    rows = [
+        {"name": PENDING_COUNT, "shard": 0, "value": pending_count},
+        {"name": PENDING_AMOUNT, "shard": 0, "value": pending_amount},
+        {"name": ACTIVE_USERS, "shard": 0, "value": active_users},
+        {"name": ACTIVE_SUBSCRIPTIONS, "shard": 0, "value": active_subscriptions},
+    ] + [
+        {"name": REVENUE_PREFIX + str(day), "shard": 0, "value": amount}
+        for day, amount in revenue if day is not None
+    ]
+
+    db.execute(delete(DashboardCounter))
+    db.execute(insert(DashboardCounter), rows)
+    db.commit()
+    return read(db)
@@ -0,0 +1,202 @@
+"""
+Per-user event push (server-sent events).
+
+Writers call ``publish_after_commit(db, user_id, type, data)``; events are
+held on the session and published only once its transaction commits (and
+dropped on rollback). ``post_entry`` in the ledger does this for every
+balance change, so balance events need no extra code at call sites.
+
+``broker`` fans events out to the SSE streams of the user connected to this
+worker. Events travel through a backend: ``local`` delivers in-process
+(single worker); ``redis`` (optional ``redis`` package) publishes on a
+channel every worker subscribes to, so a change made on one worker reaches
+streams on all of them.
+
+Balance events carry no amount: the stream looks the balance up itself,
+once per burst of changes, and only for users that are actually listening.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Set
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.memory import register_cache
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CLOSED = object()
+
+
+class LocalBackend:
+    """Single-process backend: publish delivers directly."""
+
+    def start(self, deliver: Callable[[dict], None]):
+        self.deliver = deliver
+
+    def publish(self, message: dict):
+        self.deliver(message)
+
+    def stop(self):
+        pass
+
+
+class RedisBackend:
+    """Cross-worker backend over Redis pub/sub; publishing never blocks the caller."""
+
+    def __init__(self, url: str, channel: str):
+        if redis is None:
+            raise RuntimeError("EVENTS_BACKEND=redis requires the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._outbox: queue.Queue = queue.Queue(maxsize=10000)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self, deliver: Callable[[dict], None]):
+        self.deliver = deliver
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._send_loop, name="events-publish", daemon=True),
+            threading.Thread(target=self._receive_loop, name="events-subscribe", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def publish(self, message: dict):
+        try:
+            self._outbox.put_nowait(json.dumps(message))
+        except queue.Full:
+            logger.warning("Event outbox full, dropping %s event", message.get("type"))
+
+    def _send_loop(self):
+        while not self._stop.is_set():
+            try:
+                payload = self._outbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.client.publish(self.channel, payload)
+            except Exception:
+                logger.exception("Could not publish event")
+
+    def _receive_loop(self):
+        while not self._stop.is_set():
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        self.deliver(json.loads(message["data"]))
+                pubsub.close()
+            except Exception:
+                logger.exception("Event subscription failed, reconnecting")
+                self._stop.wait(1.0)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = 100, max_streams_per_user: int = 5):
+        self.queue_size = queue_size
+        self.max_streams_per_user = max_streams_per_user
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Until started (CLIs, benchmarks) events have no one to go to
+        self.backend = LocalBackend()
+        self.backend.start(self._deliver)
+
+    def __len__(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def start(self, backend=None):
+        """Bind to the running event loop and start the backend."""
+        self._loop = asyncio.get_running_loop()
+        self.backend = backend or LocalBackend()
+        self.backend.start(self._deliver)
+
+    def stop(self):
+        """Stop the backend and end every open stream."""
+        self.backend.stop()
+        for queues in self._subscribers.values():
+            for q in queues:
+                self._put(q, CLOSED)
+        self._loop = None
+
+    def subscribe(self, user_id: int) -> Optional[asyncio.Queue]:
+        """A queue receiving the user's events, or None if the user has too many streams."""
+        if len(self._subscribers[user_id]) >= self.max_streams_per_user:
+            return None
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(q)
+        return q
+
+    def unsubscribe(self, user_id: int, q: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(q)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: int, event_type: str, data: dict = None):
+        """Send an event to every stream of ``user_id`` (any thread)."""
+        self.backend.publish({"user_id": user_id, "type": event_type, "data": data or {}})
+
+    def _deliver(self, message: dict):
+        # Backends may call this from their own threads
+        if self._loop is None or message["user_id"] not in self._subscribers:
+            return
+        self._loop.call_soon_threadsafe(self._fan_out, message)
+
+    def _fan_out(self, message: dict):
+        for q in list(self._subscribers.get(message["user_id"], ())):
+            self._put(q, message)
+
+    @staticmethod
+    def _put(q: asyncio.Queue, item):
+        if q.full():
+            # Slow client: drop the oldest event rather than grow without bound
+            q.get_nowait()
+        q.put_nowait(item)
+
+
+def publish_after_commit(db: Session, user_id: int, event_type: str, data: dict = None):
+    """Queue an event on the session; it is published when the session commits."""
+    db.info.setdefault("pending_events", []).append((user_id, event_type, data))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session):
+    for user_id, event_type, data in session.info.pop("pending_events", []):
+        broker.publish(user_id, event_type, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop("pending_events", None)
+
+
+def create_backend():
+    if settings.EVENTS_BACKEND == "redis":
+        return RedisBackend(settings.EVENTS_REDIS_URL, settings.EVENTS_REDIS_CHANNEL)
+    return LocalBackend()
+
+
+broker = EventBroker(
+    queue_size=settings.EVENTS_QUEUE_SIZE,
+    max_streams_per_user=settings.EVENTS_MAX_STREAMS_PER_USER
+)
+register_cache("event_streams", broker)
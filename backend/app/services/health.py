@@ -0,0 +1,157 @@
+"""
+Worker health for load balancer probes, and the degraded mode it drives.
+
+Liveness (``/api/health/live``) does no I/O. Readiness
+(``/api/health/ready``) returns the result of the last background check
+instead of probing per request: every ``HEALTH_CHECK_INTERVAL_SECONDS`` the
+``health_check`` job looks at the connection pool and runs ``SELECT 1``.
+A check fails when the query fails or the pool has no free connection. A
+worker is not ready after ``HEALTH_FAILURE_THRESHOLD`` failed checks in a
+row, or when the check itself is overdue (the threadpool is too busy to run
+it). Requests that fail with a database error count as failed checks too,
+so an outage is noticed within a request or two.
+
+While not ready the worker is degraded: the service and payment-channel
+catalogs are served from memory without refreshing, and profile reads
+(with their authentication) are served from ``profiles``, the last profile
+this worker returned for each user.
+
+Only connection-level errors count (``is_connection_failure``): a deadlock
+or lock wait timeout is an ``OperationalError`` too, but says nothing about
+whether the database is reachable.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.memory import register_cache
+from app.database import engine
+from app.schemas import UserResponse
+
+logger = logging.getLogger(__name__)
+
+# MySQL: server shutting down, can't connect (socket/TCP), server gone away,
+# lost connection (during a query / at handshake), disconnected for inactivity
+CONNECTION_ERRNOS = {1053, 2002, 2003, 2006, 2013, 2055, 4031}
+
+
+def is_connection_failure(error: Exception) -> bool:
+    """Whether ``error`` means the database (or the pool) is unreachable."""
+    if isinstance(error, PoolTimeoutError):
+        return True
+    if not isinstance(error, DBAPIError):
+        return False
+    if error.connection_invalidated:
+        return True
+    args = getattr(error.orig, "args", ())
+    return bool(args) and args[0] in CONNECTION_ERRNOS
+
+
+class HealthMonitor:
+    def __init__(self, interval_seconds: float, failure_threshold: int):
+        self.interval_seconds = interval_seconds
+        self.failure_threshold = failure_threshold
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def overdue(self) -> bool:
+        return self.checked_at is not None and time.time() - self.checked_at > 3 * self.interval_seconds
+
+    @property
+    def ready(self) -> bool:
+        return self.checked_at is not None and not self.overdue and self.failures < self.failure_threshold
+
+    @property
+    def degraded(self) -> bool:
+        # Before the first check the database is presumed up
+        return self.checked_at is not None and not self.ready
+
+    def _record(self, error: Optional[str]):
+        with self._lock:
+            was_ready = self.ready
+            if error is None:
+                self.failures = 0
+            else:
+                self.failures += 1
+                self.last_error = error
+            self.checked_at = time.time()
+            is_ready = self.ready
+        if is_ready and not was_ready:
+            logger.info("Worker ready")
+        elif was_ready and not is_ready:
+            logger.warning("Worker not ready: %s", error)
+
+    def report_failure(self, error: Exception):
+        """A request failed on the database: count it like a failed check."""
+        self._record(f"{type(error).__name__}: {error}".splitlines()[0][:200])
+
+    def check(self, db: Session):
+        """Pool and database check (scheduler job)."""
+        pool = engine.pool
+        limit = pool.size() + getattr(pool, "_max_overflow", 0) if hasattr(pool, "size") else None
+        if limit is not None and pool.checkedout() >= limit:
+            # Probing now would only wait for the pool timeout
+            self._record(f"connection pool exhausted ({pool.checkedout()}/{limit} checked out)")
+            return
+
+        started = time.perf_counter()
+        try:
+            db.execute(text("SELECT 1"))
+        except Exception as error:
+            db.rollback()
+            self.report_failure(error)
+            return
+        self.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        self._record(None)
+
+    def status(self) -> dict:
+        pool = engine.pool
+        return {
+            "status": "ready" if self.ready else "not_ready",
+            "reason": None if self.ready else (
+                "not checked yet" if self.checked_at is None
+                else "health check overdue" if self.overdue
+                else self.last_error
+            ),
+            "checked_seconds_ago": None if self.checked_at is None else round(time.time() - self.checked_at, 1),
+            "db_latency_ms": self.latency_ms,
+            "pool": pool.status(),
+        }
+
+
+class ProfileCache:
+    """Last profile returned per user, bounded LRU; read only while degraded."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._profiles: "OrderedDict[int, UserResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def put(self, user) -> UserResponse:
+        profile = UserResponse.model_validate(user)
+        with self._lock:
+            self._profiles[profile.id] = profile
+            self._profiles.move_to_end(profile.id)
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def get(self, user_id: int) -> Optional[UserResponse]:
+        return self._profiles.get(user_id)
+
+
+health = HealthMonitor(settings.HEALTH_CHECK_INTERVAL_SECONDS, settings.HEALTH_FAILURE_THRESHOLD)
+profiles = ProfileCache(settings.DEGRADED_PROFILE_CACHE_SIZE)
+register_cache("degraded_profiles", profiles)
@@ -0,0 +1,126 @@
+"""
+Append-only balance ledger.
+
+Every change to a user's balance is a row in ``balance_entries``; nothing
+updates a balance in place. ``User.balance`` is the latest snapshot plus the
+entries after it, and ``refresh_snapshots`` periodically folds entries into
+``balance_snapshots`` so that delta stays short.
+"""
+from typing import Optional
+from sqlalchemy import func, select, inspect, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session, aliased
+from app.core.config import settings
+from app.models import BalanceEntry, BalanceSnapshot
+from app.models.ledger import EntryKind
+from app.services.events import publish_after_commit
+
+
+def post_entry(
+    db: Session,
+    user_id: int,
+    amount: float,
+    kind: EntryKind,
+    reference_id: Optional[int] = None
+) -> BalanceEntry:
+    """Append a credit (positive) or debit (negative) entry. Caller commits."""
+    entry = BalanceEntry(
+        user_id=user_id,
+        amount=amount,
+        kind=kind.value,
+        reference_id=reference_id
+    )
+    db.add(entry)
+    publish_after_commit(db, user_id, "balance")
+    return entry
+
+
+def refresh_snapshots(
+    db: Session,
+    min_entries: int = None,
+    batch_size: int = 1000,
+    max_batches: int = 100
+) -> int:
+    """Fold pending entries into per-user snapshots; returns users refreshed.
+
+    Only users with at least ``min_entries`` unfolded entries are touched, and
+    folding stops at each user's first entry younger than the grace period, so
+    an entry whose transaction commits after a newer id was folded is not
+    skipped. Snapshots are written as absolute values guarded by
+    ``last_entry_id``, so two workers running this job concurrently cannot
+    double-count.
+    """
+    if min_entries is None:
+        min_entries = settings.LEDGER_SNAPSHOT_MIN_ENTRIES
+
+    cutoff = func.date_sub(
+        func.now(),
+        text(f"INTERVAL {int(settings.LEDGER_SNAPSHOT_GRACE_SECONDS)} SECOND")
+    )
+    # First entry per user still inside the grace period; folding stops before it
+    recent = aliased(BalanceEntry)
+    first_recent_id = (
+        select(func.min(recent.id))
+        .where(
+            recent.user_id == BalanceEntry.user_id,
+            recent.id > func.coalesce(BalanceSnapshot.last_entry_id, 0),
+            recent.created_at >= cutoff
+        )
+        .correlate(BalanceEntry, BalanceSnapshot)
+        .scalar_subquery()
+    )
+    pending = (
+        select(
+            BalanceEntry.user_id,
+            (func.coalesce(func.max(BalanceSnapshot.balance), 0.0) + func.sum(BalanceEntry.amount)).label("balance"),
+            func.max(BalanceEntry.id).label("last_entry_id"),
+        )
+        .outerjoin(BalanceSnapshot, BalanceSnapshot.user_id == BalanceEntry.user_id)
+        .where(
+            BalanceEntry.id > func.coalesce(BalanceSnapshot.last_entry_id, 0),
+            BalanceEntry.id < func.coalesce(first_recent_id, BalanceEntry.id + 1)
+        )
+        .group_by(BalanceEntry.user_id)
+        .having(func.count() >= min_entries)
+        .limit(batch_size)
+    )
+
+    refreshed = 0
+    for _ in range(max_batches):
+        rows = [dict(row._mapping) for row in db.execute(pending)]
+        if not rows:
+            break
+
+        stmt = mysql_insert(BalanceSnapshot).values(rows)
+        newer = stmt.inserted.last_entry_id > BalanceSnapshot.last_entry_id
+        # balance is assigned before last_entry_id, so the guard still sees the old id
+        stmt = stmt.on_duplicate_key_update(
+            balance=func.IF(newer, stmt.inserted.balance, BalanceSnapshot.balance),
+            last_entry_id=func.IF(newer, stmt.inserted.last_entry_id, BalanceSnapshot.last_entry_id),
+            taken_at=func.now()
+        )
+        db.execute(stmt)
+        db.commit()
+
+        refreshed += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    return refreshed
+
+
+def import_legacy_balances(db: Session) -> int:
+    """Open the ledger from the pre-ledger ``users.balance`` column.
+
+    Runs only while the ledger is still empty; returns entries created.
+    """
+    columns = {column["name"] for column in inspect(db.get_bind()).get_columns("users")}
+    if "balance" not in columns or db.query(BalanceEntry.id).first() is not None:
+        return 0
+
+    result = db.execute(text(
+        "INSERT INTO balance_entries (user_id, amount, kind, created_at) "
+        "SELECT id, balance, :kind, CURRENT_TIMESTAMP FROM users WHERE balance <> 0"
+    ), {"kind": EntryKind.OPENING_BALANCE.value})
+    db.commit()
+    return result.rowcount
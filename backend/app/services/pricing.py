@@ -0,0 +1,126 @@
+"""
+Per-worker in-memory price table for services.
+
+A use is priced from the service's ``price`` (``settings.SERVICE_COST`` when
+unset), lowered by the highest volume tier the call reaches and then by the
+largest discount running at that moment. Tiers count uses of one service
+within a single call (``quantity`` in ``/use-service/batch``), so pricing
+needs no per-user history.
+
+Like the payment-channel catalog, each worker loads every service with its
+tiers and current discounts into memory, so the use-service path prices and
+validates services without a query. The table is rebuilt at most every
+``PRICE_TABLE_TTL_SECONDS``, right after an admin edit on the same worker,
+or (rate limited) when asked for an unknown service id. Discount windows are
+stored with the table and checked against the clock on every lookup, so a
+discount starts and ends on time without a reload.
+"""
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.memory import register_cache
+from app.services.health import health
+from app.models import Service, ServicePriceTier, ServiceDiscount
+
+MISS_RELOAD_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class PricedService:
+    id: int
+    name: str
+    is_active: bool
+    price: float  # per use before tiers and discounts
+    # Ascending (min_quantity, unit_price) pairs
+    tiers: Tuple[Tuple[int, float], ...] = ()
+    # (starts_at, ends_at, percent_off) windows that had not ended at load time
+    discounts: Tuple[Tuple[datetime, datetime, float], ...] = ()
+
+    def unit_price(self, quantity: int = 1, at: datetime = None) -> float:
+        """Price of one use when a call uses this service ``quantity`` times."""
+        price = self.price
+        position = bisect_right(self.tiers, (quantity, float("inf")))
+        if position:
+            price = self.tiers[position - 1][1]
+
+        if self.discounts:
+            at = at or datetime.utcnow()
+            percent_off = max(
+                (percent for starts_at, ends_at, percent in self.discounts if starts_at <= at < ends_at),
+                default=0.0
+            )
+            price *= 1 - percent_off / 100
+        return round(price, 2)
+
+
+class PriceTable:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._services: Dict[int, PricedService] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._services)
+
+    def _load(self, db: Session):
+        tiers = defaultdict(list)
+        for row in db.query(ServicePriceTier.service_id, ServicePriceTier.min_quantity, ServicePriceTier.unit_price):
+            tiers[row.service_id].append((row.min_quantity, row.unit_price))
+
+        discounts = defaultdict(list)
+        for row in db.query(
+            ServiceDiscount.service_id, ServiceDiscount.starts_at, ServiceDiscount.ends_at, ServiceDiscount.percent_off
+        ).filter(ServiceDiscount.ends_at > datetime.utcnow()):
+            discounts[row.service_id].append((row.starts_at, row.ends_at, row.percent_off))
+
+        rows = db.query(Service.id, Service.name, Service.is_active, Service.price).all()
+        self._services = {
+            row.id: PricedService(
+                id=row.id,
+                name=row.name,
+                is_active=bool(row.is_active),
+                price=settings.SERVICE_COST if row.price is None else row.price,
+                tiers=tuple(sorted(tiers[row.id])),
+                discounts=tuple(discounts[row.id]),
+            )
+            for row in rows
+        }
+        self._loaded_at = time.monotonic()
+
+    def _refresh(self, db: Session, max_age: float):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and (time.monotonic() - loaded_at < max_age or health.degraded):
+            # Stale beats unavailable while the database is down
+            return
+        with self._lock:
+            if self._loaded_at is loaded_at:
+                self._load(db)
+
+    def service(self, db: Session, service_id: int) -> Optional[PricedService]:
+        """The service with ``service_id``, active or not, or None."""
+        self._refresh(db, self.ttl_seconds)
+        service = self._services.get(service_id)
+        if service is None:
+            # Possibly created on another worker since the last load
+            self._refresh(db, MISS_RELOAD_SECONDS)
+            service = self._services.get(service_id)
+        return service
+
+    def active_services(self, db: Session) -> List[PricedService]:
+        self._refresh(db, self.ttl_seconds)
+        return [service for service in self._services.values() if service.is_active]
+
+    def invalidate(self):
+        """Rebuild on next use (call after committing a service or pricing change)."""
+        self._loaded_at = None
+
+
+price_table = PriceTable(settings.PRICE_TABLE_TTL_SECONDS)
+register_cache("price_table", price_table)
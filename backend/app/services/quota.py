@@ -0,0 +1,118 @@
+"""
+Per-worker prepaid quota reservations for use-service.
+
+With ``QUOTA_RESERVATIONS`` on, the first paid call of a user reserves a
+block of ``QUOTA_BLOCK_USES`` calls worth of balance with a single ledger
+debit; later calls on this worker are charged against the in-memory
+allowance without touching the database. Unused allowance is credited back
+when the reservation expires (``QUOTA_RESERVATION_TTL_SECONDS``), when a new
+block replaces it, and on shutdown.
+
+Reserved balance is not visible in ``User.balance`` until it is released.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.memory import register_cache
+from app.models import User
+from app.models.ledger import EntryKind
+from app.services import ledger
+
+
+@dataclass
+class Reservation:
+    user_id: int
+    remaining: float
+    expires_at: float
+
+
+class QuotaReservations:
+    def __init__(self, block_uses: int, ttl_seconds: float):
+        self.block_uses = block_uses
+        self.ttl_seconds = ttl_seconds
+        self._reservations: Dict[int, Reservation] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._reservations)
+
+    def charge(self, db: Session, user_id: int, cost: float) -> bool:
+        """Charge one call; False if the user cannot afford it."""
+        if cost <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            reservation = self._reservations.get(user_id)
+            if reservation and reservation.expires_at > now and reservation.remaining >= cost:
+                reservation.remaining -= cost
+                return True
+            stale = self._reservations.pop(user_id, None)
+
+        leftover = stale.remaining if stale else 0.0
+        block = self._reserve_block(db, user_id, cost, leftover)
+        if block < cost:
+            return False
+
+        with self._lock:
+            current = self._reservations.get(user_id)
+            if current is None:
+                self._reservations[user_id] = Reservation(user_id, block - cost, now + self.ttl_seconds)
+            else:
+                # A concurrent charge reserved too: merge, so neither block goes unreleased
+                current.remaining += block - cost
+                current.expires_at = max(current.expires_at, now + self.ttl_seconds)
+        return True
+
+    def _reserve_block(self, db: Session, user_id: int, cost: float, leftover: float) -> float:
+        """Return ``leftover`` and debit a new block in one transaction."""
+        # End the request's read snapshot, then lock the user row: this
+        # serializes reservations for a user across workers, and the balance
+        # read after the lock sees every committed entry
+        db.commit()
+        db.execute(select(User.id).where(User.id == user_id).with_for_update())
+        balance = db.execute(select(User.balance).where(User.id == user_id)).scalar_one() + leftover
+
+        if leftover:
+            ledger.post_entry(db, user_id, leftover, EntryKind.RESERVATION_RELEASE)
+
+        # Reserve a full block if affordable, otherwise as many calls as possible
+        block = cost * min(self.block_uses, int(balance // cost))
+        if block >= cost:
+            ledger.post_entry(db, user_id, -block, EntryKind.RESERVATION)
+
+        db.commit()
+        return block
+
+    def _release(self, db: Session, reservations: List[Reservation]) -> int:
+        for reservation in reservations:
+            if reservation.remaining:
+                ledger.post_entry(db, reservation.user_id, reservation.remaining, EntryKind.RESERVATION_RELEASE)
+        db.commit()
+        return len(reservations)
+
+    def release_expired(self, db: Session) -> int:
+        """Credit back unused allowance of expired reservations."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [r for r in self._reservations.values() if r.expires_at <= now]
+            for reservation in expired:
+                del self._reservations[reservation.user_id]
+        return self._release(db, expired)
+
+    def release_all(self, db: Session) -> int:
+        """Credit back every reservation (shutdown)."""
+        with self._lock:
+            reservations = list(self._reservations.values())
+            self._reservations.clear()
+        return self._release(db, reservations)
+
+
+quota_reservations = QuotaReservations(
+    block_uses=settings.QUOTA_BLOCK_USES,
+    ttl_seconds=settings.QUOTA_RESERVATION_TTL_SECONDS
+)
+register_cache("quota_reservations", quota_reservations)
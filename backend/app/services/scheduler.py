@@ -0,0 +1,57 @@
+"""
+Periodic background jobs run inside each worker.
+
+Jobs are plain functions taking a database session. They are registered
+with ``every`` and started/stopped from the application lifespan; each run
+gets its own session and executes in the threadpool so the event loop is
+never blocked by a job's queries.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, List, Tuple
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_jobs: Dict[str, Tuple[float, Callable[[Session], object]]] = {}
+_tasks: List[asyncio.Task] = []
+
+
+def every(seconds: float, job: Callable[[Session], object], name: str = None):
+    """Register ``job`` to run every ``seconds`` once the scheduler starts."""
+    _jobs[name or job.__name__] = (seconds, job)
+
+
+def run_job(name: str, job: Callable[[Session], object]):
+    """Run a job once with its own session."""
+    db = SessionLocal()
+    try:
+        return job(db)
+    except Exception:
+        db.rollback()
+        logger.exception("Job %s failed", name)
+    finally:
+        db.close()
+
+
+async def _loop(name: str, seconds: float, job: Callable[[Session], object]):
+    while True:
+        await asyncio.sleep(seconds)
+        await run_in_threadpool(run_job, name, job)
+
+
+def start():
+    """Start all registered jobs on the running event loop."""
+    for name, (seconds, job) in _jobs.items():
+        if seconds and seconds > 0:
+            _tasks.append(asyncio.create_task(_loop(name, seconds, job), name=name))
+
+
+async def stop():
+    """Cancel all running jobs and wait for them to finish."""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -0,0 +1,184 @@
+"""
+Access/refresh token pairs and access-token revocation.
+
+Access tokens are short-lived JWTs (``ACCESS_TOKEN_EXPIRE_MINUTES``) checked
+without touching the database. Refresh tokens are opaque, stored as their
+SHA-256 and rotated on every use: the used token is revoked and a new one
+joins the same family. Presenting a revoked token again means it leaked, so
+the whole family is revoked.
+
+Revoking a subject (e.g. deactivating a user) revokes its refresh tokens and
+adds a ``token_revocations`` row: access tokens issued before it are
+rejected. Every worker keeps those cutoffs in ``revocations`` and polls the
+table for new rows every ``TOKEN_REVOCATION_SYNC_SECONDS``; the worker that
+made the change applies it as soon as the transaction commits. Cutoffs older
+than the access-token lifetime are dropped, since every token they could
+reject has expired.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.memory import register_cache
+from app.core.security import create_access_token, hash_token
+from app.models import RefreshToken, TokenRevocation
+
+PURGE_BATCH_SIZE = 5000
+# Rows are read by time rather than id, with overlap, so a revocation whose
+# transaction commits late is still picked up by the next sync
+SYNC_OVERLAP_SECONDS = 60
+
+
+def issue_tokens(db: Session, user_type: str, subject_id: int, claims: dict, family_id: str = None) -> dict:
+    """A new access token and refresh token for a subject. Caller commits."""
+    raw = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_type=user_type,
+        subject_id=subject_id,
+        token_hash=hash_token(raw),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return {
+        "access_token": create_access_token(data={"id": subject_id, "user_type": user_type, **claims}),
+        "refresh_token": raw,
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def use_refresh_token(db: Session, raw_token: str) -> Optional[RefreshToken]:
+    """Consume a refresh token; returns its row if it was valid, else None.
+
+    The token is revoked with a conditional UPDATE, so of two concurrent
+    uses only one succeeds. Reuse of a revoked token revokes its family.
+    Commits.
+    """
+    token = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_token(raw_token)).first()
+    if token is None or token.expires_at < datetime.utcnow():
+        return None
+
+    consumed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == token.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    ).rowcount
+    if not consumed:
+        revoke_family(db, token.family_id)
+        db.commit()
+        return None
+    return token
+
+
+def revoke_family(db: Session, family_id: str):
+    """Revoke every refresh token of a login. Caller commits."""
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+
+
+def revoke_login(db: Session, raw_token: str) -> bool:
+    """Log out: revoke the family of a refresh token. Caller commits."""
+    family_id = db.query(RefreshToken.family_id).filter(RefreshToken.token_hash == hash_token(raw_token)).scalar()
+    if family_id is None:
+        return False
+    revoke_family(db, family_id)
+    return True
+
+
+def revoke_subject(db: Session, user_type: str, subject_id: int):
+    """Invalidate every token of a subject once the caller commits."""
+    db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.user_type == user_type,
+            RefreshToken.subject_id == subject_id,
+            RefreshToken.revoked_at.is_(None)
+        )
+        .values(revoked_at=datetime.utcnow())
+    )
+    revocation = TokenRevocation(user_type=user_type, subject_id=subject_id, revoked_before=time.time())
+    db.add(revocation)
+    db.info.setdefault("pending_revocations", []).append(revocation)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session):
+    for revocation in session.info.pop("pending_revocations", []):
+        revocations.add(revocation.user_type, revocation.subject_id, revocation.revoked_before)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop("pending_revocations", None)
+
+
+class RevocationList:
+    """Per-worker copy of the recent ``token_revocations`` rows."""
+
+    def __init__(self, retention_seconds: float):
+        self.retention_seconds = retention_seconds
+        self._cutoffs: Dict[Tuple[str, int], float] = {}
+        self._synced_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cutoffs)
+
+    def is_revoked(self, user_type: str, subject_id: int, issued_at: float) -> bool:
+        cutoff = self._cutoffs.get((user_type, subject_id))
+        return cutoff is not None and issued_at < cutoff
+
+    def add(self, user_type: str, subject_id: int, revoked_before: float):
+        key = (user_type, subject_id)
+        with self._lock:
+            self._cutoffs[key] = max(revoked_before, self._cutoffs.get(key, 0.0))
+
+    def sync(self, db: Session) -> int:
+        """Pick up revocations made by other workers (scheduler job); returns rows read."""
+        now = time.time()
+        horizon = now - self.retention_seconds
+        since = horizon if self._synced_at is None else max(horizon, self._synced_at - SYNC_OVERLAP_SECONDS)
+        rows = db.execute(
+            select(TokenRevocation.user_type, TokenRevocation.subject_id, TokenRevocation.revoked_before)
+            .where(TokenRevocation.revoked_before > since)
+        ).all()
+
+        for row in rows:
+            self.add(row.user_type, row.subject_id, row.revoked_before)
+
+        with self._lock:
+            self._cutoffs = {key: cutoff for key, cutoff in self._cutoffs.items() if cutoff > horizon}
+        self._synced_at = now
+        return len(rows)
+
+
+def purge_expired(db: Session) -> int:
+    """Delete expired refresh tokens and outdated revocations in batches (scheduler job)."""
+    purged = 0
+    now = datetime.utcnow()
+    while True:
+        ids = db.execute(
+            select(RefreshToken.id).where(RefreshToken.expires_at < now).limit(PURGE_BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(delete(RefreshToken).where(RefreshToken.id.in_(ids)))
+        db.commit()
+        purged += len(ids)
+
+    db.execute(delete(TokenRevocation).where(
+        TokenRevocation.revoked_before < time.time() - revocations.retention_seconds
+    ))
+    db.commit()
+    return purged
+
+
+revocations = RevocationList(retention_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+register_cache("token_revocations", revocations)
@@ -0,0 +1,196 @@
+"""
+Write-behind buffer for ``service_usages`` rows.
+
+When ``USAGE_WRITE_BEHIND`` is on, ``use-service`` appends its usage record
+here instead of inserting it. The buffer is flushed with one multi-row
+INSERT every ``USAGE_FLUSH_INTERVAL_MS`` (scheduler job), as soon as
+``USAGE_FLUSH_ROWS`` rows are waiting (background task after the response),
+and on shutdown. Memory is bounded by ``USAGE_BUFFER_MAX_ROWS``: a full
+buffer is flushed inline, and rows that cannot be written are spilled to
+a per-process file next to ``USAGE_SPILL_PATH`` (``usage_spill.<pid>.jsonl``)
+and replayed on a later startup. Workers starting together claim each file
+of a finished process with an atomic rename, so every file is replayed once.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import List
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.memory import register_cache
+from app.database import SessionLocal
+from app.models import ServiceUsage
+
+logger = logging.getLogger(__name__)
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        # Our pid, so the file is from an earlier process
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class UsageBuffer:
+    def __init__(self, flush_rows: int, max_rows: int, spill_path: str):
+        self.flush_rows = flush_rows
+        self.max_rows = max_rows
+        self.spill_path = spill_path
+        self._rows: List[dict] = []
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, user_id: int, service_id: int, cost: float, postpaid: bool = None) -> dict:
+        """Queue a usage record and return it (without an id)."""
+        row = {
+            "user_id": user_id,
+            "service_id": service_id,
+            "cost": cost,
+            "postpaid": postpaid,
+            "used_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_rows
+
+        if full:
+            # Backpressure: never hold more than max_rows in memory
+            try:
+                self.flush()
+            except Exception:
+                # Rows were requeued or spilled; the caller's usage still counts
+                logger.exception("Usage buffer flush failed")
+
+        return dict(row)
+
+    def should_flush(self) -> bool:
+        return len(self._rows) >= self.flush_rows
+
+    def _take(self) -> List[dict]:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        return rows
+
+    def flush(self, db: Session = None) -> int:
+        """Write all queued rows in one multi-row INSERT; returns rows written."""
+        rows = self._take()
+        if not rows:
+            return 0
+
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            db.execute(insert(ServiceUsage), rows)
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            self._requeue(rows)
+            raise
+        finally:
+            if own_session:
+                db.close()
+
+    def _requeue(self, rows: List[dict]):
+        """Put rows back for the next flush, spilling what no longer fits."""
+        with self._lock:
+            room = max(self.max_rows - len(self._rows), 0)
+            self._rows[:0] = rows[:room]
+            overflow = rows[room:]
+        if overflow:
+            self.spill(overflow)
+
+    def _spill_file(self) -> str:
+        """This process's spill file: ``usage_spill.jsonl`` -> ``usage_spill.<pid>.jsonl``."""
+        root, ext = os.path.splitext(self.spill_path)
+        return f"{root}.{os.getpid()}{ext}"
+
+    def spill(self, rows: List[dict]):
+        """Append rows to this process's spill file so they survive a restart."""
+        with self._spill_lock, open(self._spill_file(), "a", encoding="utf-8") as fh:
+            for row in rows:
+                fh.write(json.dumps({**row, "used_at": row["used_at"].isoformat()}) + "\n")
+
+    def close(self):
+        """Durable handoff on shutdown: flush, or spill if the database is gone."""
+        try:
+            self.flush()
+        except Exception:
+            self.spill(self._take())
+
+    def _spilled_files(self) -> List[str]:
+        """Spill files of processes that are gone (their workers no longer append)."""
+        root, ext = os.path.splitext(self.spill_path)
+        # One file shared by every worker, from before spill files were per process
+        paths = [self.spill_path] if os.path.exists(self.spill_path) else []
+        for path in glob.glob(f"{glob.escape(root)}.*{ext}"):
+            pid = path[len(root) + 1:len(path) - len(ext)]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                paths.append(path)
+        return paths
+
+    def _replay(self, path: str) -> int:
+        rows = []
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # Last line cut short by a crash mid-write
+                    logger.warning("Skipping unreadable spilled usage record in %s", path)
+                    continue
+                row["used_at"] = datetime.fromisoformat(row["used_at"])
+                # Spilled before postpaid billing existed
+                row.setdefault("postpaid", None)
+                rows.append(row)
+
+        db = SessionLocal()
+        try:
+            for start in range(0, len(rows), self.flush_rows):
+                db.execute(insert(ServiceUsage), rows[start:start + self.flush_rows])
+            db.commit()
+        finally:
+            db.close()
+        return len(rows)
+
+    def recover(self) -> int:
+        """Insert rows spilled by earlier processes; returns rows recovered."""
+        recovered = 0
+        for path in self._spilled_files():
+            claimed = f"{path}.claimed-{os.getpid()}"
+            try:
+                # Atomic: of several workers starting together, exactly one gets the file
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                recovered += self._replay(claimed)
+            except Exception:
+                # Not inserted: leave it for the next startup
+                os.replace(claimed, path)
+                raise
+            os.remove(claimed)
+        return recovered
+
+usage_buffer = UsageBuffer(
+    flush_rows=settings.USAGE_FLUSH_ROWS,
+    max_rows=settings.USAGE_BUFFER_MAX_ROWS,
+    spill_path=settings.USAGE_SPILL_PATH
+)
+register_cache("usage_buffer", usage_buffer)
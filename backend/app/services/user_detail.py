@@ -0,0 +1,175 @@
+"""
+Admin view of one user with their totals, in a single statement.
+
+Balance, lifetime deposits, usage count and spend, the current subscription
+and the last payment are correlated subqueries and outer joins around the
+user row, each a range on a ``user_id``-leading index. Deposits and usage
+include the archive tables.
+
+Usage totals of heavy users would still scan every usage row, so once a
+read finds ``USER_USAGE_SNAPSHOT_MIN_ROWS`` rows past a user's last snapshot
+the totals are folded into ``user_usage_snapshots`` (after the response,
+like the balance snapshots); later reads add only the rows after it.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import (
+    User, Payment, PaymentArchive, ServiceUsage, ServiceUsageArchive, Subscription, UserSubscription,
+    UserUsageSnapshot
+)
+from app.models.payment import PaymentStatus
+
+_snapshot_id = func.coalesce(UserUsageSnapshot.last_usage_id, 0)
+
+
+def _after_snapshot(model, aggregate):
+    """``aggregate`` over the user's ``model`` rows newer than their usage snapshot."""
+    return (
+        select(aggregate)
+        .where(model.user_id == User.id, model.id > _snapshot_id)
+        .correlate(User, UserUsageSnapshot)
+        .scalar_subquery()
+    )
+
+
+def _deposits(model):
+    return (
+        select(func.coalesce(func.sum(model.amount), 0.0))
+        .where(model.user_id == User.id, model.status == PaymentStatus.APPROVED.value)
+        .correlate(User)
+        .scalar_subquery()
+    )
+
+
+def user_detail(db: Session, user_id: int) -> Optional[dict]:
+    """The user with balance, deposits, usage totals, current subscription and last payment."""
+    recent_count = (
+        _after_snapshot(ServiceUsage, func.count())
+        + _after_snapshot(ServiceUsageArchive, func.count())
+    )
+    recent_spend = (
+        _after_snapshot(ServiceUsage, func.coalesce(func.sum(ServiceUsage.cost), 0.0))
+        + _after_snapshot(ServiceUsageArchive, func.coalesce(func.sum(ServiceUsageArchive.cost), 0.0))
+    )
+
+    current_subscription_id = (
+        select(UserSubscription.id)
+        .where(
+            UserSubscription.user_id == User.id,
+            UserSubscription.is_active == True,
+            UserSubscription.end_date >= datetime.utcnow()
+        )
+        .order_by(UserSubscription.end_date.desc())
+        .limit(1)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    last_payment_id = (
+        select(Payment.id)
+        .where(Payment.user_id == User.id)
+        .order_by(Payment.created_at.desc(), Payment.id.desc())
+        .limit(1)
+        .correlate(User)
+        .scalar_subquery()
+    )
+
+    row = db.execute(
+        select(
+            User,
+            func.coalesce(UserUsageSnapshot.usage_count, 0).label("snapshot_count"),
+            func.coalesce(UserUsageSnapshot.usage_spend, 0.0).label("snapshot_spend"),
+            recent_count.label("recent_count"),
+            recent_spend.label("recent_spend"),
+            (_deposits(Payment) + _deposits(PaymentArchive)).label("deposits"),
+            UserSubscription,
+            Subscription.name.label("subscription_name"),
+            Payment,
+        )
+        .outerjoin(UserUsageSnapshot, UserUsageSnapshot.user_id == User.id)
+        .outerjoin(UserSubscription, UserSubscription.id == current_subscription_id)
+        .outerjoin(Subscription, Subscription.id == UserSubscription.subscription_id)
+        .outerjoin(Payment, Payment.id == last_payment_id)
+        .where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+
+    current, payment = row.UserSubscription, row.Payment
+    return {
+        "user": row.User,
+        "lifetime_deposits": row.deposits,
+        "usage_count": row.snapshot_count + row.recent_count,
+        "usage_spend": row.snapshot_spend + row.recent_spend,
+        "current_subscription": current and {
+            "id": current.id,
+            "subscription_id": current.subscription_id,
+            "name": row.subscription_name,
+            "start_date": current.start_date,
+            "end_date": current.end_date,
+        },
+        "last_payment": payment and {
+            "id": payment.id,
+            "user_id": payment.user_id,
+            "channel_id": payment.channel_id,
+            "transaction_id": payment.transaction_id,
+            "amount": payment.amount,
+            "status": payment.status,
+            "reject_reason": payment.reject_reason,
+            "created_at": payment.created_at,
+        },
+        # Rows the read had to aggregate beyond the snapshot
+        "unsnapshotted_usages": row.recent_count,
+    }
+
+
+def refresh_usage_snapshot(db: Session, user_id: int) -> int:
+    """Fold a user's usage rows older than the grace period into their snapshot; returns rows folded.
+
+    Guarded by the previous ``last_usage_id`` so concurrent refreshes cannot
+    double-count. Commits.
+    """
+    previous = db.query(UserUsageSnapshot.last_usage_id).filter(UserUsageSnapshot.user_id == user_id).scalar()
+    after = previous or 0
+
+    # Stop at rows young enough that an older id could still be uncommitted
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.USER_USAGE_SNAPSHOT_GRACE_SECONDS)
+    upto = db.execute(
+        select(func.max(ServiceUsage.id)).where(ServiceUsage.user_id == user_id, ServiceUsage.used_at < cutoff)
+    ).scalar()
+    if upto is None or upto <= after:
+        return 0
+
+    count, spend = 0, 0.0
+    for model in (ServiceUsage, ServiceUsageArchive):
+        rows, total = db.execute(
+            select(func.count(), func.coalesce(func.sum(model.cost), 0.0))
+            .where(model.user_id == user_id, model.id > after, model.id <= upto)
+        ).one()
+        count += rows
+        spend += total
+
+    if previous is None:
+        db.add(UserUsageSnapshot(user_id=user_id, usage_count=count, usage_spend=spend, last_usage_id=upto))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Created concurrently
+            db.rollback()
+            return 0
+        return count
+
+    folded = db.execute(
+        update(UserUsageSnapshot)
+        .where(UserUsageSnapshot.user_id == user_id, UserUsageSnapshot.last_usage_id == previous)
+        .values(
+            usage_count=UserUsageSnapshot.usage_count + count,
+            usage_spend=UserUsageSnapshot.usage_spend + spend,
+            last_usage_id=upto
+        )
+    ).rowcount
+    db.commit()
+    return count if folded else 0
@@ -0,0 +1,152 @@
+"""
+Admin user search over name, email and phone number.
+
+A query is answered by a few small index-backed lookups, each capped at
+``limit`` rows, whose candidates are merged and ranked:
+
+- email: exact match, then prefix (unique index on ``email``)
+- phone: numbers starting with the typed digits, in national (leading
+  ``0``) or international form (``PHONE_COUNTRY_CODE``, with or without
+  ``+``) on ``ix_users_phone_number``, so ``0171`` and ``+88017`` find
+  ``+8801712345678``; and numbers ending with them
+  (``ix_users_phone_reversed``), so ``01712-345678`` finds it too
+- name: prefix of the full name (``ix_users_name``), then every word of the
+  query as a word prefix (FULLTEXT ``ft_users_name`` on MySQL, LIKE elsewhere)
+
+The cost of a search therefore depends on ``limit``, not on the table size.
+"""
+import re
+from typing import Dict, List, Tuple
+from sqlalchemy import and_, literal, or_
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import User
+
+# Rank tiers, best first
+EXACT_EMAIL = 100
+EXACT_PHONE = 90
+EMAIL_PREFIX = 80
+PHONE_SUFFIX = 70
+PHONE_PREFIX = 65
+EXACT_NAME = 60
+NAME_PREFIX = 50
+NAME_WORDS = 30
+
+MIN_PHONE_DIGITS = 4
+
+_PHONE_QUERY = re.compile(r"^\+?[\d\s\-]+$")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _prefix(value: str) -> str:
+    return _escape_like(value) + "%"
+
+
+class _Candidates:
+    """Best (tier, relevance) seen per user id."""
+
+    def __init__(self):
+        self.ranks: Dict[int, Tuple[int, float]] = {}
+
+    def add(self, user_id: int, tier: int, relevance: float = 0.0):
+        rank = (tier, relevance)
+        if rank > self.ranks.get(user_id, (-1, 0.0)):
+            self.ranks[user_id] = rank
+
+
+def _match_email(db: Session, query: str, limit: int, found: _Candidates):
+    rows = db.query(User.id, User.email).filter(
+        User.email.like(_prefix(query), escape="\\")
+    ).order_by(User.email).limit(limit)
+    for user_id, email in rows:
+        found.add(user_id, EXACT_EMAIL if email == query else EMAIL_PREFIX)
+
+
+def _national(digits: str) -> str:
+    """International digits in national form: ``8801712`` -> ``01712``."""
+    code = settings.PHONE_COUNTRY_CODE
+    if code and digits.startswith(code):
+        return "0" + digits[len(code):]
+    return digits
+
+
+def _leading_forms(digits: str) -> List[str]:
+    """Stored prefixes the typed leading digits can match: both forms, with or without "+"."""
+    forms = {digits}
+    code = settings.PHONE_COUNTRY_CODE
+    if code and digits.startswith("0"):
+        forms.add(code + digits[1:])
+    national = _national(digits)
+    if national != digits:
+        forms.add(national)
+    # National numbers never carry a "+"
+    return sorted(forms | {"+" + form for form in forms if not form.startswith("0")})
+
+
+def _match_phone(db: Session, digits: str, limit: int, found: _Candidates):
+    # Stored numbers keep a leading "+" (spaces and dashes are stripped); a few ranges on one index
+    typed = _national(digits)
+    rows = db.query(User.id, User.phone_reversed).filter(or_(*[
+        User.phone_number.like(_prefix(prefix), escape="\\") for prefix in _leading_forms(digits)
+    ])).order_by(User.phone_number).limit(limit)
+    for user_id, phone_reversed in rows:
+        exact = _national((phone_reversed or "")[::-1]) == typed
+        found.add(user_id, EXACT_PHONE if exact else PHONE_PREFIX)
+
+    reversed_digits = digits[::-1]
+    rows = db.query(User.id, User.phone_reversed).filter(
+        User.phone_reversed.like(_prefix(reversed_digits), escape="\\")
+    ).limit(limit)
+    for user_id, phone_reversed in rows:
+        found.add(user_id, EXACT_PHONE if phone_reversed == reversed_digits else PHONE_SUFFIX)
+
+
+def _match_name(db: Session, query: str, words: List[str], limit: int, found: _Candidates):
+    rows = db.query(User.id, User.name).filter(
+        User.name.like(_prefix(query), escape="\\")
+    ).order_by(User.name).limit(limit)
+    for user_id, name in rows:
+        found.add(user_id, EXACT_NAME if name.lower() == query else NAME_PREFIX)
+
+    if not words:
+        return
+
+    if db.get_bind().dialect.name == "mysql":
+        relevance = match(User.name, against=" ".join(f"+{word}*" for word in words)).in_boolean_mode()
+        rows = db.query(User.id, relevance).filter(relevance).order_by(relevance.desc()).limit(limit)
+    else:
+        # No full-text index: word prefixes via LIKE (scans, fine for small databases)
+        rows = db.query(User.id, literal(0.0)).filter(and_(*[
+            or_(User.name.like(_prefix(word), escape="\\"), User.name.like("% " + _prefix(word), escape="\\"))
+            for word in words
+        ])).limit(limit)
+    for user_id, score in rows:
+        found.add(user_id, NAME_WORDS, float(score or 0.0))
+
+
+def search_users(db: Session, query: str, limit: int = 20) -> List[User]:
+    """Users matching ``query`` by email, phone or name, best matches first."""
+    query = query.strip().lower()
+    found = _Candidates()
+
+    if _PHONE_QUERY.match(query):
+        digits = re.sub(r"\D", "", query)
+        if len(digits) >= MIN_PHONE_DIGITS:
+            _match_phone(db, digits, limit, found)
+    else:
+        _match_email(db, query, limit, found)
+        if "@" not in query:
+            _match_name(db, query, re.findall(r"\w+", query), limit, found)
+
+    if not found.ranks:
+        return []
+
+    users = db.query(User).filter(User.id.in_(found.ranks)).all()
+    users.sort(key=lambda user: (
+        -found.ranks[user.id][0], -found.ranks[user.id][1], user.name.lower(), user.id
+    ))
+    return users[:limit]
@@ -0,0 +1,58 @@
+"""
+Email verification tokens.
+
+Only the SHA-256 of a token is stored, with an expiry
+(``EMAIL_VERIFICATION_EXPIRE_HOURS``). Verifying hashes the presented token
+and looks it up on the unique index, so one click costs one index probe, and
+timing reveals nothing about stored tokens: the database compares digests,
+not the secret. Expired rows are purged in batches by a scheduler job.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.security import generate_verification_token, hash_token
+from app.models import EmailVerificationToken
+
+PURGE_BATCH_SIZE = 5000
+
+
+def create_token(db: Session, user_id: int) -> str:
+    """A new verification token for ``user_id``, replacing earlier ones. Caller commits."""
+    db.execute(delete(EmailVerificationToken).where(EmailVerificationToken.user_id == user_id))
+    token = generate_verification_token()
+    db.add(EmailVerificationToken(
+        user_id=user_id,
+        token_hash=hash_token(token),
+        expires_at=datetime.utcnow() + timedelta(hours=settings.EMAIL_VERIFICATION_EXPIRE_HOURS),
+    ))
+    return token
+
+
+def consume_token(db: Session, token: str) -> Optional[int]:
+    """The user id of a valid token, which is used up; None if unknown or expired. Caller commits."""
+    row = db.query(EmailVerificationToken.id, EmailVerificationToken.user_id).filter(
+        EmailVerificationToken.token_hash == hash_token(token),
+        EmailVerificationToken.expires_at > datetime.utcnow()
+    ).first()
+    if row is None:
+        return None
+    db.execute(delete(EmailVerificationToken).where(EmailVerificationToken.user_id == row.user_id))
+    return row.user_id
+
+
+def purge_expired(db: Session) -> int:
+    """Delete expired tokens in batches (scheduler job); returns rows deleted."""
+    purged = 0
+    now = datetime.utcnow()
+    while True:
+        ids = db.execute(
+            select(EmailVerificationToken.id).where(EmailVerificationToken.expires_at < now).limit(PURGE_BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(delete(EmailVerificationToken).where(EmailVerificationToken.id.in_(ids)))
+        db.commit()
+        purged += len(ids)
+    return purged
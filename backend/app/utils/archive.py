@@ -0,0 +1,33 @@
+"""
+Move old service usages and settled payments to the archive tables.
+Run: python -m app.utils.archive [--days 180] [--batch-size 5000]
+
+Safe to re-run; schedule it (e.g. nightly cron) on a single host.
+"""
+import argparse
+import time
+from app.database import SessionLocal, init_db
+from app.core.config import settings
+from app.services.archive import run_archival
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive rows older than the retention window.")
+    parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS, help="keep this many days hot")
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE, help="rows moved per transaction")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        moved = run_archival(db, days=args.days, batch_size=args.batch_size)
+        for table, count in moved.items():
+            print(f"✓ {table}: {count:,} rows archived")
+        print(f"✅ Archival finished in {time.perf_counter() - started:,.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
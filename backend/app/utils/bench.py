@@ -0,0 +1,445 @@
+"""
+Benchmarks against a real database.
+Run: python -m app.utils.bench <benchmark> [options]
+
+Route functions are called directly with a real session, so the numbers
+cover application and database cost without HTTP overhead. Point
+DATABASE_URL at a scratch database (for example one filled by
+``python -m app.utils.datagen``); benchmarks write to it.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from fastapi import BackgroundTasks
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import SessionLocal
+from app.core.compression import available_encoders
+from app.models import User, Service, ServiceUsage, BalanceEntry, Payment
+from app.models.ledger import EntryKind
+from app.schemas import ServiceUsageCreate, ServiceUsageBatchCreate, PaymentCreate, UserResponse, PaymentResponse, ServiceUsageResponse
+from app.services import ledger
+from app.services.quota import QuotaReservations
+from app.services.usage_buffer import usage_buffer
+
+
+def bench_user(db: Session, credit: float = 0.0) -> User:
+    """An active, verified user to run benchmarks as, topped up by ``credit``."""
+    user = db.query(User).filter(
+        User.is_user_active == True,
+        User.is_email_verified == True
+    ).order_by(User.id).first()
+    if user is None:
+        raise SystemExit("No active verified user found. Run python -m app.utils.datagen first.")
+
+    if credit:
+        ledger.post_entry(db, user.id, credit, EntryKind.OPENING_BALANCE)
+        db.commit()
+    return user
+
+
+def run_background(tasks: BackgroundTasks):
+    """Run a route's background tasks inline, as Starlette would after the response."""
+    for task in tasks.tasks:
+        task.func(*task.args, **task.kwargs)
+
+
+def report(name: str, count: int, elapsed: float):
+    print(f"  {name:<28} {count:>9,} calls  {count / elapsed:>10,.0f} /s  {elapsed / count * 1000:>8.3f} ms/call")
+
+
+def bench_use_service(args):
+    """Sustained POST /api/user/use-service throughput, with and without write-behind."""
+    from app.routers.user import use_service
+
+    loop = asyncio.new_event_loop()
+    db = SessionLocal()
+    try:
+        service = db.query(Service).filter(Service.is_active == True).first()
+        user = bench_user(db, credit=settings.SERVICE_COST * args.max_calls * 2)
+        payload = ServiceUsageCreate(service_id=service.id)
+
+        print(f"\nuse-service for {args.duration}s per mode (user {user.id}, service {service.id})\n")
+        for write_behind in (False, True):
+            settings.USAGE_WRITE_BEHIND = write_behind
+            count = 0
+            started = time.perf_counter()
+            deadline = started + args.duration
+            while time.perf_counter() < deadline and count < args.max_calls:
+                tasks = BackgroundTasks()
+                loop.run_until_complete(use_service(payload, tasks, db, user))
+                run_background(tasks)
+                count += 1
+            usage_buffer.flush()
+            report("write-behind" if write_behind else "direct insert", count, time.perf_counter() - started)
+    finally:
+        db.close()
+        loop.close()
+
+
+def bench_use_service_batch(args):
+    """N sequential use-service calls against one use-service/batch call of N uses."""
+    from app.routers.user import use_service, use_service_batch
+
+    loop = asyncio.new_event_loop()
+    db = SessionLocal()
+    try:
+        services = db.query(Service).filter(Service.is_active == True).order_by(Service.id).limit(args.batch_size).all()
+        user = bench_user(db, credit=settings.SERVICE_COST * args.max_calls * 2)
+        # The batch's uses, spread over the available services
+        ids = [services[i % len(services)].id for i in range(args.batch_size)]
+        batch = ServiceUsageBatchCreate(items=[{"service_id": service_id} for service_id in ids])
+        settings.USAGE_WRITE_BEHIND = False
+
+        print(f"\n{args.batch_size} uses per action for {args.duration}s per mode (user {user.id})\n")
+        for batched in (False, True):
+            uses = 0
+            started = time.perf_counter()
+            deadline = started + args.duration
+            while time.perf_counter() < deadline and uses < args.max_calls:
+                tasks = BackgroundTasks()
+                if batched:
+                    loop.run_until_complete(use_service_batch(batch, tasks, db, user))
+                else:
+                    for service_id in ids:
+                        loop.run_until_complete(use_service(ServiceUsageCreate(service_id=service_id), tasks, db, user))
+                run_background(tasks)
+                uses += len(ids)
+            report("one batch call" if batched else f"{len(ids)} sequential calls", uses, time.perf_counter() - started)
+    finally:
+        db.close()
+        loop.close()
+
+
+def bench_quota(args):
+    """Quota reservations under concurrent workers; checks debits == recorded usage cost.
+
+    Each thread plays one worker with its own reservations, charging random
+    users and recording a usage row per successful charge. After every
+    reservation is released, the reservation entries written during the run
+    must net out to exactly the cost of the usage rows written during it.
+    """
+    cost = settings.SERVICE_COST
+    db = SessionLocal()
+    try:
+        service = db.query(Service).filter(Service.is_active == True).first()
+        user_ids = [row.id for row in db.query(User.id).order_by(User.id).limit(args.users)]
+        first_entry_id = (db.query(func.max(BalanceEntry.id)).scalar() or 0) + 1
+        first_usage_id = (db.query(func.max(ServiceUsage.id)).scalar() or 0) + 1
+    finally:
+        db.close()
+
+    counts = []
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        reservations = QuotaReservations(block_uses=settings.QUOTA_BLOCK_USES, ttl_seconds=args.ttl)
+        session = SessionLocal()
+        charged = 0
+        try:
+            for _ in range(args.calls):
+                user_id = rng.choice(user_ids)
+                if reservations.charge(session, user_id, cost):
+                    session.add(ServiceUsage(user_id=user_id, service_id=service.id, cost=cost))
+                    session.commit()
+                    charged += 1
+                if rng.random() < 0.01:
+                    reservations.release_expired(session)
+            reservations.release_all(session)
+        finally:
+            session.close()
+        counts.append(charged)
+
+    print(f"\nquota: {args.workers} workers x {args.calls:,} calls over {len(user_ids)} users\n")
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    report("reserved charges", sum(counts), elapsed)
+
+    db = SessionLocal()
+    try:
+        debited = dict(db.query(BalanceEntry.user_id, (0 - func.sum(BalanceEntry.amount)).label("debited")).filter(
+            BalanceEntry.id >= first_entry_id,
+            BalanceEntry.kind.in_([EntryKind.RESERVATION.value, EntryKind.RESERVATION_RELEASE.value])
+        ).group_by(BalanceEntry.user_id).all())
+        used = dict(db.query(ServiceUsage.user_id, func.sum(ServiceUsage.cost)).filter(
+            ServiceUsage.id >= first_usage_id
+        ).group_by(ServiceUsage.user_id).all())
+        reservations = db.query(func.count(BalanceEntry.id)).filter(
+            BalanceEntry.id >= first_entry_id,
+            BalanceEntry.kind == EntryKind.RESERVATION.value
+        ).scalar()
+    finally:
+        db.close()
+
+    mismatched = [
+        user_id for user_id in set(debited) | set(used)
+        if abs((debited.get(user_id) or 0.0) - (used.get(user_id) or 0.0)) > 1e-6
+    ]
+    print(f"  {'ledger writes for debits':<28} {reservations:>9,} blocks")
+    if mismatched:
+        raise SystemExit(f"✗ Debits differ from recorded usage for users {sorted(mismatched)[:20]}")
+    print("  ✓ total debits equal recorded usage cost for every user")
+
+
+def bench_compression(args):
+    """CPU cost versus bytes saved per encoding and level on real response bodies."""
+    db = SessionLocal()
+    try:
+        payloads = {
+            "admin users": (UserResponse, db.query(User).order_by(User.id).limit(args.rows).all()),
+            "admin payments": (PaymentResponse, db.query(Payment).order_by(Payment.id.desc()).limit(args.rows).all()),
+            "usage history": (ServiceUsageResponse, db.query(ServiceUsage).order_by(ServiceUsage.id.desc()).limit(args.rows).all()),
+        }
+        bodies = {
+            name: json.dumps(jsonable_encoder([schema.model_validate(row) for row in rows])).encode()
+            for name, (schema, rows) in payloads.items()
+            if rows
+        }
+    finally:
+        db.close()
+
+    levels = {"gzip": [1, 6, 9], "br": [1, 4, 6, 11], "zstd": [1, 3, 9, 19]}
+    for name, body in bodies.items():
+        print(f"\n{name}: {len(body):,} bytes ({args.rows:,} rows max)\n")
+        for coding in ("gzip", "br", "zstd"):
+            for level in levels[coding]:
+                encoders = available_encoders({coding: level, "gzip": level})
+                if coding not in encoders:
+                    print(f"  {coding:<5} not installed")
+                    break
+                repeat = max(1, args.repeat)
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    encoder = encoders[coding]()
+                    size = len(encoder.compress(body) + encoder.finish())
+                elapsed = (time.perf_counter() - started) / repeat
+                print(
+                    f"  {coding:<5} level {level:<3} {size:>11,} bytes  {size / len(body):>6.1%}"
+                    f"  {elapsed * 1000:>8.2f} ms  {len(body) / elapsed / 1e6:>8.1f} MB/s"
+                )
+
+
+def bench_payments(args):
+    """Concurrent duplicate payment submissions; each transaction id must be accepted exactly once.
+
+    Every worker submits the same transaction ids in the same order, so each
+    id is raced by all workers at once. Exactly one submission per id may
+    succeed, every other one must get the duplicate error, and the table must
+    hold exactly one row per id afterwards.
+    """
+    from fastapi import HTTPException
+    from app.routers.user import add_payment
+    from app.services.catalog import catalog
+
+    db = SessionLocal()
+    try:
+        user_id = bench_user(db).id
+        channels = catalog.active_channels(db)
+        if not channels:
+            raise SystemExit("No active payment channel. Run python -m app.utils.seed first.")
+        channel_id = channels[0].id
+    finally:
+        db.close()
+
+    prefix = f"BENCH-{int(time.time() * 1000)}-"
+    transaction_ids = [f"{prefix}{i}" for i in range(args.transactions)]
+    barrier = threading.Barrier(args.workers)
+    outcomes = []
+
+    def worker():
+        loop = asyncio.new_event_loop()
+        session = SessionLocal()
+        accepted = rejected = 0
+        try:
+            user = session.get(User, user_id)
+            barrier.wait()
+            for transaction_id in transaction_ids:
+                payload = PaymentCreate(channel_id=channel_id, transaction_id=transaction_id, amount=100.0)
+                try:
+                    loop.run_until_complete(add_payment(payload, session, user))
+                    accepted += 1
+                except HTTPException as error:
+                    if error.status_code != 400:
+                        raise
+                    rejected += 1
+        finally:
+            session.close()
+            loop.close()
+        outcomes.append((accepted, rejected))
+
+    print(f"\npayments: {args.workers} workers racing on {args.transactions:,} transaction ids\n")
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    accepted = sum(outcome[0] for outcome in outcomes)
+    rejected = sum(outcome[1] for outcome in outcomes)
+    report("submissions", accepted + rejected, elapsed)
+
+    db = SessionLocal()
+    try:
+        stored = db.query(func.count(Payment.id)).filter(Payment.transaction_id.like(prefix + "%")).scalar()
+    finally:
+        db.close()
+
+    expected_rejections = args.transactions * (args.workers - 1)
+    print(f"  {'accepted':<28} {accepted:>9,}")
+    print(f"  {'rejected as duplicate':<28} {rejected:>9,}")
+    print(f"  {'rows stored':<28} {stored:>9,}")
+    if len(outcomes) != args.workers or accepted != args.transactions or stored != args.transactions \
+            or rejected != expected_rejections:
+        raise SystemExit("✗ Duplicate transaction ids were not rejected exactly once")
+    print("  ✓ every transaction id accepted exactly once")
+
+
+def bench_hashing(args):
+    """Password hashes per second on one core for each cost setting.
+
+    One thread hashes for --duration seconds per setting; a login or
+    registration costs one hash, so this is the per-core ceiling on either.
+    """
+    import os
+    from app.core.security import build_password_context
+
+    settings_to_try = [("bcrypt", {"bcrypt_rounds": rounds}) for rounds in (10, 11, 12, 13, 14)]
+    settings_to_try += [
+        ("argon2", {"argon2_time_cost": time_cost, "argon2_memory_cost": memory_cost, "argon2_parallelism": settings.ARGON2_PARALLELISM})
+        for time_cost, memory_cost in ((2, 19456), (3, 65536), (4, 65536))
+    ]
+    duration = min(args.duration, 5.0)
+    cores = os.cpu_count() or 1
+
+    print(f"\nhashing: {duration:.0f}s per setting on one core ({cores} cores available)\n")
+    for scheme, options in settings_to_try:
+        label = f"{scheme} " + " ".join(f"{name.split('_', 1)[1]}={value}" for name, value in options.items())
+        context = build_password_context([scheme], **options)
+        try:
+            context.hash("warm-up")
+        except (ImportError, RuntimeError):
+            print(f"  {label:<52} not installed")
+            continue
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            context.hash("benchmark-password")
+            count += 1
+        elapsed = time.perf_counter() - started
+        print(
+            f"  {label:<52} {count / elapsed:>8.1f} hashes/s/core  {elapsed / count * 1000:>8.1f} ms/hash"
+            f"  ~{count / elapsed * cores:>7.0f} logins/s on {cores} cores"
+        )
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_search(args):
+    """Admin user search latency per query kind; fails if a p95 exceeds --target-ms.
+
+    Queries are built from random existing users, the way an admin would type
+    them: the start of a name, a surname, an email prefix, the last digits or
+    the local form of a phone number.
+    """
+    from app.services.user_search import search_users
+
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        total = db.query(func.count(User.id)).scalar()
+        max_id = db.query(func.max(User.id)).scalar() or 0
+        if not total:
+            raise SystemExit("No users found. Run python -m app.utils.datagen first.")
+
+        samples = []
+        while len(samples) < args.queries:
+            user = db.query(User).filter(User.id >= rng.randint(1, max_id)).order_by(User.id).first()
+            if user is not None:
+                samples.append((user.name, user.email, user.phone_number))
+        db.expunge_all()
+
+        kinds = {
+            "name prefix": lambda name, email, phone: name[:4],
+            "surname": lambda name, email, phone: name.split()[-1],
+            "full name": lambda name, email, phone: name,
+            "email prefix": lambda name, email, phone: email.split("@")[0][:8],
+            "exact email": lambda name, email, phone: email,
+            "phone last 6": lambda name, email, phone: phone[-6:],
+            "local phone": lambda name, email, phone: "0" + phone[-10:],
+        }
+
+        print(f"\nsearch: {args.queries:,} queries per kind over {total:,} users (limit {args.limit})\n")
+        print(f"  {'kind':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'hits':>6}")
+        slow = []
+        for kind, build in kinds.items():
+            latencies, hits = [], 0
+            for name, email, phone in samples:
+                started = time.perf_counter()
+                found = search_users(db, build(name, email, phone), args.limit)
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += any(user.email == email for user in found)
+                db.expunge_all()
+            p95 = percentile(latencies, 0.95)
+            print(
+                f"  {kind:<16} {percentile(latencies, 0.50):>8.2f} {p95:>8.2f} "
+                f"{percentile(latencies, 0.99):>8.2f} {hits / len(samples):>6.0%}"
+            )
+            if p95 > args.target_ms:
+                slow.append(kind)
+    finally:
+        db.close()
+
+    if slow:
+        raise SystemExit(f"✗ p95 above {args.target_ms} ms for: {', '.join(slow)}")
+    print(f"  ✓ every p95 within {args.target_ms} ms")
+
+
+BENCHMARKS = {
+    "use-service": bench_use_service,
+    "use-service-batch": bench_use_service_batch,
+    "quota": bench_quota,
+    "compression": bench_compression,
+    "search": bench_search,
+    "payments": bench_payments,
+    "hashing": bench_hashing,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a benchmark against DATABASE_URL.")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per measured mode")
+    parser.add_argument("--max-calls", type=int, default=1_000_000, help="stop a mode after this many calls")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent workers (quota, payments)")
+    parser.add_argument("--calls", type=int, default=2_000, help="calls per worker (quota)")
+    parser.add_argument("--users", type=int, default=50, help="distinct users to spread calls over (quota)")
+    parser.add_argument("--ttl", type=float, default=0.5, help="reservation lifetime in seconds (quota)")
+    parser.add_argument("--rows", type=int, default=1_000, help="rows per payload (compression)")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per encoding and level (compression)")
+    parser.add_argument("--transactions", type=int, default=500, help="transaction ids to race on (payments)")
+    parser.add_argument("--queries", type=int, default=200, help="queries per kind (search)")
+    parser.add_argument("--limit", type=int, default=20, help="results per query (search)")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="p95 latency target (search)")
+    parser.add_argument("--batch-size", type=int, default=10, help="uses per user action (use-service-batch)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (search)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    BENCHMARKS[args.benchmark](args)
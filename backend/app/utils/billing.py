@@ -0,0 +1,55 @@
+"""
+Invoice postpaid usage for a closed billing period.
+Run: python -m app.utils.billing run [--period 2025-01-15] [--chunk-users 1000]
+     python -m app.utils.billing status
+
+Safe to interrupt and re-run: a run resumes from its last committed chunk.
+With BILLING_MODE=postpaid the server also bills due periods on its own.
+"""
+import argparse
+import time
+from datetime import datetime
+from app.database import SessionLocal, init_db
+from app.core.config import settings
+from app.models import BillingRun
+from app.services.billing import run_billing
+
+
+def show(run: BillingRun):
+    print(
+        f"  {run.period_start:%Y-%m-%d} → {run.period_end:%Y-%m-%d}  {run.status:<8} "
+        f"users ≤ {run.last_user_id:<9,} {run.invoices:>9,} invoices  ৳{run.amount:,.2f}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Invoice postpaid usage per user and period.")
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument(
+        "--period", type=datetime.fromisoformat, default=None,
+        help="any date in the period to bill (default: the last closed period)"
+    )
+    parser.add_argument("--chunk-users", type=int, default=settings.BILLING_CHUNK_USERS, help="users per transaction")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.command == "status":
+            for run in db.query(BillingRun).order_by(BillingRun.period_start.desc()).limit(12):
+                show(run)
+            return
+
+        started = time.perf_counter()
+        try:
+            run = run_billing(db, args.period, args.chunk_users, progress=show)
+        except ValueError as error:
+            raise SystemExit(f"✗ {error}")
+        print(f"✅ {run.period_start:%Y-%m-%d} billed: {run.invoices:,} invoices, ৳{run.amount:,.2f} "
+              f"in {time.perf_counter() - started:,.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Bulk synthetic data generator for load and query testing.
+Run: python -m app.utils.datagen --users 1000000 --seed 42
+
+Builds on the seed script for reference data (admin, services, plans,
+channels), then generates users with payments, subscriptions and service
+usages in chunks. Rows get explicit primary keys so child rows never need a
+read-back, and every chunk is written with multi-row INSERTs (or dumped to
+TSV files for ``LOAD DATA LOCAL INFILE`` with ``--format tsv``).
+"""
+import argparse
+import csv
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, init_db
+from app.models import User, Service, ServiceUsage, Subscription, UserSubscription, Payment, PaymentChannel, BalanceEntry
+from app.models.ledger import EntryKind
+from app.models.user import reverse_phone
+from app.core.security import get_password_hash
+from app.core.config import settings
+from app.services import counters
+from app.utils.seed import seed_admin, seed_services, seed_subscriptions, seed_payment_channels
+
+# Deposit amounts people actually send (BDT) and how often they send them
+DEPOSIT_AMOUNTS = [50.0, 100.0, 200.0, 500.0, 1000.0, 2000.0, 5000.0]
+DEPOSIT_WEIGHTS = [8, 25, 22, 25, 12, 6, 2]
+
+PAYMENT_STATUSES = ["approved", "rejected", "pending"]
+PAYMENT_STATUS_WEIGHTS = [85, 10, 5]
+
+FIRST_NAMES = [
+    "Rahim", "Karim", "Fatema", "Ayesha", "Nusrat", "Tanvir", "Sabbir", "Mim",
+    "Rafi", "Sadia", "Imran", "Jannat", "Arif", "Farhana", "Hasan", "Ritu",
+]
+LAST_NAMES = [
+    "Ahmed", "Hossain", "Islam", "Rahman", "Khan", "Chowdhury", "Sarker",
+    "Akter", "Uddin", "Begum", "Mia", "Das", "Roy", "Sheikh",
+]
+
+TABLE_ORDER = ["users", "payments", "user_subscriptions", "service_usages", "balance_entries"]
+
+
+class Generator:
+    """Deterministic row generator for one dataset."""
+
+    def __init__(self, args, reference: dict, start_ids: dict):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.anchor = args.anchor
+        self.password_hash = get_password_hash(args.password)
+        self.service_ids = reference["services"]
+        self.channel_ids = reference["channels"]
+        self.plans = reference["plans"]
+        self.next_id = dict(start_ids)
+
+    def _take_id(self, table: str) -> int:
+        value = self.next_id[table]
+        self.next_id[table] += 1
+        return value
+
+    def _entry(self, rows: dict, user_id: int, amount: float, kind: EntryKind, reference_id: int, at: datetime):
+        rows["balance_entries"].append({
+            "id": self._take_id("balance_entries"),
+            "user_id": user_id,
+            "amount": amount,
+            "kind": kind.value,
+            "reference_id": reference_id,
+            "created_at": at,
+        })
+
+    def _past(self, max_days: float) -> datetime:
+        # Skewed towards recent dates, like a growing user base
+        offset = max_days * (1 - self.rng.random() ** 0.5)
+        return self.anchor - timedelta(days=offset)
+
+    def chunk(self, count: int) -> dict:
+        """Generate ``count`` users and all of their child rows."""
+        rows = {table: [] for table in TABLE_ORDER}
+        rng = self.rng
+
+        for _ in range(count):
+            user_id = self._take_id("users")
+            created_at = self._past(self.args.days)
+            age_days = (self.anchor - created_at).total_seconds() / 86400
+
+            # Payments: most users top up a few times, some never do
+            deposited = 0.0
+            for _ in range(int(rng.expovariate(1 / self.args.avg_payments))):
+                status = rng.choices(PAYMENT_STATUSES, PAYMENT_STATUS_WEIGHTS)[0]
+                amount = rng.choices(DEPOSIT_AMOUNTS, DEPOSIT_WEIGHTS)[0]
+                payment_id = self._take_id("payments")
+                paid_at = created_at + timedelta(days=rng.random() * age_days)
+                # Settled by an admin within a few hours; dashboard revenue is booked on that day
+                settled_at = paid_at if status == "pending" else min(
+                    paid_at + timedelta(hours=rng.random() * 6), self.anchor
+                )
+                rows["payments"].append({
+                    "id": payment_id,
+                    "user_id": user_id,
+                    "channel_id": rng.choice(self.channel_ids),
+                    "transaction_id": f"TX{payment_id:012d}",
+                    "amount": amount,
+                    "status": status,
+                    "reject_reason": "Transaction not found" if status == "rejected" else None,
+                    "created_at": paid_at,
+                    "updated_at": settled_at,
+                })
+                if status == "approved":
+                    deposited += amount
+                    self._entry(rows, user_id, amount, EntryKind.DEPOSIT, payment_id, settled_at)
+
+            # Subscriptions: a minority buys plans back to back, if they can afford them
+            spent = 0.0
+            windows = []
+            if rng.random() < self.args.subscriber_ratio:
+                start = created_at + timedelta(days=rng.random() * age_days / 2)
+                for _ in range(rng.randint(1, 3)):
+                    plan_id, duration_days, price = rng.choice(self.plans)
+                    if deposited - spent < price:
+                        break
+                    end = start + timedelta(days=duration_days)
+                    windows.append((start, end))
+                    spent += price
+                    subscription_id = self._take_id("user_subscriptions")
+                    rows["user_subscriptions"].append({
+                        "id": subscription_id,
+                        "user_id": user_id,
+                        "subscription_id": plan_id,
+                        "start_date": start,
+                        "end_date": end,
+                        "is_active": False,
+                    })
+                    self._entry(rows, user_id, -price, EntryKind.SUBSCRIPTION, subscription_id, start)
+                    start = end
+                if windows and windows[-1][1] > self.anchor:
+                    rows["user_subscriptions"][-1]["is_active"] = True
+
+            # Service usage: heavy-tailed, a few users make most of the calls
+            usage_count = min(
+                int(rng.paretovariate(self.args.usage_alpha)) - 1,
+                self.args.max_usages_per_user,
+            )
+            for _ in range(usage_count):
+                used_at = created_at + timedelta(days=rng.random() * age_days)
+                covered = any(start <= used_at < end for start, end in windows)
+                cost = 0.0 if covered else settings.SERVICE_COST
+                if deposited - spent < cost:
+                    continue
+                spent += cost
+                usage_id = self._take_id("service_usages")
+                rows["service_usages"].append({
+                    "id": usage_id,
+                    "user_id": user_id,
+                    "service_id": rng.choice(self.service_ids),
+                    "cost": cost,
+                    "used_at": used_at,
+                })
+                if cost:
+                    self._entry(rows, user_id, -cost, EntryKind.SERVICE_USAGE, usage_id, used_at)
+
+            first = rng.choice(FIRST_NAMES)
+            last = rng.choice(LAST_NAMES)
+            phone = f"+8801{rng.randint(300000000, 999999999)}"
+            rows["users"].append({
+                "id": user_id,
+                "name": f"{first} {last}",
+                "email": f"{first.lower()}.{last.lower()}.{user_id}@gmail.com",
+                "phone_number": phone,
+                "phone_reversed": reverse_phone(phone),
+                "password": self.password_hash,
+                "current_address": None,
+                "profile_image_url": None,
+                "is_user_verified": rng.random() < 0.9,
+                "is_user_active": rng.random() < 0.9,
+                "is_email_verified": rng.random() < 0.92,
+                "is_phone_verified": rng.random() < 0.6,
+                "created_at": created_at,
+                "updated_at": created_at,
+            })
+
+        return rows
+
+
+def load_reference_data(db: Session) -> dict:
+    """Seed reference data and return the ids the generator draws from."""
+    seed_admin(db)
+    seed_services(db)
+    seed_subscriptions(db)
+    seed_payment_channels(db)
+
+    return {
+        "services": [row.id for row in db.query(Service.id).filter(Service.is_active == True)],
+        "channels": [row.id for row in db.query(PaymentChannel.id).filter(PaymentChannel.is_active == True)],
+        "plans": [
+            (row.id, row.duration_days, row.price)
+            for row in db.query(Subscription.id, Subscription.duration_days, Subscription.price)
+            .filter(Subscription.is_active == True)
+        ],
+    }
+
+
+def next_ids(db: Session) -> dict:
+    """First free primary key per generated table."""
+    models = {
+        "users": User,
+        "payments": Payment,
+        "user_subscriptions": UserSubscription,
+        "service_usages": ServiceUsage,
+        "balance_entries": BalanceEntry,
+    }
+    return {
+        table: (db.query(func.max(model.id)).scalar() or 0) + 1
+        for table, model in models.items()
+    }
+
+
+def write_chunk_db(db: Session, rows: dict):
+    """Insert one chunk; the driver folds executemany into multi-row INSERTs."""
+    tables = {
+        "users": User.__table__,
+        "payments": Payment.__table__,
+        "user_subscriptions": UserSubscription.__table__,
+        "service_usages": ServiceUsage.__table__,
+        "balance_entries": BalanceEntry.__table__,
+    }
+    for table in TABLE_ORDER:
+        if rows[table]:
+            db.execute(insert(tables[table]), rows[table])
+    db.commit()
+
+
+def write_chunk_tsv(out_dir: str, rows: dict):
+    """Append one chunk to per-table TSV files in LOAD DATA format."""
+    for table in TABLE_ORDER:
+        if not rows[table]:
+            continue
+        path = os.path.join(out_dir, f"{table}.tsv")
+        columns = list(rows[table][0].keys())
+        with open(path, "a", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh, delimiter="\t", lineterminator="\n")
+            for row in rows[table]:
+                writer.writerow([_tsv_value(row[col]) for col in columns])
+
+
+def _tsv_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def print_load_statements(out_dir: str, columns: dict):
+    """Print the LOAD DATA statements matching the written TSV files."""
+    print("\nLoad the files with:\n")
+    for table in TABLE_ORDER:
+        if table not in columns:
+            continue
+        path = os.path.abspath(os.path.join(out_dir, f"{table}.tsv"))
+        print(
+            f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table} "
+            f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+            f"({', '.join(columns[table])});"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset.")
+    parser.add_argument("--users", type=int, default=100_000, help="number of users to generate")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (same seed, same data)")
+    parser.add_argument("--chunk-size", type=int, default=5_000, help="users per batch")
+    parser.add_argument("--days", type=int, default=365, help="history length in days")
+    parser.add_argument("--avg-payments", type=float, default=3.0, help="mean payments per user")
+    parser.add_argument("--subscriber-ratio", type=float, default=0.3, help="share of users with plans")
+    parser.add_argument("--usage-alpha", type=float, default=0.9, help="Pareto shape for usage counts")
+    parser.add_argument("--max-usages-per-user", type=int, default=5_000)
+    parser.add_argument("--password", default="password123", help="password for every generated user")
+    parser.add_argument(
+        "--anchor",
+        type=lambda value: datetime.strptime(value, "%Y-%m-%d"),
+        default=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+        help="date the history ends at (YYYY-MM-DD), fix it for reproducible output",
+    )
+    parser.add_argument("--format", choices=["db", "tsv"], default="db", help="insert directly or write TSV")
+    parser.add_argument("--out", default="datagen_out", help="output directory for --format tsv")
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="disable unique and foreign key checks for the loading session (MySQL)",
+    )
+    return parser.parse_args(argv)
+
+
+def run_datagen(argv=None):
+    """Generate the dataset described by the command line."""
+    args = parse_args(argv)
+
+    print("\n" + "="*50)
+    print(f"🏭 Generating {args.users:,} users (seed={args.seed})...")
+    print("="*50 + "\n")
+
+    init_db()
+    db = SessionLocal()
+
+    try:
+        reference = load_reference_data(db)
+        generator = Generator(args, reference, next_ids(db))
+        print()
+
+        if args.format == "tsv":
+            os.makedirs(args.out, exist_ok=True)
+        elif args.fast:
+            db.execute(text("SET unique_checks = 0"))
+            db.execute(text("SET foreign_key_checks = 0"))
+
+        columns = {}
+        totals = {table: 0 for table in TABLE_ORDER}
+        started = time.perf_counter()
+        remaining = args.users
+
+        while remaining > 0:
+            count = min(args.chunk_size, remaining)
+            rows = generator.chunk(count)
+            remaining -= count
+
+            if args.format == "tsv":
+                write_chunk_tsv(args.out, rows)
+            else:
+                write_chunk_db(db, rows)
+
+            for table in TABLE_ORDER:
+                totals[table] += len(rows[table])
+                if rows[table] and table not in columns:
+                    columns[table] = list(rows[table][0].keys())
+
+            written = sum(totals.values())
+            elapsed = time.perf_counter() - started
+            print(
+                f"✓ {totals['users']:,}/{args.users:,} users, {written:,} rows "
+                f"({written / elapsed:,.0f} rows/s)"
+            )
+
+        if args.fast and args.format == "db":
+            db.execute(text("SET unique_checks = 1"))
+            db.execute(text("SET foreign_key_checks = 1"))
+
+        if args.format == "tsv":
+            print_load_statements(args.out, columns)
+        else:
+            # Bulk rows bypass the write paths that keep the dashboard counters
+            counters.rebuild(db)
+            print("✓ Dashboard counters rebuilt")
+
+        elapsed = time.perf_counter() - started
+        print()
+        print("="*50)
+        for table in TABLE_ORDER:
+            print(f"  {table:<20} {totals[table]:>12,}")
+        print(f"✅ Generated {sum(totals.values()):,} rows in {elapsed:,.1f}s")
+        print("="*50 + "\n")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_datagen()
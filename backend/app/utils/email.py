@@ -2,10 +2,13 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import Optional
+import logging
 from app.database import get_db
 from app.core.security import decode_token
 from app.models import User, Admin
 
+logger = logging.getLogger(__name__)
+
 security = HTTPBearer()
 
 
@@ -108,6 +111,6 @@ async def get_current_admin(
 
 
 def send_verification_email(to_email: str, token: str):
-    print(f"Sending verification email to {to_email} with token {token}")
+    logger.info("Sending verification email to %s", to_email)
     # ...existing code to send email...
-    print("Email sent (or attempted)")
\ No newline at end of file
+    logger.info("Email sent (or attempted)")
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Pick password hashing costs for this machine.
+Run: python -m app.utils.passwords calibrate [--scheme bcrypt] [--target-ms 250]
+
+Times hashing at increasing cost on the current CPU and prints the settings
+for the highest cost that stays within the target. Run it on the deployment
+hardware: every login and registration spends this much CPU on one core.
+"""
+import argparse
+import statistics
+import time
+from app.core.config import settings
+from app.core.security import build_password_context
+
+SAMPLE_PASSWORD = "calibration-password"
+
+
+def time_hash(context, samples: int) -> float:
+    """Median milliseconds per hash."""
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash(SAMPLE_PASSWORD)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt(args) -> dict:
+    best = None
+    for rounds in range(8, 20):
+        elapsed = time_hash(build_password_context(["bcrypt"], bcrypt_rounds=rounds), args.samples)
+        print(f"  bcrypt rounds {rounds:<3} {elapsed:>9.1f} ms")
+        if elapsed > args.target_ms:
+            break
+        best = {"BCRYPT_ROUNDS": rounds}
+    return best
+
+
+def calibrate_argon2(args) -> dict:
+    best = None
+    for time_cost in range(1, 20):
+        context = build_password_context(
+            ["argon2"],
+            argon2_time_cost=time_cost,
+            argon2_memory_cost=args.memory_cost,
+            argon2_parallelism=args.parallelism
+        )
+        elapsed = time_hash(context, args.samples)
+        print(f"  argon2 time_cost {time_cost:<3} {elapsed:>9.1f} ms  ({args.memory_cost:,} KiB, {args.parallelism} lanes)")
+        if elapsed > args.target_ms:
+            break
+        best = {
+            "ARGON2_TIME_COST": time_cost,
+            "ARGON2_MEMORY_COST": args.memory_cost,
+            "ARGON2_PARALLELISM": args.parallelism,
+        }
+    return best
+
+
+CALIBRATORS = {
+    "bcrypt": calibrate_bcrypt,
+    "argon2": calibrate_argon2,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate password hashing cost against a target latency.")
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("--scheme", choices=sorted(CALIBRATORS), default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="maximum time per hash")
+    parser.add_argument("--samples", type=int, default=5, help="hashes timed per cost")
+    parser.add_argument("--memory-cost", type=int, default=settings.ARGON2_MEMORY_COST, help="KiB (argon2)")
+    parser.add_argument("--parallelism", type=int, default=settings.ARGON2_PARALLELISM, help="lanes (argon2)")
+    args = parser.parse_args(argv)
+
+    print(f"\n⏱  Calibrating {args.scheme} for {args.target_ms:.0f} ms per hash\n")
+    try:
+        best = CALIBRATORS[args.scheme](args)
+    except (ImportError, RuntimeError) as error:
+        # passlib raises MissingBackendError (a RuntimeError) when argon2-cffi is absent
+        raise SystemExit(f"✗ {args.scheme} is not available: {error}")
+
+    if best is None:
+        raise SystemExit(f"✗ Even the lowest cost takes longer than {args.target_ms:.0f} ms")
+
+    # Keep the current schemes after the new one so existing hashes verify and get rehashed
+    schemes = [args.scheme] + [
+        scheme.strip() for scheme in settings.PASSWORD_SCHEMES.split(",")
+        if scheme.strip() and scheme.strip() != args.scheme
+    ]
+    print("\nAdd to .env:\n")
+    print(f"PASSWORD_SCHEMES={','.join(schemes)}")
+    for name, value in best.items():
+        print(f"{name}={value}")
+    print()
+
+
+if __name__ == "__main__":
+    main()